@@ -0,0 +1,465 @@
+"""
+API HTTP/JSON local para integraciones (puntos de venta de agentes asociados).
+
+Expone las mismas operaciones que la interfaz de Streamlit, con las mismas reglas
+por rol, sin ejecutar el script de la interfaz en cada pedido. El servidor es un
+bucle asyncio que solo lee y escribe HTTP; el trabajo con la base de datos corre
+en un pool de hilos, y las escrituras de todos los pedidos pasan por el escritor
+único de db, que las agrupa en pocas transacciones. La interfaz puede seguir
+corriendo en otro proceso sobre la misma base.
+
+Cada pedido se identifica con el ID de empleado en la cabecera X-Empleado-Id y, si
+se definió TRANSFERENCIAS_API_TOKEN, con 'Authorization: Bearer <token>':
+
+    python api.py --puerto 8080
+    curl -X POST localhost:8080/transferencias -H 'X-Empleado-Id: 2' \\
+         -d '{"transferencias": [{"remitente_nombre": "Ana", "destinatario_nombre": "Luis",
+              "destinatario_telefono": "5351234567", "capital": 100}]}'
+
+Rutas:
+    GET   /salud
+    GET   /empleados                         administrador
+    POST  /empleados                         administrador
+    GET   /transferencias                    todos (según el rol, como el listado)
+    POST  /transferencias                    registrador (una o un lote)
+    PATCH /transferencias                    registrador ({"cambios": {id: {campo: valor}}})
+    POST  /confirmaciones                    confirmador ({"ids": [...]})
+    GET   /transferencias/<id>/historial     administrador, registrador
+    GET   /transferencias/<id>/ganancias     administrador
+    GET   /empleados/<id>/saldo?fecha=       administrador, o el propio empleado
+    GET   /buscar?q=...                      todos
+    GET   /inventario?mes=&anio=             administrador
+    GET   /reportes/ganancias?desde=AAAA-MM  administrador
+
+POST /transferencias responde 201 si registró todas, 207 si solo algunas y 400 si
+ninguna, siempre con el resultado de cada una; un ID de empleado repetido en
+POST /empleados responde 409.
+"""
+import argparse
+import asyncio
+import datetime
+import hmac
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import busqueda
+import inventario
+import libro_ganancias
+import metricas
+import reportes
+import servicios
+
+# Dirección y puerto en los que escucha la API
+HOST_API = os.environ.get('TRANSFERENCIAS_API_HOST', '127.0.0.1')
+PUERTO_API = int(os.environ.get('TRANSFERENCIAS_API_PUERTO', '8080'))
+
+# Token compartido exigido en la cabecera Authorization (sin definir, no se exige)
+TOKEN_API = os.environ.get('TRANSFERENCIAS_API_TOKEN')
+
+# Hilos que ejecutan el trabajo con la base de datos. Conviene que sean más que las
+# conexiones del pool: los que escriben solo esperan al escritor
+HILOS_API = int(os.environ.get('TRANSFERENCIAS_API_HILOS', '32'))
+
+# Tamaño máximo del cuerpo de un pedido y de un lote
+MAXIMO_CUERPO = 8 * 1024 * 1024
+MAXIMO_LOTE = 5000
+
+# Segundos que una conexión puede quedar inactiva antes de cerrarla
+ESPERA_INACTIVA = 30
+
+ESTADOS_HTTP = {200: 'OK', 201: 'Created', 207: 'Multi-Status', 400: 'Bad Request', 401: 'Unauthorized',
+                403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+# Filas máximas por página del listado de transferencias
+MAXIMO_PAGINA = 500
+
+ROLES = ('administrador', 'registrador', 'confirmador')
+
+log = logging.getLogger('transferencias.api')
+
+
+class ErrorApi(Exception):
+    """Error que se devuelve al cliente con su código HTTP"""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class Pedido:
+    __slots__ = ('metodo', 'ruta', 'consulta', 'cabeceras', 'cuerpo', 'empleado')
+
+    def __init__(self, metodo, ruta, consulta, cabeceras, cuerpo):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.consulta = consulta
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+        self.empleado = None
+
+    def json(self):
+        if not self.cuerpo:
+            raise ErrorApi(400, "El pedido no tiene cuerpo JSON.")
+        try:
+            return json.loads(self.cuerpo)
+        except ValueError:
+            raise ErrorApi(400, "El cuerpo no es JSON válido.")
+
+    def parametro(self, nombre, tipo=str, defecto=None):
+        valores = self.consulta.get(nombre)
+        if not valores or valores[0] == '':
+            return defecto
+        try:
+            return tipo(valores[0])
+        except ValueError:
+            raise ErrorApi(400, f"Parámetro inválido: {nombre}={valores[0]!r}.")
+
+
+def _mes(texto):
+    anio, mes = (int(parte) for parte in texto.split('-'))
+    if not 1 <= mes <= 12:
+        raise ValueError(texto)
+    return mes, anio
+
+
+def _tabla(df):
+    """Convierte un DataFrame (índice incluido) en una lista de diccionarios"""
+    df = df.reset_index() if df.index.names[0] is not None else df
+    if df.columns.nlevels > 1:
+        # Las tablas dinámicas con varios valores tienen columnas como ('cantidad', 'entregada')
+        df = df.set_axis(['_'.join(str(parte) for parte in columna if parte != '') for columna in df.columns], axis=1)
+    return df.to_dict(orient='records')
+
+
+def _fila_transferencia(fila):
+    return dict(zip(('id', 'fecha_solicitud', 'remitente_nombre', 'destinatario_nombre', 'destinatario_telefono',
+                     'capital', 'fecha_confirmacion', 'registrador', 'confirmador', 'estado'), fila))
+
+
+# Operaciones: cada una recibe el pedido y devuelve (estado, cuerpo). Corren en el pool de hilos.
+
+def salud(pedido):
+    return 200, {"estado": "ok"}
+
+
+def listar_empleados(pedido):
+    return 200, {"empleados": [dict(zip(('id', 'nombre', 'rol', 'porcentaje_ganancia'), fila))
+                               for fila in servicios.consultar_empleados()]}
+
+
+def agregar_empleado(pedido):
+    datos = pedido.json()
+    try:
+        id_empleado, nombre, rol = int(datos['id']), str(datos['nombre']).strip(), datos['rol']
+        porcentaje = float(datos.get('porcentaje_ganancia', 0.0))
+    except (KeyError, TypeError, ValueError):
+        raise ErrorApi(400, "Se requieren 'id', 'nombre' y 'rol'; 'porcentaje_ganancia' es opcional.")
+    if rol not in ROLES or not nombre:
+        raise ErrorApi(400, f"El rol debe ser uno de {', '.join(ROLES)} y el nombre no puede quedar vacío.")
+    # Los mismos límites que el formulario de la interfaz
+    if not (math.isfinite(porcentaje) and 0 <= porcentaje <= 100):
+        raise ErrorApi(400, "'porcentaje_ganancia' debe estar entre 0 y 100.")
+    existente = f"Ya existe un empleado con el ID {id_empleado}."
+    if servicios.obtener_empleado_por_id(id_empleado):
+        raise ErrorApi(409, existente)
+    try:
+        servicios.agregar_empleado(id_empleado, nombre, rol, porcentaje)
+    except sqlite3.IntegrityError:
+        # Otro pedido agregó el mismo ID entre la verificación y la inserción
+        raise ErrorApi(409, existente)
+    return 201, {"id": id_empleado}
+
+
+def listar_transferencias(pedido):
+    filtros = {
+        'estado': pedido.parametro('estado'),
+        'fecha_desde': pedido.parametro('desde', datetime.date.fromisoformat),
+        'fecha_hasta': pedido.parametro('hasta', datetime.date.fromisoformat),
+        'registrador_id': pedido.parametro('registrador', int),
+        'capital_min': pedido.parametro('capital_min', float),
+        'capital_max': pedido.parametro('capital_max', float),
+        'incluir_archivo': pedido.parametro('archivo') in ('1', 'true', 'si'),
+    }
+    despues_de = None
+    if pedido.parametro('despues_de'):
+        # La clave de la página siguiente viaja como 'fecha_solicitud|id'
+        fecha, _, transferencia_id = pedido.parametro('despues_de').rpartition('|')
+        try:
+            despues_de = (fecha, int(transferencia_id))
+        except ValueError:
+            raise ErrorApi(400, "Parámetro inválido: despues_de.")
+    tamano = pedido.parametro('tamano', int, servicios.TAMANO_PAGINA)
+    if not 1 <= tamano <= MAXIMO_PAGINA:
+        raise ErrorApi(400, f"Parámetro inválido: tamano debe estar entre 1 y {MAXIMO_PAGINA}.")
+    filas, siguiente = servicios.consultar_pagina_transferencias(
+        pedido.empleado[2], pedido.empleado[0], filtros, despues_de, tamano)
+    return 200, {"transferencias": [_fila_transferencia(fila) for fila in filas],
+                 "siguiente": f"{siguiente[0]}|{siguiente[1]}" if siguiente else None}
+
+
+def registrar_transferencias(pedido):
+    datos = pedido.json()
+    lote = datos.get('transferencias') if isinstance(datos, dict) and 'transferencias' in datos else [datos]
+    if not isinstance(lote, list) or not lote:
+        raise ErrorApi(400, "Se espera una transferencia o {'transferencias': [...]}.")
+    if len(lote) > MAXIMO_LOTE:
+        raise ErrorApi(413, f"El lote supera las {MAXIMO_LOTE} transferencias.")
+    resultados = servicios.registrar_transferencias(pedido.empleado[0], lote)
+    registradas = sum(error is None for _, error in resultados)
+    # 201 si se registraron todas, 207 si solo algunas y 400 si ninguna; el cuerpo
+    # siempre trae el resultado de cada una
+    estado = 201 if registradas == len(resultados) else 207 if registradas else 400
+    return estado, {"resultados": [{"id": transferencia_id} if error is None else {"error": error}
+                                   for transferencia_id, error in resultados]}
+
+
+def editar_transferencias(pedido):
+    datos = pedido.json()
+    cambios = datos.get('cambios') if isinstance(datos, dict) else None
+    if not isinstance(cambios, dict) or not all(isinstance(campos, dict) for campos in cambios.values()):
+        raise ErrorApi(400, "Se espera {'cambios': {id: {campo: valor}}}.")
+    try:
+        aplicados = servicios.editar_transferencias({int(i): campos for i, campos in cambios.items()}, pedido.empleado[0])
+    except ValueError as error:
+        raise ErrorApi(400, str(error))
+    return 200, {"editadas": {str(transferencia_id): {campo: {"anterior": anterior, "nuevo": nuevo}
+                                                      for campo, (anterior, nuevo) in campos.items()}
+                              for transferencia_id, campos in aplicados.items()}}
+
+
+def confirmar_entregas(pedido):
+    datos = pedido.json()
+    ids = datos.get('ids') if isinstance(datos, dict) else None
+    # Solo una lista de enteros: int() aceptaría textos y recorrería cualquier iterable
+    if not isinstance(ids, list) or not all(type(transferencia_id) is int for transferencia_id in ids):
+        raise ErrorApi(400, "Se espera {'ids': [id, ...]} con IDs enteros.")
+    if len(ids) > MAXIMO_LOTE:
+        raise ErrorApi(413, f"El lote supera las {MAXIMO_LOTE} transferencias.")
+    confirmadas = servicios.confirmar_transferencias_entregadas(ids, pedido.empleado[0]) if ids else []
+    return 200, {"confirmadas": confirmadas, "omitidas": sorted(set(ids) - set(confirmadas))}
+
+
+def historial(pedido, transferencia_id):
+    filas = servicios.consultar_historial_ediciones(int(transferencia_id), incluir_archivo=True)
+    return 200, {"historial": [dict(zip(('fecha_edicion', 'editor', 'campo', 'valor_anterior', 'valor_nuevo'), fila))
+                               for fila in filas]}
+
+
+def movimientos_ganancias(pedido, transferencia_id):
+    filas = libro_ganancias.consultar_movimientos(int(transferencia_id))
+    return 200, {"movimientos": [dict(zip(('fecha', 'empleado', 'concepto', 'ganancia_general', 'ganancia_personalizada'), fila))
+                                 for fila in filas]}
+
+
+def saldo_empleado(pedido, empleado_id):
+    empleado_id = int(empleado_id)
+    if pedido.empleado[2] != 'administrador' and pedido.empleado[0] != empleado_id:
+        raise ErrorApi(403, "Solo el administrador puede consultar el saldo de otro empleado.")
+    fecha = pedido.parametro('fecha', datetime.date.fromisoformat)
+    general, personalizada = libro_ganancias.saldo(empleado_id, fecha)
+    return 200, {"empleado_id": empleado_id, "fecha": fecha.isoformat() if fecha else None,
+                 "ganancia_general": general, "ganancia_personalizada": personalizada}
+
+
+def buscar(pedido):
+    texto = pedido.parametro('q', defecto='')
+    pagina = pedido.parametro('pagina', int, 0)
+    filas, hay_mas = busqueda.buscar(texto, pedido.empleado[2], pedido.empleado[0], pagina)
+    return 200, {"transferencias": [_fila_transferencia(fila) for fila in filas], "hay_mas": hay_mas}
+
+
+def consultar_inventario(pedido):
+    hoy = datetime.date.today()
+    mes, anio = pedido.parametro('mes', int, hoy.month), pedido.parametro('anio', int, hoy.year)
+    capital, cantidad, ganancia = inventario.consultar_mes(mes, anio)
+    return 200, {"anio": anio, "mes": mes, "capital_entregado": capital,
+                 "cantidad_transferencias": cantidad, "ganancia_general": ganancia}
+
+
+def reporte_ganancias(pedido):
+    hoy = datetime.date.today()
+    mes_desde, anio_desde = pedido.parametro('desde', _mes, (hoy.month, hoy.year))
+    mes_hasta, anio_hasta = pedido.parametro('hasta', _mes, (mes_desde, anio_desde))
+    agrupacion = pedido.parametro('agrupacion', defecto="Mes")
+    if agrupacion not in reportes.AGRUPACIONES:
+        raise ErrorApi(400, f"La agrupación debe ser una de {', '.join(reportes.AGRUPACIONES)}.")
+    reporte = reportes.generar_reporte(mes_desde, anio_desde, mes_hasta, anio_hasta, agrupacion, incluir_archivo=True)
+    return 200, {
+        "total_ganancia_general": reporte["total_ganancia_general"],
+        "por_empleado": _tabla(reporte["por_empleado"]),
+        "por_rol": _tabla(reporte["por_rol"]),
+        "por_periodo": _tabla(reporte["por_periodo"]),
+        "transferencias": _tabla(reporte["transferencias"]),
+    }
+
+
+# (método, patrón de la ruta, operación, roles permitidos o None si no requiere empleado)
+RUTAS = [
+    ('GET', r'/salud', salud, None),
+    ('GET', r'/empleados', listar_empleados, ('administrador',)),
+    ('POST', r'/empleados', agregar_empleado, ('administrador',)),
+    ('GET', r'/transferencias', listar_transferencias, ROLES),
+    ('POST', r'/transferencias', registrar_transferencias, ('registrador',)),
+    ('PATCH', r'/transferencias', editar_transferencias, ('registrador',)),
+    ('POST', r'/confirmaciones', confirmar_entregas, ('confirmador',)),
+    ('GET', r'/transferencias/(\d+)/historial', historial, ('administrador', 'registrador')),
+    ('GET', r'/transferencias/(\d+)/ganancias', movimientos_ganancias, ('administrador',)),
+    ('GET', r'/empleados/(\d+)/saldo', saldo_empleado, ROLES),
+    ('GET', r'/buscar', buscar, ROLES),
+    ('GET', r'/inventario', consultar_inventario, ('administrador',)),
+    ('GET', r'/reportes/ganancias', reporte_ganancias, ('administrador',)),
+]
+_RUTAS = [(metodo, re.compile(patron + r'/?'), operacion, roles) for metodo, patron, operacion, roles in RUTAS]
+
+
+def _resolver(pedido):
+    """Busca la operación de la ruta, autentica al empleado y devuelve (operacion, argumentos)"""
+    metodos = []
+    for metodo, patron, operacion, roles in _RUTAS:
+        coincidencia = patron.fullmatch(pedido.ruta)
+        if not coincidencia:
+            continue
+        if metodo != pedido.metodo:
+            metodos.append(metodo)
+            continue
+        if roles is not None:
+            _autenticar(pedido, roles)
+        return operacion, coincidencia.groups()
+    if metodos:
+        raise ErrorApi(405, f"Método no permitido; use {', '.join(metodos)}.")
+    raise ErrorApi(404, f"No existe la ruta {pedido.ruta}.")
+
+
+def _autenticar(pedido, roles):
+    if TOKEN_API:
+        recibido = pedido.cabeceras.get('authorization', '')
+        if not hmac.compare_digest(recibido.encode(), f"Bearer {TOKEN_API}".encode()):
+            raise ErrorApi(401, "Token inválido.")
+    try:
+        empleado_id = int(pedido.cabeceras['x-empleado-id'])
+    except (KeyError, ValueError):
+        raise ErrorApi(401, "Falta la cabecera X-Empleado-Id.")
+    pedido.empleado = servicios.obtener_empleado_por_id(empleado_id)
+    if pedido.empleado is None:
+        raise ErrorApi(401, f"Empleado {empleado_id} no encontrado.")
+    if pedido.empleado[2] not in roles:
+        raise ErrorApi(403, f"El rol {pedido.empleado[2]} no puede usar esta operación.")
+
+
+def atender(pedido):
+    """Ejecuta un pedido completo y devuelve (estado, cuerpo); corre en el pool de hilos"""
+    try:
+        operacion, argumentos = _resolver(pedido)
+        with metricas.medir('api', f"{pedido.metodo} {operacion.__name__}"):
+            return operacion(pedido, *argumentos)
+    except ErrorApi as error:
+        return error.estado, {"error": str(error)}
+    except Exception:
+        log.exception("Error atendiendo %s %s", pedido.metodo, pedido.ruta)
+        return 500, {"error": "Error interno."}
+
+
+def _a_json(valor):
+    # Escalares de numpy y fechas que llegan desde los reportes
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return str(valor)
+
+
+async def _leer_pedido(lector):
+    """Lee un pedido HTTP/1.1; devuelve (pedido, seguir) o (None, False) si el cliente cerró la conexión"""
+    linea = await lector.readline()
+    if not linea:
+        return None, False
+    try:
+        metodo, destino, version = linea.decode('latin-1').split()
+    except ValueError:
+        raise ErrorApi(400, "Línea de pedido inválida.")
+    cabeceras = {}
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b'\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        cabeceras[nombre.strip().lower()] = valor.strip()
+    try:
+        largo = int(cabeceras.get('content-length') or 0)
+    except ValueError:
+        raise ErrorApi(400, "Content-Length inválido.")
+    if largo > MAXIMO_CUERPO:
+        raise ErrorApi(413, "El cuerpo del pedido es demasiado grande.")
+    cuerpo = await lector.readexactly(largo) if largo else b''
+    url = urlsplit(destino)
+    seguir = cabeceras.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return Pedido(metodo.upper(), url.path, parse_qs(url.query), cabeceras, cuerpo), seguir
+
+
+def _respuesta(estado, cuerpo, seguir):
+    datos = json.dumps(cuerpo, ensure_ascii=False, default=_a_json).encode('utf-8')
+    encabezado = (f"HTTP/1.1 {estado} {ESTADOS_HTTP.get(estado, '')}\r\n"
+                  f"Content-Type: application/json; charset=utf-8\r\n"
+                  f"Content-Length: {len(datos)}\r\n"
+                  f"Connection: {'keep-alive' if seguir else 'close'}\r\n\r\n")
+    return encabezado.encode('latin-1') + datos
+
+
+async def _conexion(lector, escritor, ejecutor):
+    bucle = asyncio.get_running_loop()
+    try:
+        seguir = True
+        while seguir:
+            try:
+                pedido, seguir = await asyncio.wait_for(_leer_pedido(lector), ESPERA_INACTIVA)
+            except ErrorApi as error:
+                escritor.write(_respuesta(error.estado, {"error": str(error)}, False))
+                break
+            if pedido is None:
+                break
+            estado, cuerpo = await bucle.run_in_executor(ejecutor, atender, pedido)
+            escritor.write(_respuesta(estado, cuerpo, seguir))
+            await escritor.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        escritor.close()
+
+
+async def servir(host=HOST_API, puerto=PUERTO_API, hilos=HILOS_API, listo=None):
+    """Atiende la API hasta que se cancele la tarea; llama a listo(servidor) al empezar a escuchar"""
+    servicios.crear_tablas()
+    metricas.iniciar_servidor()
+    metricas.iniciar_exportacion()
+    with ThreadPoolExecutor(hilos, thread_name_prefix='api') as ejecutor:
+        servidor = await asyncio.start_server(lambda r, w: _conexion(r, w, ejecutor), host, puerto, backlog=1024)
+        if listo:
+            listo(servidor)
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP/JSON de transferencias.")
+    parser.add_argument('--host', default=HOST_API, help="Dirección en la que escuchar")
+    parser.add_argument('--puerto', type=int, default=PUERTO_API, help="Puerto en el que escuchar")
+    parser.add_argument('--hilos', type=int, default=HILOS_API, help="Hilos para el trabajo con la base de datos")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    log.info("API escuchando en http://%s:%d", args.host, args.puerto)
+    try:
+        asyncio.run(servir(args.host, args.puerto, args.hilos))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Archivo mensual de transferencias entregadas.
+
+Las transferencias entregadas hace más de EDAD_ARCHIVO_DIAS días se mueven, junto con
+su historial de ediciones, a un archivo SQLite por mes de solicitud
+(archivo/transferencias_AAAA_MM.db). Así la base principal solo conserva lo pendiente
+y lo reciente, y sus recorridos, copias de seguridad y VACUUM no crecen con la
+historia.
+
+La tabla archivo_meses de la base principal es el catálogo de los meses archivados:
+guarda, por mes, la cantidad y el capital de las transferencias archivadas y su rango
+de IDs y fechas de confirmación, de modo que el inventario y los reportes pueden
+sumar lo archivado sin abrir los archivos. El listado, el historial de ediciones y la
+conciliación adjuntan (ATTACH) solo los meses que necesitan.
+
+    python archivo.py --dias 180
+    python archivo.py --dias 180 --compactar
+    python archivo.py --listar
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import cache
+import db
+import migraciones
+
+# Antigüedad (en días desde la confirmación) a partir de la cual se archiva una transferencia entregada
+EDAD_ARCHIVO_DIAS = int(os.environ.get('TRANSFERENCIAS_ARCHIVO_DIAS', '180'))
+
+# Directorio de los archivos mensuales (por defecto, 'archivo' junto a la base principal)
+DIRECTORIO_ARCHIVO = os.environ.get('TRANSFERENCIAS_ARCHIVO')
+
+# Transferencias movidas por transacción; cada lote retiene el bloqueo de escritura unos 40 ms
+LOTE_ARCHIVO = 2000
+
+# Nombre con el que se adjunta un archivo mensual a la conexión
+ESQUEMA = 'archivo'
+
+COLUMNAS_TRANSFERENCIAS = ('id', 'fecha_solicitud', 'remitente_nombre', 'destinatario_nombre', 'destinatario_telefono',
+                           'capital', 'fecha_confirmacion', 'confirmador_id', 'registrador_id', 'estado')
+
+COLUMNAS_HISTORIAL = ('id', 'transferencia_id', 'fecha_edicion', 'empleado_editor_id', 'campo_editado',
+                      'valor_anterior', 'valor_nuevo')
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def directorio():
+    """Devuelve el directorio de los archivos mensuales de la base configurada"""
+    return DIRECTORIO_ARCHIVO or os.path.join(os.path.dirname(os.path.abspath(db.pool.ruta)), 'archivo')
+
+
+def nombre_archivo(anio, mes):
+    return f'transferencias_{anio:04d}_{mes:02d}.db'
+
+
+def _crear_esquema(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ESQUEMA}.transferencias (
+            id INTEGER PRIMARY KEY,
+            fecha_solicitud TEXT NOT NULL,
+            remitente_nombre TEXT NOT NULL,
+            destinatario_nombre TEXT NOT NULL,
+            destinatario_telefono TEXT NOT NULL,
+            capital REAL NOT NULL,
+            fecha_confirmacion TEXT,
+            confirmador_id INTEGER,
+            registrador_id INTEGER NOT NULL,
+            estado TEXT NOT NULL
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ESQUEMA}.historial_ediciones (
+            id INTEGER PRIMARY KEY,
+            transferencia_id INTEGER NOT NULL,
+            fecha_edicion TEXT NOT NULL,
+            empleado_editor_id INTEGER NOT NULL,
+            campo_editado TEXT NOT NULL,
+            valor_anterior TEXT,
+            valor_nuevo TEXT
+        )
+    ''')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {ESQUEMA}.idx_transferencias_fecha ON transferencias (fecha_solicitud)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {ESQUEMA}.idx_transferencias_registrador ON transferencias (registrador_id, fecha_solicitud)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS {ESQUEMA}.idx_historial_transferencia ON historial_ediciones (transferencia_id)')
+
+
+@contextmanager
+def adjuntar(cursor, anio, mes, crear=False):
+    """
+    Adjunta el archivo del mes a la conexión del cursor como el esquema 'archivo'.
+
+    La conexión no debe tener una transacción abierta; el archivo se separa al salir.
+    Solo con crear se adjunta un archivo que todavía no existe (al archivar).
+
+    Raises:
+        FileNotFoundError: Si falta el archivo de un mes del catálogo.
+    """
+    ruta = os.path.join(directorio(), nombre_archivo(anio, mes))
+    # ATTACH crearía un archivo vacío y la consulta fallaría después con 'no such table'
+    if not crear and not os.path.isfile(ruta):
+        raise FileNotFoundError(f"Falta el archivo del mes archivado {anio:04d}-{mes:02d}: '{ruta}'.")
+    cursor.execute('ATTACH DATABASE ? AS ' + ESQUEMA, (ruta,))
+    try:
+        yield ESQUEMA
+    finally:
+        cursor.execute('DETACH DATABASE ' + ESQUEMA)
+
+
+def meses_archivados(desde=None, hasta=None, confirmacion_desde=None, confirmacion_hasta=None, transferencia_id=None):
+    """
+    Devuelve los (anio, mes) archivados, del más reciente al más antiguo.
+
+    Args:
+        desde, hasta: Fechas de solicitud (texto 'AAAA-MM-DD...'); se incluyen los meses
+            que pueden tener transferencias solicitadas en [desde, hasta).
+        confirmacion_desde, confirmacion_hasta: Igual, para la fecha de confirmación.
+        transferencia_id: Solo los meses cuyo rango de IDs contiene este ID.
+    """
+    condiciones = ['cantidad_transferencias > 0']
+    parametros = []
+    if desde:
+        condiciones.append('anio * 100 + mes >= ?')
+        parametros.append(int(desde[:4]) * 100 + int(desde[5:7]))
+    if hasta:
+        condiciones.append("printf('%04d-%02d', anio, mes) < ?")
+        parametros.append(hasta)
+    if confirmacion_desde:
+        condiciones.append('confirmacion_hasta >= ?')
+        parametros.append(confirmacion_desde)
+    if confirmacion_hasta:
+        condiciones.append('confirmacion_desde < ?')
+        parametros.append(confirmacion_hasta)
+    if transferencia_id is not None:
+        condiciones.append('? BETWEEN id_desde AND id_hasta')
+        parametros.append(transferencia_id)
+    with db.lectura() as cursor:
+        cursor.execute(f'''
+            SELECT anio, mes FROM archivo_meses
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY anio DESC, mes DESC
+        ''', parametros)
+        return cursor.fetchall()
+
+
+def catalogo():
+    """Devuelve las filas del catálogo (anio, mes, archivo, cantidad, capital, fecha_archivo), de la más reciente a la más antigua"""
+    with db.lectura() as cursor:
+        cursor.execute('''
+            SELECT anio, mes, archivo, cantidad_transferencias, capital_entregado, fecha_archivo
+            FROM archivo_meses
+            ORDER BY anio DESC, mes DESC
+        ''')
+        return cursor.fetchall()
+
+
+def _mover(cursor, ids, anio, mes):
+    """
+    Copia las transferencias del mes al archivo adjunto y las borra de la base
+    principal; devuelve las movidas. El catálogo del mes se actualiza en la misma
+    transacción que el borrado, así una interrupción nunca deja transferencias fuera
+    de la principal sin que el catálogo las cuente.
+    """
+    ids_json = json.dumps(ids)
+    columnas = ', '.join(COLUMNAS_TRANSFERENCIAS)
+    columnas_historial = ', '.join(COLUMNAS_HISTORIAL)
+
+    # Primero se confirma la copia: en modo WAL cada base confirma por separado y la
+    # principal lo haría antes que el archivo
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {ESQUEMA}.transferencias ({columnas})
+            SELECT {columnas} FROM main.transferencias WHERE id IN (SELECT value FROM json_each(?))
+        ''', (ids_json,))
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {ESQUEMA}.historial_ediciones ({columnas_historial})
+            SELECT {columnas_historial} FROM main.historial_ediciones WHERE transferencia_id IN (SELECT value FROM json_each(?))
+        ''', (ids_json,))
+        cursor.connection.commit()
+    except BaseException:
+        cursor.connection.rollback()
+        raise
+
+    # Luego se borran de la principal solo las que no cambiaron desde la copia (NOT
+    # INDEXED: buscar por ID en lugar de recorrer el índice de estado)
+    iguales = ' AND '.join(f't.{columna} IS a.{columna}' for columna in COLUMNAS_TRANSFERENCIAS)
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {ESQUEMA}.historial_ediciones ({columnas_historial})
+            SELECT {columnas_historial} FROM main.historial_ediciones WHERE transferencia_id IN (SELECT value FROM json_each(?))
+        ''', (ids_json,))
+        cursor.execute(f'''
+            DELETE FROM main.transferencias
+            WHERE id IN (
+                SELECT t.id FROM main.transferencias AS t NOT INDEXED JOIN {ESQUEMA}.transferencias a ON a.id = t.id
+                WHERE t.id IN (SELECT value FROM json_each(?)) AND t.estado = 'entregada' AND {iguales}
+            )
+            RETURNING id
+        ''', (ids_json,))
+        movidas = [fila[0] for fila in cursor.fetchall()]
+        movidas_json = json.dumps(movidas)
+        cursor.execute('DELETE FROM main.historial_ediciones WHERE transferencia_id IN (SELECT value FROM json_each(?))',
+                       (movidas_json,))
+        # Las que cambiaron se quedan en la principal y se copiarán en la próxima pasada
+        cursor.execute(f'''
+            DELETE FROM {ESQUEMA}.transferencias
+            WHERE id IN (SELECT value FROM json_each(?)) AND id NOT IN (SELECT value FROM json_each(?))
+        ''', (ids_json, movidas_json))
+        cursor.execute(f'''
+            DELETE FROM {ESQUEMA}.historial_ediciones
+            WHERE transferencia_id IN (SELECT value FROM json_each(?)) AND transferencia_id NOT IN (SELECT value FROM json_each(?))
+        ''', (ids_json, movidas_json))
+        if movidas:
+            cache.marcar(cursor, 'transferencias', 'historial_ediciones')
+            _actualizar_catalogo(cursor, anio, mes)
+        cursor.connection.commit()
+    except BaseException:
+        cursor.connection.rollback()
+        raise
+    return movidas
+
+
+def _actualizar_catalogo(cursor, anio, mes):
+    cursor.execute(f'''
+        INSERT INTO archivo_meses
+        (anio, mes, archivo, cantidad_transferencias, capital_entregado, id_desde, id_hasta,
+         confirmacion_desde, confirmacion_hasta, fecha_archivo)
+        SELECT ?, ?, ?, COUNT(*), COALESCE(SUM(capital), 0.0), MIN(id), MAX(id),
+               MIN(fecha_confirmacion), MAX(fecha_confirmacion), ?
+        FROM {ESQUEMA}.transferencias
+        WHERE id NOT IN (SELECT id FROM main.transferencias)
+        ON CONFLICT (anio, mes) DO UPDATE SET
+            archivo = excluded.archivo,
+            cantidad_transferencias = excluded.cantidad_transferencias,
+            capital_entregado = excluded.capital_entregado,
+            id_desde = excluded.id_desde,
+            id_hasta = excluded.id_hasta,
+            confirmacion_desde = excluded.confirmacion_desde,
+            confirmacion_hasta = excluded.confirmacion_hasta,
+            fecha_archivo = excluded.fecha_archivo
+    ''', (anio, mes, nombre_archivo(anio, mes), datetime.datetime.now().strftime(FORMATO_FECHA)))
+    cache.marcar(cursor, 'archivo_meses')
+
+
+def archivar(dias=EDAD_ARCHIVO_DIAS):
+    """
+    Mueve a los archivos mensuales las transferencias entregadas hace más de 'dias' días.
+
+    Usa una conexión propia y no el escritor: ATTACH no se puede ejecutar dentro de
+    la transacción que el escritor mantiene abierta. Cada lote toma el bloqueo de
+    escritura con BEGIN IMMEDIATE, así que las escrituras de la aplicación solo
+    esperan lo que dura un lote.
+
+    Returns:
+        Un diccionario {(anio, mes): transferencias movidas}.
+    """
+    limite = (datetime.datetime.now() - datetime.timedelta(days=dias)).strftime(FORMATO_FECHA)
+    os.makedirs(directorio(), exist_ok=True)
+    conexion = db.abrir_conexion(db.pool.ruta)
+    cursor = conexion.cursor()
+    movidas = {}
+    try:
+        cursor.execute('''
+            SELECT DISTINCT CAST(strftime('%Y', fecha_solicitud) AS INTEGER), CAST(strftime('%m', fecha_solicitud) AS INTEGER)
+            FROM transferencias
+            WHERE estado = 'entregada' AND fecha_confirmacion < ?
+            ORDER BY 1, 2
+        ''', (limite,))
+        for anio, mes in cursor.fetchall():
+            inicio = datetime.date(anio, mes, 1)
+            fin = datetime.date(anio + mes // 12, mes % 12 + 1, 1)
+            with adjuntar(cursor, anio, mes, crear=True):
+                _crear_esquema(cursor)
+                while True:
+                    cursor.execute('''
+                        SELECT id FROM transferencias
+                        WHERE estado = 'entregada' AND fecha_solicitud >= ? AND fecha_solicitud < ?
+                              AND fecha_confirmacion < ?
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (inicio.isoformat(), fin.isoformat(), limite, LOTE_ARCHIVO))
+                    ids = [fila[0] for fila in cursor.fetchall()]
+                    if not ids:
+                        break
+                    cantidad = len(_mover(cursor, ids, anio, mes))
+                    movidas[(anio, mes)] = movidas.get((anio, mes), 0) + cantidad
+                    if cantidad == 0:
+                        break
+    finally:
+        cursor.close()
+        conexion.close()
+    return movidas
+
+
+def compactar():
+    """Devuelve al sistema el espacio liberado en la base principal"""
+    conexion = db.abrir_conexion(db.pool.ruta)
+    try:
+        conexion.execute('VACUUM')
+        conexion.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conexion.close()
+
+
+def consultar_historial_ediciones(transferencia_id):
+    """Devuelve el historial de una transferencia archivada, en el formato de servicios.consultar_historial_ediciones"""
+    meses = meses_archivados(transferencia_id=transferencia_id)
+    with db.lectura() as cursor:
+        for anio, mes in meses:
+            with adjuntar(cursor, anio, mes):
+                cursor.execute(f'''
+                    SELECT he.fecha_edicion, e.nombre, he.campo_editado, he.valor_anterior, he.valor_nuevo
+                    FROM {ESQUEMA}.historial_ediciones he
+                    JOIN empleados e ON he.empleado_editor_id = e.id
+                    WHERE he.transferencia_id = ?
+                    ORDER BY he.fecha_edicion DESC
+                ''', (transferencia_id,))
+                historial = cursor.fetchall()
+            if historial:
+                return historial
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archiva las transferencias entregadas antiguas en archivos mensuales.")
+    parser.add_argument('--dias', type=int, default=EDAD_ARCHIVO_DIAS,
+                        help=f"Antigüedad mínima desde la confirmación, en días (por defecto {EDAD_ARCHIVO_DIAS})")
+    parser.add_argument('--compactar', action='store_true', help="Ejecuta VACUUM sobre la base principal después de archivar")
+    parser.add_argument('--listar', action='store_true', help="Muestra los meses archivados sin archivar nada")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    if args.listar:
+        for anio, mes, nombre, cantidad, capital, fecha in catalogo():
+            print(f"{anio:04d}-{mes:02d}  {cantidad:>8} transferencias  {capital:>14.2f}  {nombre}  (archivado {fecha})")
+        return 0
+
+    movidas = archivar(args.dias)
+    for (anio, mes), cantidad in sorted(movidas.items()):
+        print(f"{anio:04d}-{mes:02d}: {cantidad} transferencias archivadas")
+    print(f"Total: {sum(movidas.values())} transferencias archivadas en {directorio()}.")
+    if args.compactar:
+        compactar()
+        print("Base principal compactada.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
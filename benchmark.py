@@ -0,0 +1,282 @@
+"""
+Benchmark de las operaciones principales sobre datos sintéticos.
+
+Genera en una base de datos de prueba empleados de los tres roles, transferencias
+repartidas en varios meses y un historial de ediciones, mide las operaciones más
+usadas de la aplicación y escribe los resultados en JSON:
+
+    python benchmark.py --transferencias 100000 --salida resultados.json
+    python benchmark.py --transferencias 5000000 --bd /tmp/bench.db
+
+Si la base indicada con --bd ya tiene transferencias, se reutiliza sin regenerar.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import busqueda
+import cache
+import conciliacion
+import db
+import inventario
+import libro_ganancias
+import reportes
+import servicios
+
+# Filas generadas e insertadas por cada lote
+TAMANO_LOTE = 100_000
+
+# Sesiones simultáneas y registros totales de la prueba de escrituras concurrentes
+HILOS_CONCURRENTES = 8
+REGISTROS_CONCURRENTES = 400
+
+NOMBRES = np.array(["Ana", "Luis", "María", "José", "Carmen", "Pedro", "Rosa", "Jorge", "Elena", "Raúl",
+                    "Isabel", "Carlos", "Lucía", "Miguel", "Sofía", "Andrés", "Laura", "Diego", "Marta", "Pablo"])
+APELLIDOS = np.array(["García", "Rodríguez", "González", "Fernández", "López", "Martínez", "Sánchez", "Pérez",
+                      "Gómez", "Martín", "Jiménez", "Ruiz", "Hernández", "Díaz", "Moreno", "Álvarez"])
+CAMPOS_EDITADOS = np.array(list(servicios.CAMPOS_EDITABLES))
+
+
+def _nombres(rng, cantidad):
+    return np.char.add(np.char.add(rng.choice(NOMBRES, cantidad), " "), rng.choice(APELLIDOS, cantidad))
+
+
+def _fechas(segundos):
+    """Convierte segundos desde la época a texto 'YYYY-MM-DD HH:MM:SS'"""
+    texto = np.datetime_as_string(segundos.astype("datetime64[s]"), unit="s")
+    return np.char.replace(texto, "T", " ")
+
+
+def generar_datos(transferencias, registradores=20, confirmadores=10, meses=24,
+                  proporcion_ediciones=0.05, semilla=42):
+    """
+    Llena la base de datos configurada en db con un conjunto de datos sintético.
+
+    Args:
+        transferencias: Cantidad de transferencias a generar.
+        registradores, confirmadores: Empleados de cada rol (además de un administrador).
+        meses: Meses hacia atrás, desde hoy, en los que se reparten las solicitudes.
+        proporcion_ediciones: Fracción de transferencias con historial de ediciones.
+        semilla: Semilla del generador aleatorio.
+    """
+    rng = np.random.default_rng(semilla)
+    servicios.crear_tablas()
+
+    ids_registradores = np.arange(2, 2 + registradores)
+    ids_confirmadores = np.arange(2 + registradores, 2 + registradores + confirmadores)
+    empleados = [(1, "Administrador", "administrador", 10.0)]
+    empleados += [(int(i), f"Registrador {i}", "registrador", round(float(rng.uniform(5, 25)), 2)) for i in ids_registradores]
+    empleados += [(int(i), f"Confirmador {i}", "confirmador", round(float(rng.uniform(5, 25)), 2)) for i in ids_confirmadores]
+
+    fin = int(time.time())
+    inicio = fin - meses * 30 * 24 * 3600
+
+    with db.transaccion() as cursor:
+        cursor.executemany('INSERT INTO empleados (id, nombre, rol, porcentaje_ganancia) VALUES (?, ?, ?, ?)', empleados)
+
+        for desde in range(0, transferencias, TAMANO_LOTE):
+            cantidad = min(TAMANO_LOTE, transferencias - desde)
+            solicitud = rng.integers(inicio, fin, cantidad)
+            entregada = rng.random(cantidad) < 0.9
+            confirmacion = np.minimum(solicitud + rng.integers(60, 3 * 24 * 3600, cantidad), fin)
+            capital = np.round(rng.lognormal(5, 1, cantidad), 2)
+            telefonos = np.char.add("+53 5", rng.integers(1_000_000, 9_999_999, cantidad).astype(str))
+            fechas_confirmacion = np.where(entregada, _fechas(confirmacion), None)
+            confirmador = np.where(entregada, rng.choice(ids_confirmadores, cantidad), None)
+            cursor.executemany('''
+                INSERT INTO transferencias
+                (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital,
+                 fecha_confirmacion, confirmador_id, registrador_id, estado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', zip(
+                _fechas(solicitud).tolist(), _nombres(rng, cantidad).tolist(), _nombres(rng, cantidad).tolist(),
+                telefonos.tolist(), capital.tolist(), fechas_confirmacion.tolist(),
+                [None if c is None else int(c) for c in confirmador.tolist()],
+                rng.choice(ids_registradores, cantidad).tolist(),
+                np.where(entregada, "entregada", "solicitada").tolist(),
+            ))
+
+        # Historial: entre una y tres ediciones para una muestra de transferencias
+        editadas = rng.choice(np.arange(1, transferencias + 1), int(transferencias * proporcion_ediciones), replace=False)
+        ediciones = np.repeat(editadas, rng.integers(1, 4, len(editadas)))
+        cantidad = len(ediciones)
+        cursor.executemany('''
+            INSERT INTO historial_ediciones
+            (transferencia_id, fecha_edicion, empleado_editor_id, campo_editado, valor_anterior, valor_nuevo)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', zip(
+            ediciones.tolist(), _fechas(rng.integers(inicio, fin, cantidad)).tolist(),
+            rng.choice(ids_registradores, cantidad).tolist(), rng.choice(CAMPOS_EDITADOS, cantidad).tolist(),
+            rng.integers(1, 1000, cantidad).astype(str).tolist(), rng.integers(1, 1000, cantidad).astype(str).tolist(),
+        ))
+        cache.marcar(cursor, 'empleados', 'transferencias', 'historial_ediciones')
+
+    libro_ganancias.cargar_historia()
+    inventario.reconstruir()
+
+
+def medir(nombre, funcion, repeticiones):
+    """Ejecuta la función varias veces y devuelve las estadísticas de tiempo en milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "operacion": nombre,
+        "repeticiones": repeticiones,
+        "media_ms": statistics.fmean(tiempos),
+        "mediana_ms": statistics.median(tiempos),
+        "p95_ms": tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))],
+        "min_ms": tiempos[0],
+        "max_ms": tiempos[-1],
+    }
+
+
+def ejecutar(repeticiones=20, semilla=42):
+    """Mide las operaciones principales sobre la base de datos configurada y devuelve la lista de resultados"""
+    rng = np.random.default_rng(semilla)
+    with db.lectura() as cursor:
+        cursor.execute("SELECT id FROM empleados WHERE rol = 'registrador' ORDER BY id LIMIT 1")
+        registrador_id = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM empleados WHERE rol = 'confirmador' ORDER BY id LIMIT 1")
+        confirmador_id = cursor.fetchone()[0]
+        cursor.execute('SELECT MAX(id) FROM transferencias')
+        maximo_id = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM transferencias WHERE estado = 'solicitada' LIMIT ?", (repeticiones * 101,))
+        pendientes = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute('SELECT DISTINCT transferencia_id FROM historial_ediciones LIMIT 1000')
+        editadas = [fila[0] for fila in cursor.fetchall()] or [1]
+        cursor.execute('SELECT MAX(anio * 100 + mes) FROM inventario_mensual')
+        ultimo = cursor.fetchone()[0] or datetime.date.today().year * 100 + datetime.date.today().month
+
+    anio, mes = divmod(ultimo, 100)
+
+    def clave_aleatoria():
+        with db.lectura() as cursor:
+            cursor.execute('SELECT fecha_solicitud, id FROM transferencias WHERE id >= ? LIMIT 1',
+                           (int(rng.integers(1, maximo_id + 1)),))
+            return cursor.fetchone()
+
+    def confirmar_una():
+        servicios.confirmar_transferencia_entregada(pendientes.pop(), confirmador_id)
+
+    def confirmar_lote():
+        lote = [pendientes.pop() for _ in range(min(100, len(pendientes)))]
+        servicios.confirmar_transferencias_entregadas(lote, confirmador_id)
+
+    def editar_telefonos_lote():
+        ids = rng.integers(1, maximo_id + 1, 100).tolist()
+        servicios.editar_transferencias(
+            {i: {'destinatario_telefono': f"+53 5{int(rng.integers(1_000_000, 9_999_999))}"} for i in ids}, registrador_id)
+
+    def registrar_concurrente():
+        with ThreadPoolExecutor(HILOS_CONCURRENTES) as ejecutor:
+            list(ejecutor.map(lambda _: servicios.registrar_transferencia(
+                registrador_id, "Remitente Benchmark", "Destinatario Benchmark", "+53 50000000", 100.0),
+                range(REGISTROS_CONCURRENTES)))
+
+    operaciones = [
+        ("registrar_transferencia", lambda: servicios.registrar_transferencia(
+            registrador_id, "Remitente Benchmark", "Destinatario Benchmark", "+53 50000000", 100.0), repeticiones),
+        (f"registrar_concurrente_{HILOS_CONCURRENTES}_hilos_{REGISTROS_CONCURRENTES}", registrar_concurrente,
+         max(1, repeticiones // 10)),
+        ("confirmar_transferencia", confirmar_una, min(repeticiones, len(pendientes) // 101)),
+        ("confirmar_lote_100", confirmar_lote, min(repeticiones, len(pendientes) // 101)),
+        ("editar_telefonos_lote_100", editar_telefonos_lote, repeticiones),
+        ("listar_administrador_primera_pagina", lambda: servicios.consultar_pagina_transferencias('administrador'), repeticiones),
+        ("listar_administrador_pagina_aleatoria", lambda: servicios.consultar_pagina_transferencias(
+            'administrador', despues_de=clave_aleatoria()), repeticiones),
+        ("listar_administrador_filtrado", lambda: servicios.consultar_pagina_transferencias(
+            'administrador', filtros={'estado': 'entregada', 'fecha_desde': datetime.date(anio, mes, 1),
+                                      'capital_min': 100.0}), repeticiones),
+        ("listar_registrador", lambda: servicios.consultar_pagina_transferencias('registrador', registrador_id), repeticiones),
+        ("listar_pendientes_confirmador", lambda: servicios.consultar_pagina_transferencias('confirmador', confirmador_id), repeticiones),
+        # Sin caché (__wrapped__) se mide la consulta; con caché, una vista repetida sin escrituras de por medio
+        ("inventario_mensual", lambda: inventario.consultar_mes.__wrapped__(mes, anio), repeticiones),
+        ("inventario_tendencia_12_meses", lambda: inventario.consultar_rango.__wrapped__(1, anio - 1, mes, anio), repeticiones),
+        ("reporte_ganancias_mes", lambda: reportes.generar_reporte.__wrapped__(mes, anio, mes, anio), repeticiones),
+        ("reporte_ganancias_anual", lambda: reportes.generar_reporte.__wrapped__(1, anio, 12, anio, "Trimestre"), repeticiones),
+        ("reporte_ganancias_anual_cache", lambda: reportes.generar_reporte(1, anio, 12, anio, "Trimestre"), repeticiones),
+        ("obtener_empleado_cache", lambda: servicios.obtener_empleado_por_id(registrador_id), repeticiones),
+        ("buscar_nombre", lambda: busqueda.buscar(
+            f"{NOMBRES[int(rng.integers(len(NOMBRES)))]} {APELLIDOS[int(rng.integers(len(APELLIDOS)))]}", 'administrador'),
+         repeticiones),
+        ("buscar_telefono_prefijo", lambda: busqueda.buscar(f"535{int(rng.integers(100, 1000))}", 'administrador'), repeticiones),
+        ("historial_ediciones", lambda: servicios.consultar_historial_ediciones(
+            editadas[int(rng.integers(len(editadas)))]), repeticiones),
+        ("saldo_empleado", lambda: libro_ganancias.saldo.__wrapped__(registrador_id), repeticiones),
+        ("saldo_empleado_fecha_pasada", lambda: libro_ganancias.saldo.__wrapped__(
+            registrador_id, datetime.date(anio - 1, mes, 1 + int(rng.integers(28)))), repeticiones),
+        ("saldos_todos_los_empleados", lambda: libro_ganancias.saldos.__wrapped__(), repeticiones),
+        ("conciliacion_anual", lambda: conciliacion.comparar(1, anio, 12, anio), max(1, repeticiones // 10)),
+    ]
+    return [medir(nombre, funcion, veces) for nombre, funcion, veces in operaciones if veces > 0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las operaciones de transferencias sobre datos sintéticos.")
+    parser.add_argument('--transferencias', type=int, default=100_000, help="Transferencias a generar")
+    parser.add_argument('--registradores', type=int, default=20, help="Registradores a generar")
+    parser.add_argument('--confirmadores', type=int, default=10, help="Confirmadores a generar")
+    parser.add_argument('--meses', type=int, default=24, help="Meses de historia a generar")
+    parser.add_argument('--ediciones', type=float, default=0.05, help="Fracción de transferencias editadas")
+    parser.add_argument('--repeticiones', type=int, default=20, help="Repeticiones de cada operación")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla del generador aleatorio")
+    parser.add_argument('--bd', help="Base de datos de prueba (por defecto, un archivo temporal)")
+    parser.add_argument('--salida', help="Archivo JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args(argv)
+
+    ruta = args.bd or os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "benchmark.db")
+    db.configurar(ruta)
+    servicios.crear_tablas()
+    with db.lectura() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM transferencias')
+        existentes = cursor.fetchone()[0]
+
+    segundos_generacion = None
+    if not existentes:
+        inicio = time.perf_counter()
+        generar_datos(args.transferencias, args.registradores, args.confirmadores, args.meses,
+                      args.ediciones, args.semilla)
+        segundos_generacion = time.perf_counter() - inicio
+
+    with db.lectura() as cursor:
+        filas = {tabla: cursor.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+                 for tabla in ('empleados', 'transferencias', 'historial_ediciones', 'ganancias_globales',
+                              'movimientos_ganancias')}
+
+    resultado = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "base_de_datos": ruta,
+        "parametros": vars(args),
+        "generacion_s": segundos_generacion,
+        "filas": filas,
+        "resultados": ejecutar(args.repeticiones, args.semilla),
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Búsqueda de transferencias por remitente, destinatario y teléfono.
+
+La tabla virtual transferencias_fts (FTS5) indexa los nombres sin distinguir
+mayúsculas ni acentos y el teléfono del destinatario reducido a sus dígitos, con
+índices de prefijo para que buscar el comienzo de un nombre o de un número no
+recorra todos los términos. Los triggers sobre transferencias la mantienen al día
+en cada alta, edición o baja, sin importar desde dónde se escriba.
+
+Para reconstruir el índice a partir de los datos existentes:
+
+    python busqueda.py --reconstruir
+"""
+import argparse
+import sys
+
+import db
+import migraciones
+
+# Resultados por página de búsqueda
+TAMANO_PAGINA = 20
+
+# Coincidencias más recientes que se ordenan por relevancia. Calcular el rango de
+# todas las coincidencias de una palabra común recorre buena parte de la tabla;
+# acotarlo mantiene la búsqueda en milisegundos y las más viejas se alcanzan
+# agregando palabras.
+MAXIMO_COINCIDENCIAS = 1000
+
+# Caracteres de formato que se quitan del teléfono antes de indexarlo
+SEPARADORES_TELEFONO = (' ', '-', '(', ')', '+', '.', '/')
+
+
+def _digitos(columna):
+    expresion = columna
+    for separador in SEPARADORES_TELEFONO:
+        expresion = f"replace({expresion}, '{separador}', '')"
+    return expresion
+
+
+def crear_tabla(cursor):
+    """Crea el índice de búsqueda y sus triggers, y lo llena si es nuevo"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transferencias_fts'")
+    existia = cursor.fetchone() is not None
+    # Sin contenido propio: solo guarda el índice, los datos se leen de transferencias
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transferencias_fts USING fts5 (
+            remitente_nombre, destinatario_nombre, telefono,
+            content = '', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_alta AFTER INSERT ON transferencias BEGIN
+            INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES (new.id, new.remitente_nombre, new.destinatario_nombre, {_digitos('new.destinatario_telefono')});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_baja AFTER DELETE ON transferencias BEGIN
+            INSERT INTO transferencias_fts (transferencias_fts, rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES ('delete', old.id, old.remitente_nombre, old.destinatario_nombre, {_digitos('old.destinatario_telefono')});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_edicion
+        AFTER UPDATE OF remitente_nombre, destinatario_nombre, destinatario_telefono ON transferencias BEGIN
+            INSERT INTO transferencias_fts (transferencias_fts, rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES ('delete', old.id, old.remitente_nombre, old.destinatario_nombre, {_digitos('old.destinatario_telefono')});
+            INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES (new.id, new.remitente_nombre, new.destinatario_nombre, {_digitos('new.destinatario_telefono')});
+        END
+    ''')
+    if not existia:
+        _reconstruir(cursor)
+
+
+def _reconstruir(cursor):
+    cursor.execute("INSERT INTO transferencias_fts (transferencias_fts) VALUES ('delete-all')")
+    cursor.execute(f'''
+        INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+        SELECT id, remitente_nombre, destinatario_nombre, {_digitos('destinatario_telefono')}
+        FROM transferencias
+    ''')
+
+
+def reconstruir():
+    """Vuelve a indexar todas las transferencias"""
+    return db.escribir(_crear_y_reconstruir)
+
+
+def _crear_y_reconstruir(cursor):
+    crear_tabla(cursor)
+    _reconstruir(cursor)
+    cursor.execute('SELECT COUNT(*) FROM transferencias')
+    return cursor.fetchone()[0]
+
+
+def expresion_busqueda(texto):
+    """
+    Convierte el texto ingresado en una consulta FTS5.
+
+    Cada palabra se busca como prefijo: las que solo tienen dígitos y separadores en
+    el teléfono y las demás en los nombres del remitente y del destinatario. Todas
+    las palabras deben coincidir. Devuelve None si el texto no tiene nada que buscar.
+    """
+    terminos = []
+    for palabra in texto.split():
+        digitos = ''.join(caracter for caracter in palabra if caracter.isdigit())
+        if digitos and all(caracter.isdigit() or caracter in SEPARADORES_TELEFONO for caracter in palabra):
+            terminos.append(f'telefono : "{digitos}"*')
+        elif any(caracter.isalnum() for caracter in palabra):
+            frase = palabra.replace('"', '""')
+            terminos.append(f'{{remitente_nombre destinatario_nombre}} : "{frase}"*')
+    return ' AND '.join(terminos) or None
+
+
+def buscar(texto, rol, empleado_id=None, pagina=0, tamano=TAMANO_PAGINA):
+    """
+    Busca transferencias por nombre del remitente o del destinatario y por prefijo del teléfono.
+
+    Args:
+        texto: Palabras a buscar, p. ej. 'maria 0991'.
+        rol: El rol del usuario; el registrador solo ve sus transferencias y el
+            confirmador solo las pendientes, como en el listado.
+        empleado_id: El ID del empleado (obligatorio para registrador y confirmador).
+        pagina: Número de página, empezando en 0.
+        tamano: Número máximo de filas de la página.
+
+    Returns:
+        Una tupla (filas, hay_mas) con las filas ordenadas por relevancia entre las
+        MAXIMO_COINCIDENCIAS coincidencias más recientes, en el mismo formato que el
+        listado de transferencias, o None si el rol no puede buscar.
+    """
+    condiciones = ['transferencias_fts MATCH ?']
+    parametros = []
+
+    if rol == 'administrador':
+        pass
+    elif rol == 'registrador' and empleado_id:
+        condiciones.append('t.registrador_id = ?')
+        parametros.append(empleado_id)
+    elif rol == 'confirmador' and empleado_id:
+        condiciones.append("t.estado = 'solicitada'")
+    else:
+        return None
+
+    expresion = expresion_busqueda(texto)
+    if expresion is None:
+        return [], False
+
+    with db.lectura() as cursor:
+        # El índice devuelve las coincidencias por rowid descendente y corta en el
+        # límite; solo esas se ordenan por rango
+        cursor.execute(f'''
+            WITH coincidencias AS (
+                SELECT transferencias_fts.rowid AS id, transferencias_fts.rank AS rango
+                FROM transferencias_fts
+                JOIN transferencias t ON t.id = transferencias_fts.rowid
+                WHERE {' AND '.join(condiciones)}
+                ORDER BY transferencias_fts.rowid DESC
+                LIMIT ?
+            )
+            SELECT t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
+                   t.capital, t.fecha_confirmacion, e_reg.nombre, e_conf.nombre, t.estado
+            FROM coincidencias c
+            JOIN transferencias t ON t.id = c.id
+            JOIN empleados e_reg ON t.registrador_id = e_reg.id
+            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
+            ORDER BY c.rango, t.id DESC
+            LIMIT ? OFFSET ?
+        ''', (expresion, *parametros, MAXIMO_COINCIDENCIAS, tamano + 1, pagina * tamano))
+        filas = cursor.fetchall()
+    return filas[:tamano], len(filas) > tamano
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del índice de búsqueda de transferencias.")
+    parser.add_argument('--reconstruir', action='store_true', help="Vuelve a indexar todas las transferencias")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    if not args.reconstruir:
+        parser.print_help()
+        return 1
+    cantidad = reconstruir()
+    print(f"Índice de búsqueda reconstruido: {cantidad} transferencias.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
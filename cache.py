@@ -0,0 +1,111 @@
+"""
+Caché de resultados de consultas con invalidación por versión de tabla.
+
+La tabla versiones_datos guarda un contador por tabla que las escrituras aumentan,
+con marcar(), dentro de su misma transacción. Cada resultado cacheado se guarda
+junto con las versiones de las tablas de las que depende y se descarta en cuanto
+alguna cambia, sin importar qué sesión o proceso hizo la escritura. Toda escritura
+sobre una tabla de la que dependa un resultado cacheado debe llamar a marcar();
+los cambios hechos a mano con otra herramienta requieren reiniciar la aplicación.
+
+Leer las versiones en cada llamada también costaría una consulta, por eso se
+guardan en memoria y solo se vuelven a leer cuando PRAGMA data_version indica que
+alguna conexión confirmó cambios (ver db.MonitorCambios). Sin escrituras de por
+medio, repetir un reporte cuesta una búsqueda en un diccionario.
+
+Los resultados se guardan por base de datos: un proceso que alterna entre varias
+(los del pool de sucursales) conserva los de cada una.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import db
+import metricas
+
+# Resultados guardados como máximo; al superarlo se descarta el usado hace más tiempo
+TAMANO_CACHE = int(os.environ.get('TRANSFERENCIAS_CACHE', '256'))
+
+_resultados = OrderedDict()
+_lock = threading.Lock()
+_ruta = None
+_version_bd = None
+_versiones = {}
+
+
+def marcar(cursor, *tablas):
+    """Registra, en la transacción del cursor, que las tablas indicadas cambiaron"""
+    cursor.executemany('''
+        INSERT INTO versiones_datos (tabla, version) VALUES (?, 1)
+        ON CONFLICT (tabla) DO UPDATE SET version = version + 1
+    ''', [(tabla,) for tabla in tablas])
+
+
+def versiones():
+    """Devuelve un diccionario con la versión actual de cada tabla marcada alguna vez"""
+    global _ruta, _version_bd, _versiones
+    # data_version se lee antes que la tabla: un cambio confirmado entre ambas lecturas
+    # hace que la próxima llamada vuelva a leerla
+    ruta, version_bd = db.pool.ruta, db.version_datos()
+    with _lock:
+        if ruta != _ruta:
+            # Otra base de datos (db.configurar): su data_version no se compara con el
+            # de la anterior, así que sus versiones se vuelven a leer
+            _ruta, _version_bd = ruta, None
+        if version_bd == _version_bd:
+            return _versiones
+    with db.lectura() as cursor:
+        cursor.execute('SELECT tabla, version FROM versiones_datos')
+        actuales = dict(cursor.fetchall())
+    with _lock:
+        _version_bd, _versiones = version_bd, actuales
+    return actuales
+
+
+def cacheado(*tablas):
+    """
+    Decorador que guarda los resultados de la función según sus argumentos y las
+    versiones de las tablas que lee.
+
+    Los resultados se comparten entre llamadas y sesiones, por lo que quien los usa
+    no debe modificarlos. La función original queda disponible en __wrapped__.
+    """
+    def decorador(funcion):
+        nombre = funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            # Las versiones se leen antes de calcular: si una escritura llega durante
+            # el cálculo, el resultado queda con versiones viejas y se recalcula
+            ruta = db.pool.ruta
+            actuales = versiones()
+            sello = tuple(actuales.get(tabla, 0) for tabla in tablas)
+            clave = (ruta, nombre, args, tuple(sorted(kwargs.items())))
+            with _lock:
+                guardado = _resultados.get(clave)
+                if guardado is not None and guardado[0] == sello:
+                    _resultados.move_to_end(clave)
+                    metricas.registrar('cache', f'{nombre} (acierto)', time.perf_counter() - inicio)
+                    return guardado[1]
+            resultado = funcion(*args, **kwargs)
+            with _lock:
+                _resultados[clave] = (sello, resultado)
+                _resultados.move_to_end(clave)
+                while len(_resultados) > TAMANO_CACHE:
+                    _resultados.popitem(last=False)
+            metricas.registrar('cache', f'{nombre} (fallo)', time.perf_counter() - inicio)
+            return resultado
+
+        return envoltura
+    return decorador
+
+
+def limpiar():
+    """Descarta todos los resultados guardados"""
+    global _version_bd
+    with _lock:
+        _resultados.clear()
+        _version_bd = None
@@ -0,0 +1,195 @@
+"""
+Conciliación de ganancias_globales con las transferencias entregadas.
+
+Recalcula las ganancias de cada empleado por mes de confirmación a partir de las
+transferencias entregadas, incluidas las archivadas, y los porcentajes de ganancia
+actuales y las compara con los valores guardados. Si se pide, la diferencia de cada
+empleado y mes se agrega al libro de ganancias como un movimiento de ajuste, en una
+sola transacción; el libro no se reescribe.
+
+    python conciliacion.py --desde 2025-01 --hasta 2025-12
+    python conciliacion.py --desde 2025-01 --hasta 2025-12 --aplicar
+"""
+import argparse
+import functools
+import sys
+
+import pandas as pd
+
+import archivo
+import db
+import libro_ganancias
+import migraciones
+from inventario import PORCENTAJE_GANANCIA_GENERAL
+from reportes import COLUMNAS_GANANCIAS, limites_rango
+
+CLAVE = ["empleado_id", "anio", "mes"]
+
+# Diferencias menores a este valor se consideran redondeo
+TOLERANCIA = 0.005
+
+
+SQL_ENTREGADAS = '''
+    SELECT id, capital, registrador_id, confirmador_id,
+           CAST(strftime('%Y', fecha_confirmacion) AS INTEGER) AS anio,
+           CAST(strftime('%m', fecha_confirmacion) AS INTEGER) AS mes
+    FROM {esquema}.transferencias
+    WHERE estado = 'entregada' AND fecha_confirmacion >= ? AND fecha_confirmacion < ?
+'''
+
+
+def _consultar_conexion(conexion, sql, parametros=()):
+    return pd.read_sql_query(sql, conexion, params=parametros)
+
+
+def _consultar_cursor(cursor, sql, parametros=()):
+    # Dentro del escritor no se usa read_sql_query: ante un error hace rollback de la
+    # conexión, y con eso de todo el lote de escrituras agrupado en la transacción
+    cursor.execute(sql, parametros)
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columnas)
+
+
+def _cargar_archivadas(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    # Las archivadas no cambian, así que pueden leerse antes y fuera de la transacción
+    # de la corrección (donde ATTACH no está permitido)
+    inicio, fin = limites_rango(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    meses = archivo.meses_archivados(confirmacion_desde=inicio, confirmacion_hasta=fin)
+    partes = []
+    with db.lectura() as cursor:
+        for anio, mes in meses:
+            with archivo.adjuntar(cursor, anio, mes) as esquema:
+                partes.append(pd.read_sql_query(SQL_ENTREGADAS.format(esquema=esquema), cursor.connection, params=(inicio, fin)))
+    return partes
+
+
+def _calcular_esperadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas=()):
+    inicio, fin = limites_rango(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    transferencias = consultar(SQL_ENTREGADAS.format(esquema='main'), (inicio, fin))
+    if archivadas:
+        # Si un archivado quedó también en la principal, vale la copia de la principal
+        transferencias = pd.concat([transferencias, *archivadas], ignore_index=True).drop_duplicates("id")
+    empleados = consultar('SELECT id, rol, porcentaje_ganancia FROM empleados ORDER BY id')
+
+    # Igual que SUM() en SQLite, un capital no numérico cuenta como cero
+    transferencias["ganancia_general"] = (
+        pd.to_numeric(transferencias["capital"], errors="coerce").fillna(0.0) * PORCENTAJE_GANANCIA_GENERAL
+    )
+
+    # Una fila por transferencia y beneficiario: registrador, confirmador y el administrador
+    beneficiarios = [
+        transferencias.rename(columns={"registrador_id": "empleado_id"}),
+        transferencias.rename(columns={"confirmador_id": "empleado_id"}),
+    ]
+    administradores = empleados.loc[empleados["rol"] == "administrador", "id"]
+    if not administradores.empty:
+        beneficiarios.append(transferencias.assign(empleado_id=administradores.iloc[0]))
+    filas = pd.concat([b[["empleado_id", "anio", "mes", "ganancia_general"]] for b in beneficiarios], ignore_index=True)
+
+    porcentajes = empleados.set_index("id")["porcentaje_ganancia"]
+    filas["ganancia_personalizada"] = (
+        filas["ganancia_general"] * (filas["empleado_id"].map(porcentajes).fillna(0.0) / 100)
+    )
+    filas["total_ganancia"] = filas["ganancia_personalizada"]
+
+    return filas.groupby(CLAVE, as_index=False)[COLUMNAS_GANANCIAS].sum()
+
+
+def _cargar_guardadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta):
+    return consultar('''
+        SELECT empleado_id, anio, mes, ganancia_general, ganancia_personalizada, total_ganancia
+        FROM ganancias_globales
+        WHERE anio * 100 + mes BETWEEN ? AND ?
+    ''', (anio_desde * 100 + mes_desde, anio_hasta * 100 + mes_hasta))
+
+
+def _diferencias(guardadas, esperadas):
+    diferencias = guardadas.merge(esperadas, on=CLAVE, how="outer", suffixes=("_guardada", "_esperada"))
+    diferencias = diferencias.fillna(0.0)
+    for columna in COLUMNAS_GANANCIAS:
+        diferencias[f"{columna}_diferencia"] = diferencias[f"{columna}_esperada"] - diferencias[f"{columna}_guardada"]
+
+    columnas_diferencia = [f"{columna}_diferencia" for columna in COLUMNAS_GANANCIAS]
+    distintas = (diferencias[columnas_diferencia].abs() > TOLERANCIA).any(axis=1)
+    return diferencias[distintas].astype({"empleado_id": int, "anio": int, "mes": int}).sort_values(CLAVE, ignore_index=True)
+
+
+def calcular_esperadas(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """Recalcula las ganancias por empleado y mes de confirmación del rango (ambos meses incluidos)"""
+    archivadas = _cargar_archivadas(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    with db.lectura() as cursor:
+        consultar = functools.partial(_consultar_conexion, cursor.connection)
+        return _calcular_esperadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas)
+
+
+def comparar(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """
+    Compara las ganancias guardadas del rango con las recalculadas.
+
+    Returns:
+        Un DataFrame con una fila por empleado y mes que no coincide, con los valores
+        guardados ('_guardada'), los esperados ('_esperada') y su diferencia.
+    """
+    archivadas = _cargar_archivadas(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    with db.lectura() as cursor:
+        consultar = functools.partial(_consultar_conexion, cursor.connection)
+        esperadas = _calcular_esperadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas)
+        guardadas = _cargar_guardadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta)
+
+    return _diferencias(guardadas, esperadas)
+
+
+def aplicar_correccion(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """
+    Agrega al libro de ganancias un ajuste por cada empleado y mes del rango cuyas
+    ganancias guardadas no coinciden con las recalculadas, en una sola transacción.
+
+    Returns:
+        La cantidad de movimientos de ajuste agregados.
+    """
+    archivadas = _cargar_archivadas(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    return db.escribir(_aplicar_correccion, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas)
+
+
+def _aplicar_correccion(cursor, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas):
+    consultar = functools.partial(_consultar_cursor, cursor)
+    esperadas = _calcular_esperadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta, archivadas)
+    guardadas = _cargar_guardadas(consultar, mes_desde, anio_desde, mes_hasta, anio_hasta)
+    diferencias = _diferencias(guardadas, esperadas)
+    return libro_ganancias.ajustar(cursor, diferencias[
+        [*CLAVE, "ganancia_general_diferencia", "ganancia_personalizada_diferencia"]
+    ].itertuples(index=False, name=None))
+
+
+def _mes(texto):
+    try:
+        anio, mes = (int(parte) for parte in texto.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Mes inválido: '{texto}'. Use el formato AAAA-MM.")
+    if not 1 <= mes <= 12:
+        raise argparse.ArgumentTypeError(f"Mes inválido: '{texto}'. Use el formato AAAA-MM.")
+    return mes, anio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concilia ganancias_globales con las transferencias entregadas.")
+    parser.add_argument('--desde', type=_mes, required=True, help="Primer mes del período (AAAA-MM)")
+    parser.add_argument('--hasta', type=_mes, required=True, help="Último mes del período (AAAA-MM)")
+    parser.add_argument('--aplicar', action='store_true', help="Registra las diferencias como ajustes en el libro de ganancias")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    diferencias = comparar(*args.desde, *args.hasta)
+    if diferencias.empty:
+        print("Las ganancias guardadas coinciden con las transferencias entregadas.")
+        return 0
+
+    print(diferencias.to_string(index=False))
+    if args.aplicar:
+        registros = aplicar_correccion(*args.desde, *args.hasta)
+        print(f"Corrección aplicada: {registros} ajustes agregados al libro de ganancias.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
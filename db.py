@@ -0,0 +1,433 @@
+import atexit
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metricas
+
+# Ruta de la base de datos (puede cambiarse con la variable de entorno TRANSFERENCIAS_DB)
+RUTA_BD = os.environ.get('TRANSFERENCIAS_DB', 'transferencias.db')
+
+# Número máximo de conexiones abiertas al mismo tiempo
+TAMANO_POOL = int(os.environ.get('TRANSFERENCIAS_POOL', '8'))
+
+# Segundos que se espera por una conexión libre antes de fallar
+ESPERA_CONEXION = 30
+
+# Segundos que el escritor espera para agrupar más escrituras en la misma transacción.
+# Con 0 solo agrupa las que se acumularon mientras confirmaba el lote anterior, que con
+# synchronous = NORMAL rinde más que esperar; conviene subirlo si se usa synchronous = FULL.
+VENTANA_ESCRITURA = 0.0
+
+# Máximo de escrituras confirmadas en una misma transacción
+MAXIMO_LOTE_ESCRITURA = 256
+
+# Pragmas aplicados a cada conexión nueva
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+# Sentencias de control de transacciones que no se miden como consultas
+SENTENCIAS_SIN_MEDIR = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA')
+
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que mide cada consulta y cuenta sus filas.
+
+    El tiempo de una consulta incluye su ejecución y todas las lecturas de filas
+    hasta la próxima consulta o hasta cerrar el cursor; recién entonces se registra
+    en metricas y, si supera el umbral, en el log de consultas lentas con su plan.
+    """
+
+    def __init__(self, conexion):
+        super().__init__(conexion)
+        self._sql = None
+
+    def execute(self, sql, parametros=()):
+        return self._medir(super().execute, sql, parametros, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self._medir(super().executemany, sql, secuencia, None)
+
+    def _medir(self, ejecutar, sql, argumento, parametros):
+        self._terminar()
+        inicio = time.perf_counter()
+        try:
+            ejecutar(sql, argumento)
+        finally:
+            if not sql.lstrip()[:9].upper().startswith(SENTENCIAS_SIN_MEDIR):
+                self._sql, self._parametros = sql, parametros
+                self._duracion, self._filas = time.perf_counter() - inicio, 0
+        return self
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._contar(inicio, fila is not None)
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self._contar(inicio, len(filas))
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._contar(inicio, len(filas))
+        return filas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            fila = super().__next__()
+        except StopIteration:
+            self._contar(inicio, 0)
+            raise
+        self._contar(inicio, 1)
+        return fila
+
+    def close(self):
+        self._terminar()
+        super().close()
+
+    def _contar(self, inicio, filas):
+        if self._sql is not None:
+            self._duracion += time.perf_counter() - inicio
+            self._filas += filas
+
+    def _terminar(self):
+        if self._sql is None:
+            return
+        sql, duracion, filas = ' '.join(self._sql.split()), self._duracion, max(self._filas, self.rowcount)
+        self._sql = None
+        metricas.registrar('consulta', sql, duracion, filas)
+        if duracion * 1000 >= metricas.UMBRAL_CONSULTA_LENTA_MS:
+            metricas.registrar_consulta_lenta(sql, duracion, filas, self._plan(sql, self._parametros))
+
+    def _plan(self, sql, parametros):
+        if parametros is None:
+            return "(sin plan: executemany)"
+        try:
+            filas = sqlite3.Cursor(self.connection).execute('EXPLAIN QUERY PLAN ' + sql, parametros).fetchall()
+        except sqlite3.Error as error:
+            return f"(sin plan: {error})"
+        return "\n".join(fila[3] for fila in filas)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores son CursorMedido"""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+
+def abrir_conexion(ruta, solo_lectura=False):
+    """
+    Abre una conexión en modo autocommit con los pragmas de rendimiento aplicados.
+
+    Con solo_lectura la conexión no puede escribir ni crear la base si no existe; el
+    modo de journal queda como lo dejó quien la creó.
+    """
+    if solo_lectura:
+        conexion = sqlite3.connect(f'{pathlib.Path(ruta).absolute().as_uri()}?mode=ro', uri=True,
+                                   check_same_thread=False, isolation_level=None, factory=ConexionMedida)
+    else:
+        conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, factory=ConexionMedida)
+    for pragma in PRAGMAS:
+        if not (solo_lectura and pragma.startswith('PRAGMA journal_mode')):
+            conexion.execute(pragma)
+    return conexion
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite compartido por todas las sesiones del proceso.
+
+    Como este módulo se importa una sola vez por proceso, el pool sobrevive a los
+    reruns de Streamlit y las conexiones se reutilizan en lugar de abrirse y
+    cerrarse en cada clic.
+    """
+
+    def __init__(self, ruta, tamano, solo_lectura=False):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.solo_lectura = solo_lectura
+        self._libres = queue.LifoQueue()
+        self._abiertas = 0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._abiertas < self.tamano:
+                self._abiertas += 1
+                try:
+                    return abrir_conexion(self.ruta, self.solo_lectura)
+                except Exception:
+                    self._abiertas -= 1
+                    raise
+        try:
+            return self._libres.get(timeout=ESPERA_CONEXION)
+        except queue.Empty:
+            raise RuntimeError("No hay conexiones libres en el pool de la base de datos.")
+
+    def devolver(self, conexion):
+        if conexion.in_transaction:
+            conexion.rollback()
+        self._libres.put(conexion)
+
+    def cerrar(self):
+        with self._lock:
+            while True:
+                try:
+                    self._libres.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._abiertas = 0
+
+
+class Escritor:
+    """
+    Hilo único que ejecuta las escrituras de todas las sesiones del proceso.
+
+    Cada escritura es una función que recibe un cursor. El hilo toma las que llegan
+    dentro de una ventana corta y las ejecuta en una sola transacción, cada una en su
+    propio SAVEPOINT para que el error de una no deshaga las demás, y confirma una
+    sola vez. Así las sesiones no compiten por el bloqueo de escritura de SQLite y
+    varias escrituras comparten el mismo fsync.
+    """
+
+    def __init__(self, ruta, solo_lectura=False):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+        self._cola = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """Encola funcion(cursor, *args, **kwargs), espera a que se confirme y devuelve su resultado"""
+        if threading.current_thread() is self._hilo:
+            raise RuntimeError("Una escritura no puede encolar otra escritura.")
+        futuro = Future()
+        with self._lock:
+            if self._hilo is None:
+                self._cola = queue.Queue()
+                self._hilo = threading.Thread(target=self._procesar, args=(self._cola,), name='escritor-sqlite', daemon=True)
+                self._hilo.start()
+            self._cola.put((funcion, args, kwargs, futuro))
+        return futuro.result()
+
+    def detener(self):
+        """Termina las escrituras pendientes y detiene el hilo"""
+        with self._lock:
+            if self._hilo is None:
+                return
+            self._cola.put(None)
+            hilo, self._hilo = self._hilo, None
+        hilo.join()
+
+    def _procesar(self, cola):
+        try:
+            conexion = abrir_conexion(self.ruta, self.solo_lectura)
+        except Exception as error:
+            # Sin conexión no se puede escribir: se liberan los pedidos y el próximo reintentará
+            with self._lock:
+                if self._cola is cola:
+                    self._hilo = None
+            while True:
+                try:
+                    pedido = cola.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido is not None:
+                    pedido[3].set_exception(error)
+            return
+        try:
+            detener = False
+            while not detener:
+                lote, detener = self._tomar_lote(cola)
+                if lote:
+                    self._ejecutar_lote(conexion, lote)
+        finally:
+            conexion.close()
+
+    def _tomar_lote(self, cola):
+        primero = cola.get()
+        if primero is None:
+            return [], True
+        lote = [primero]
+        limite = time.monotonic() + VENTANA_ESCRITURA
+        while len(lote) < MAXIMO_LOTE_ESCRITURA:
+            restante = limite - time.monotonic()
+            try:
+                pedido = cola.get(timeout=restante) if restante > 0 else cola.get_nowait()
+            except queue.Empty:
+                break
+            if pedido is None:
+                return lote, True
+            lote.append(pedido)
+        return lote, False
+
+    def _ejecutar_lote(self, conexion, lote):
+        cursor = conexion.cursor()
+        resultados = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for funcion, args, kwargs, futuro in lote:
+                futuro.set_running_or_notify_cancel()
+                cursor.execute('SAVEPOINT escritura')
+                try:
+                    resultados.append((futuro, funcion(cursor, *args, **kwargs), None))
+                except Exception as error:
+                    cursor.execute('ROLLBACK TO escritura')
+                    resultados.append((futuro, None, error))
+                cursor.execute('RELEASE escritura')
+            conexion.commit()
+        except Exception as error:
+            if conexion.in_transaction:
+                conexion.rollback()
+            for *_, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(error)
+            return
+        finally:
+            cursor.close()
+
+        # Los resultados se entregan recién después del COMMIT
+        for futuro, resultado, error in resultados:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(error)
+
+
+class MonitorCambios:
+    """
+    Detecta si alguna conexión, de este u otro proceso, confirmó cambios en la base.
+
+    Usa PRAGMA data_version sobre una conexión propia que nunca escribe: el valor
+    cambia con cada COMMIT ajeno y consultarlo no lee ninguna tabla, por lo que
+    puede llamarse cada segundo desde cada sesión sin costo apreciable.
+    """
+
+    def __init__(self, ruta, solo_lectura=False):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+        self._conexion = None
+        self._lock = threading.Lock()
+
+    def version(self):
+        """Devuelve un valor que cambia cada vez que se confirma una escritura"""
+        with self._lock:
+            if self._conexion is None:
+                self._conexion = abrir_conexion(self.ruta, self.solo_lectura)
+            return self._conexion.execute('PRAGMA data_version').fetchone()[0]
+
+    def cerrar(self):
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+
+pool = PoolConexiones(RUTA_BD, TAMANO_POOL)
+escritor = Escritor(RUTA_BD)
+monitor = MonitorCambios(RUTA_BD)
+
+
+def configurar(ruta, tamano=TAMANO_POOL, solo_lectura=False):
+    """
+    Apunta el pool y el escritor a otra base de datos, cerrando los del destino anterior.
+    Con solo_lectura las conexiones se abren en modo de solo lectura y las escrituras fallan.
+    """
+    global pool, escritor, monitor
+    escritor.detener()
+    pool.cerrar()
+    monitor.cerrar()
+    pool = PoolConexiones(ruta, tamano, solo_lectura)
+    escritor = Escritor(ruta, solo_lectura)
+    monitor = MonitorCambios(ruta, solo_lectura)
+
+
+@atexit.register
+def _cerrar():
+    escritor.detener()
+    pool.cerrar()
+    monitor.cerrar()
+
+
+def version_datos():
+    """Devuelve un valor que cambia cada vez que alguna conexión confirma una escritura"""
+    return monitor.version()
+
+
+def escribir(funcion, *args, **kwargs):
+    """
+    Ejecuta funcion(cursor, *args, **kwargs) en el hilo escritor y devuelve su resultado.
+
+    La función corre dentro de una transacción compartida con otras escrituras
+    concurrentes; si lanza una excepción, solo se deshacen sus propios cambios y la
+    excepción se relanza aquí.
+    """
+    with metricas.medir('escritura', funcion.__name__.lstrip('_')):
+        return escritor.ejecutar(funcion, *args, **kwargs)
+
+
+@contextmanager
+def lectura():
+    """Presta una conexión del pool y entrega un cursor propio para consultas"""
+    origen = pool
+    conexion = origen.obtener()
+    cursor = conexion.cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        origen.devolver(conexion)
+
+
+@contextmanager
+def transaccion():
+    """
+    Presta una conexión del pool y ejecuta el bloque dentro de una transacción.
+
+    La transacción se abre con BEGIN IMMEDIATE para tomar el bloqueo de escritura
+    desde el principio y se confirma al salir del bloque, o se revierte si ocurre
+    una excepción.
+    """
+    origen = pool
+    conexion = origen.obtener()
+    cursor = conexion.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+        except BaseException:
+            conexion.rollback()
+            raise
+        conexion.commit()
+    finally:
+        cursor.close()
+        origen.devolver(conexion)
@@ -0,0 +1,292 @@
+"""
+Exportación de transferencias, historial de ediciones y ganancias a CSV o Parquet.
+
+Las filas se leen en bloques de TAMANO_BLOQUE con paginación por clave, cada bloque
+con su propia consulta corta, y se escriben a medida que llegan; la memoria usada no
+depende de la cantidad de filas exportadas ni se mantiene abierta una lectura larga
+sobre la base.
+
+    python exportacion.py transferencias --desde 2025-01-01 --hasta 2025-12-31 --salida transferencias_2025.csv
+    python exportacion.py historial --formato parquet --salida historial.parquet
+    python exportacion.py ganancias --empleado 3 --desde 2025-01-01
+"""
+import argparse
+import csv
+import datetime
+import sys
+from contextlib import contextmanager
+
+import archivo
+import db
+import migraciones
+
+# Filas leídas y escritas por bloque
+TAMANO_BLOQUE = 10_000
+
+FORMATOS = ("csv", "parquet")
+
+# Columnas de cada conjunto con su tipo de Parquet
+COLUMNAS = {
+    "transferencias": [
+        ("id", "int64"), ("fecha_solicitud", "string"), ("remitente_nombre", "string"),
+        ("destinatario_nombre", "string"), ("destinatario_telefono", "string"), ("capital", "float64"),
+        ("fecha_confirmacion", "string"), ("registrador_id", "int64"), ("registrador", "string"),
+        ("confirmador_id", "int64"), ("confirmador", "string"), ("estado", "string"),
+    ],
+    "historial": [
+        ("id", "int64"), ("transferencia_id", "int64"), ("fecha_edicion", "string"),
+        ("empleado_editor_id", "int64"), ("editor", "string"), ("campo_editado", "string"),
+        ("valor_anterior", "string"), ("valor_nuevo", "string"),
+    ],
+    "ganancias": [
+        ("empleado_id", "int64"), ("nombre", "string"), ("rol", "string"), ("anio", "int64"), ("mes", "int64"),
+        ("ganancia_general", "float64"), ("ganancia_personalizada", "float64"), ("total_ganancia", "float64"),
+    ],
+}
+
+CONJUNTOS = tuple(COLUMNAS)
+
+
+@contextmanager
+def _cursor(mes=None):
+    with db.lectura() as cursor:
+        if mes is None:
+            yield cursor
+        else:
+            with archivo.adjuntar(cursor, *mes):
+                yield cursor
+
+
+def _paginar(consulta, condiciones, parametros, clave, posiciones, tamano, mes=None):
+    """Ejecuta la consulta por bloques, continuando cada uno después de la clave de la última fila"""
+    despues_de = None
+    while True:
+        extra = []
+        if despues_de is not None:
+            extra = [f"({', '.join(clave)}) > ({', '.join('?' * len(clave))})"]
+        where = ' AND '.join(condiciones + extra) or '1'
+        with _cursor(mes) as cursor:
+            cursor.execute(consulta.format(esquema=archivo.ESQUEMA if mes else 'main', where=where),
+                           (*parametros, *(despues_de or ()), tamano))
+            bloque = cursor.fetchall()
+        if not bloque:
+            return
+        yield bloque
+        if len(bloque) < tamano:
+            return
+        despues_de = tuple(bloque[-1][posicion] for posicion in posiciones)
+
+
+def _limites(desde, hasta):
+    # La fecha final se incluye completa comparando contra el inicio del día siguiente
+    return (desde.isoformat() if desde else None,
+            (hasta + datetime.timedelta(days=1)).isoformat() if hasta else None)
+
+
+def _bloques_transferencias(desde, hasta, estado, empleado_id, incluir_archivo, tamano):
+    consulta = '''
+        SELECT t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
+               t.capital, t.fecha_confirmacion, t.registrador_id, e_reg.nombre, t.confirmador_id, e_conf.nombre, t.estado
+        FROM {esquema}.transferencias t
+        LEFT JOIN empleados e_reg ON e_reg.id = t.registrador_id
+        LEFT JOIN empleados e_conf ON e_conf.id = t.confirmador_id
+        WHERE {where}
+        ORDER BY t.fecha_solicitud, t.id
+        LIMIT ?
+    '''
+    inicio, fin = _limites(desde, hasta)
+    condiciones, parametros = [], []
+    if inicio:
+        condiciones.append('t.fecha_solicitud >= ?')
+        parametros.append(inicio)
+    if fin:
+        condiciones.append('t.fecha_solicitud < ?')
+        parametros.append(fin)
+    if estado:
+        condiciones.append('t.estado = ?')
+        parametros.append(estado)
+    if empleado_id:
+        condiciones.append('(t.registrador_id = ? OR t.confirmador_id = ?)')
+        parametros.extend((empleado_id, empleado_id))
+    clave = ('t.fecha_solicitud', 't.id')
+
+    yield from _paginar(consulta, condiciones, parametros, clave, (1, 0), tamano)
+    if incluir_archivo and estado in (None, 'entregada'):
+        # Una transferencia que quedó en ambas bases se exporta solo desde la principal
+        condiciones.append('t.id NOT IN (SELECT id FROM main.transferencias)')
+        for mes in reversed(archivo.meses_archivados(inicio, fin)):
+            yield from _paginar(consulta, condiciones, parametros, clave, (1, 0), tamano, mes)
+
+
+def _bloques_historial(desde, hasta, estado, empleado_id, incluir_archivo, tamano):
+    consulta = '''
+        SELECT he.id, he.transferencia_id, he.fecha_edicion, he.empleado_editor_id, e.nombre,
+               he.campo_editado, he.valor_anterior, he.valor_nuevo
+        FROM {esquema}.historial_ediciones he
+        LEFT JOIN empleados e ON e.id = he.empleado_editor_id
+        WHERE {where}
+        ORDER BY he.id
+        LIMIT ?
+    '''
+    inicio, fin = _limites(desde, hasta)
+    condiciones, parametros = [], []
+    if inicio:
+        condiciones.append('he.fecha_edicion >= ?')
+        parametros.append(inicio)
+    if fin:
+        condiciones.append('he.fecha_edicion < ?')
+        parametros.append(fin)
+    if empleado_id:
+        condiciones.append('he.empleado_editor_id = ?')
+        parametros.append(empleado_id)
+
+    yield from _paginar(consulta, condiciones, parametros, ('he.id',), (0,), tamano)
+    if incluir_archivo:
+        condiciones.append('he.id NOT IN (SELECT id FROM main.historial_ediciones)')
+        # Una edición es posterior a la solicitud, así que solo cuentan los meses anteriores al fin
+        for mes in reversed(archivo.meses_archivados(hasta=fin)):
+            yield from _paginar(consulta, condiciones, parametros, ('he.id',), (0,), tamano, mes)
+
+
+def _bloques_ganancias(desde, hasta, estado, empleado_id, incluir_archivo, tamano):
+    consulta = '''
+        SELECT g.empleado_id, e.nombre, e.rol, g.anio, g.mes,
+               g.ganancia_general, g.ganancia_personalizada, g.total_ganancia
+        FROM {esquema}.ganancias_globales g
+        LEFT JOIN empleados e ON e.id = g.empleado_id
+        WHERE {where}
+        ORDER BY g.anio, g.mes, g.empleado_id
+        LIMIT ?
+    '''
+    condiciones, parametros = [], []
+    if desde:
+        condiciones.append('g.anio * 100 + g.mes >= ?')
+        parametros.append(desde.year * 100 + desde.month)
+    if hasta:
+        condiciones.append('g.anio * 100 + g.mes <= ?')
+        parametros.append(hasta.year * 100 + hasta.month)
+    if empleado_id:
+        condiciones.append('g.empleado_id = ?')
+        parametros.append(empleado_id)
+    yield from _paginar(consulta, condiciones, parametros, ('g.anio', 'g.mes', 'g.empleado_id'), (3, 4, 0), tamano)
+
+
+_LECTORES = {
+    "transferencias": _bloques_transferencias,
+    "historial": _bloques_historial,
+    "ganancias": _bloques_ganancias,
+}
+
+
+def leer_bloques(conjunto, desde=None, hasta=None, estado=None, empleado_id=None, incluir_archivo=False,
+                 tamano=TAMANO_BLOQUE):
+    """
+    Genera las filas del conjunto en listas de a lo sumo 'tamano' filas.
+
+    Args:
+        conjunto: 'transferencias', 'historial' o 'ganancias'.
+        desde, hasta: Fechas (datetime.date) del rango, ambas incluidas: de solicitud
+            para transferencias, de edición para el historial y mes para ganancias.
+        estado: Estado de las transferencias (solo para 'transferencias').
+        empleado_id: Registrador o confirmador, editor o empleado, según el conjunto.
+        incluir_archivo: Si se exportan también las transferencias y ediciones archivadas.
+    """
+    if conjunto not in _LECTORES:
+        raise ValueError(f"Conjunto no soportado: {conjunto}")
+    return _LECTORES[conjunto](desde, hasta, estado, empleado_id, incluir_archivo, tamano)
+
+
+def escribir_csv(bloques, columnas, destino):
+    """Escribe los bloques en el archivo de texto destino y devuelve la cantidad de filas"""
+    escritor = csv.writer(destino)
+    escritor.writerow(columnas)
+    filas = 0
+    for bloque in bloques:
+        escritor.writerows(bloque)
+        filas += len(bloque)
+    return filas
+
+
+def escribir_parquet(bloques, columnas, tipos, destino):
+    """Escribe cada bloque como un grupo de filas en el archivo binario (o ruta) destino y devuelve la cantidad de filas"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Para exportar a Parquet es necesario instalar pyarrow.")
+
+    esquema = pa.schema([(columna, getattr(pa, tipo)()) for columna, tipo in zip(columnas, tipos)])
+    filas = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for bloque in bloques:
+            valores = list(zip(*bloque))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(columna, type=campo.type) for columna, campo in zip(valores, esquema)], schema=esquema))
+            filas += len(bloque)
+        if filas == 0:
+            escritor.write_table(esquema.empty_table())
+    return filas
+
+
+def exportar(conjunto, formato, destino, **filtros):
+    """
+    Exporta el conjunto filtrado al destino.
+
+    Args:
+        conjunto: 'transferencias', 'historial' o 'ganancias'.
+        formato: 'csv' (destino es un archivo de texto) o 'parquet' (destino es un
+            archivo binario o una ruta).
+        **filtros: Los argumentos de leer_bloques.
+
+    Returns:
+        La cantidad de filas exportadas.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    columnas, tipos = zip(*COLUMNAS[conjunto])
+    bloques = leer_bloques(conjunto, **filtros)
+    if formato == "csv":
+        return escribir_csv(bloques, columnas, destino)
+    return escribir_parquet(bloques, columnas, tipos, destino)
+
+
+def _fecha(texto):
+    try:
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: '{texto}'. Use el formato AAAA-MM-DD.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta transferencias, historial de ediciones o ganancias.")
+    parser.add_argument('conjunto', choices=CONJUNTOS)
+    parser.add_argument('--formato', choices=FORMATOS, help="Formato de salida (por defecto, según la extensión de --salida o csv)")
+    parser.add_argument('--salida', help="Archivo de salida (por defecto, la salida estándar en CSV)")
+    parser.add_argument('--desde', type=_fecha, help="Primera fecha incluida (AAAA-MM-DD)")
+    parser.add_argument('--hasta', type=_fecha, help="Última fecha incluida (AAAA-MM-DD)")
+    parser.add_argument('--estado', choices=('solicitada', 'confirmada', 'entregada'), help="Solo transferencias en este estado")
+    parser.add_argument('--empleado', type=int, help="Solo las filas de este empleado")
+    parser.add_argument('--archivo', action='store_true', help="Incluye las transferencias y ediciones archivadas")
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Filas leídas por bloque")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    formato = args.formato or ('parquet' if args.salida and args.salida.endswith('.parquet') else 'csv')
+    if formato == 'parquet' and not args.salida:
+        parser.error("Para exportar a Parquet indique un archivo con --salida.")
+    filtros = dict(desde=args.desde, hasta=args.hasta, estado=args.estado, empleado_id=args.empleado,
+                   incluir_archivo=args.archivo, tamano=args.bloque)
+
+    if formato == 'parquet':
+        filas = exportar(args.conjunto, formato, args.salida, **filtros)
+    elif args.salida:
+        with open(args.salida, 'w', encoding='utf-8', newline='') as destino:
+            filas = exportar(args.conjunto, formato, destino, **filtros)
+    else:
+        filas = exportar(args.conjunto, formato, sys.stdout, **filtros)
+    print(f"{filas} filas exportadas.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
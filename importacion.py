@@ -0,0 +1,170 @@
+"""
+Importación masiva de transferencias desde archivos CSV o JSONL.
+
+Se puede usar desde el menú del registrador o desde la línea de comandos:
+
+    python importacion.py lote.csv --registrador 2
+    python importacion.py lote.jsonl --registrador 2 --formato jsonl
+
+Cada fila debe tener las columnas remitente_nombre, destinatario_nombre,
+destinatario_telefono y capital, y opcionalmente fecha_solicitud
+('YYYY-MM-DD HH:MM:SS') para transferencias registradas sin conexión.
+"""
+import argparse
+import csv
+import datetime
+import json
+import math
+import sys
+
+import cache
+import db
+import migraciones
+
+# Filas insertadas por cada llamada a executemany
+TAMANO_LOTE = 5000
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def validar_transferencia(remitente_nombre, destinatario_nombre, destinatario_telefono, capital):
+    """Aplica las reglas del formulario de registro y devuelve el mensaje de error, o None si es válida"""
+    if not remitente_nombre:
+        return "Por favor, ingrese el nombre del remitente."
+    if not destinatario_nombre:
+        return "Por favor, ingrese el nombre del destinatario."
+    if not destinatario_telefono:
+        return "Por favor, ingrese el teléfono del destinatario."
+    if capital is None or not math.isfinite(capital) or capital <= 0:
+        return "Por favor, ingrese un monto válido mayor que cero."
+    return None
+
+
+def leer_filas(archivo, formato):
+    """Recorre el archivo fila por fila devolviendo (numero_de_linea, diccionario o None si no se pudo leer)"""
+    if formato == 'csv':
+        # La línea 1 es la cabecera
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            yield numero, fila
+    elif formato == 'jsonl':
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except json.JSONDecodeError:
+                fila = None
+            yield numero, fila if isinstance(fila, dict) else None
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+
+def preparar_fila(fila, registrador_id, fecha_por_defecto):
+    """Convierte una fila leída en los valores a insertar; devuelve (valores, error)"""
+    if fila is None:
+        return None, "La fila no tiene un formato válido."
+
+    remitente_nombre = str(fila.get('remitente_nombre') or '').strip()
+    destinatario_nombre = str(fila.get('destinatario_nombre') or '').strip()
+    destinatario_telefono = str(fila.get('destinatario_telefono') or '').strip()
+    try:
+        capital = float(fila.get('capital'))
+    except (TypeError, ValueError):
+        capital = None
+
+    error = validar_transferencia(remitente_nombre, destinatario_nombre, destinatario_telefono, capital)
+    if error:
+        return None, error
+
+    fecha_solicitud = fila.get('fecha_solicitud') or fecha_por_defecto
+    try:
+        datetime.datetime.strptime(fecha_solicitud, FORMATO_FECHA)
+    except (TypeError, ValueError):
+        return None, f"Fecha de solicitud inválida: '{fecha_solicitud}'. Use el formato AAAA-MM-DD HH:MM:SS."
+
+    return (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono,
+            capital, registrador_id, 'solicitada'), None
+
+
+def importar_transferencias(filas, registrador_id, tamano_lote=TAMANO_LOTE):
+    """
+    Valida las transferencias y las inserta en una sola transacción del escritor.
+
+    El archivo se lee y valida entero fuera del escritor, así la lectura no retiene
+    el bloqueo de escritura; la inserción es todo o nada: si el archivo no se puede
+    leer hasta el final no se inserta ninguna fila. Las filas inválidas no detienen la
+    importación: se omiten y se informan.
+
+    Args:
+        filas: Iterable de (numero_de_linea, diccionario), como el que devuelve leer_filas.
+        registrador_id: El ID del registrador al que se asignan las transferencias.
+        tamano_lote: Filas insertadas por cada llamada a executemany.
+
+    Returns:
+        Una tupla (insertadas, errores) donde errores es una lista de (numero_de_linea, mensaje).
+
+    Raises:
+        ValueError: Si el archivo no se puede leer (codificación o formato CSV inválidos).
+    """
+    fecha_por_defecto = datetime.datetime.now().strftime(FORMATO_FECHA)
+    validas = []
+    errores = []
+    numero = 0
+    try:
+        for numero, fila in filas:
+            valores, error = preparar_fila(fila, registrador_id, fecha_por_defecto)
+            if error:
+                errores.append((numero, error))
+            else:
+                validas.append(valores)
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise ValueError(f"No se pudo leer el archivo después de la línea {numero}: {error}. "
+                         "No se importó ninguna transferencia.") from error
+
+    insertadas = db.escribir(_insertar_en_lotes, validas, tamano_lote) if validas else 0
+    return insertadas, errores
+
+
+def _insertar_en_lotes(cursor, valores, tamano_lote):
+    cache.marcar(cursor, 'transferencias')
+    for inicio in range(0, len(valores), tamano_lote):
+        cursor.executemany('''
+            INSERT INTO transferencias
+            (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, registrador_id, estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', valores[inicio:inicio + tamano_lote])
+    return len(valores)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa transferencias desde un archivo CSV o JSONL.")
+    parser.add_argument('archivo', help="Ruta del archivo a importar")
+    parser.add_argument('--registrador', type=int, required=True, help="ID del registrador de las transferencias")
+    parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Formato del archivo (por defecto según la extensión)")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    formato = args.formato or ('jsonl' if args.archivo.endswith(('.jsonl', '.json')) else 'csv')
+
+    with db.lectura() as cursor:
+        cursor.execute('SELECT rol FROM empleados WHERE id = ?', (args.registrador,))
+        empleado = cursor.fetchone()
+    if not empleado or empleado[0] != 'registrador':
+        print(f"Error: el ID {args.registrador} no corresponde a un registrador.", file=sys.stderr)
+        return 1
+
+    try:
+        with open(args.archivo, newline='', encoding='utf-8-sig') as archivo:
+            insertadas, errores = importar_transferencias(leer_filas(archivo, formato), args.registrador)
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+
+    for numero, mensaje in errores:
+        print(f"Línea {numero}: {mensaje}", file=sys.stderr)
+    print(f"Transferencias importadas: {insertadas}. Filas con errores: {len(errores)}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Resumen mensual del inventario de transferencias entregadas.
+
+La tabla inventario_mensual guarda, por mes de solicitud, el capital entregado, la
+cantidad de transferencias y la ganancia general. Se actualiza de forma incremental
+al confirmar entregas o editar el capital de una transferencia entregada, por lo que
+consultar un mes o una serie de meses no requiere recorrer la tabla transferencias.
+
+Las transferencias que se archivan siguen contando en su mes; al reconstruir, lo
+archivado se suma desde el catálogo archivo_meses.
+
+Para reconstruirla a partir de los datos existentes:
+
+    python inventario.py --reconstruir
+"""
+import argparse
+import json
+import sys
+
+import cache
+import db
+import migraciones
+
+# Porción del capital que se reparte como ganancia general
+PORCENTAJE_GANANCIA_GENERAL = 0.10
+
+
+def crear_tabla(cursor):
+    """Crea la tabla del inventario mensual y la llena si es nueva"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventario_mensual'")
+    existia = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventario_mensual (
+            anio INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            capital_entregado REAL NOT NULL DEFAULT 0.0,
+            cantidad_transferencias INTEGER NOT NULL DEFAULT 0,
+            ganancia_general REAL NOT NULL DEFAULT 0.0,
+            PRIMARY KEY (anio, mes)
+        )
+    ''')
+    if not existia:
+        _reconstruir(cursor)
+
+
+def acumular_entregas(cursor, transferencia_ids):
+    """Suma al inventario las transferencias recién entregadas (en la transacción del cursor)"""
+    # NOT INDEXED: buscar por ID en lugar de recorrer el índice de estado
+    cursor.execute('''
+        INSERT INTO inventario_mensual (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER), CAST(strftime('%m', fecha_solicitud) AS INTEGER),
+               SUM(capital), COUNT(*), SUM(capital) * :porcentaje
+        FROM transferencias NOT INDEXED
+        WHERE id IN (SELECT value FROM json_each(:ids)) AND estado = 'entregada'
+        GROUP BY 1, 2
+        ON CONFLICT (anio, mes) DO UPDATE SET
+            capital_entregado = capital_entregado + excluded.capital_entregado,
+            cantidad_transferencias = cantidad_transferencias + excluded.cantidad_transferencias,
+            ganancia_general = ganancia_general + excluded.ganancia_general
+    ''', {'ids': json.dumps(list(transferencia_ids)), 'porcentaje': PORCENTAJE_GANANCIA_GENERAL})
+    cache.marcar(cursor, 'inventario_mensual')
+
+
+def ajustar_capital(cursor, transferencia_id, capital_anterior):
+    """Aplica al inventario la diferencia de capital de una transferencia entregada ya editada"""
+    cursor.execute('''
+        UPDATE inventario_mensual
+        SET capital_entregado = capital_entregado + d.diferencia,
+            ganancia_general = ganancia_general + d.diferencia * :porcentaje
+        FROM (
+            SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER) AS anio,
+                   CAST(strftime('%m', fecha_solicitud) AS INTEGER) AS mes,
+                   CAST(capital AS REAL) - CAST(:anterior AS REAL) AS diferencia
+            FROM transferencias
+            WHERE id = :id AND estado = 'entregada'
+        ) AS d
+        WHERE inventario_mensual.anio = d.anio AND inventario_mensual.mes = d.mes
+    ''', {'id': transferencia_id, 'anterior': capital_anterior, 'porcentaje': PORCENTAJE_GANANCIA_GENERAL})
+    cache.marcar(cursor, 'inventario_mensual')
+
+
+def _reconstruir(cursor):
+    cursor.execute('DELETE FROM inventario_mensual')
+    cursor.execute('''
+        INSERT INTO inventario_mensual (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER), CAST(strftime('%m', fecha_solicitud) AS INTEGER),
+               SUM(capital), COUNT(*), SUM(capital) * ?
+        FROM transferencias
+        WHERE estado = 'entregada'
+        GROUP BY 1, 2
+    ''', (PORCENTAJE_GANANCIA_GENERAL,))
+    # Las transferencias archivadas siguen contando en su mes
+    cursor.execute('''
+        INSERT INTO inventario_mensual (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        SELECT anio, mes, capital_entregado, cantidad_transferencias, capital_entregado * ?
+        FROM archivo_meses
+        WHERE cantidad_transferencias > 0
+        ON CONFLICT (anio, mes) DO UPDATE SET
+            capital_entregado = capital_entregado + excluded.capital_entregado,
+            cantidad_transferencias = cantidad_transferencias + excluded.cantidad_transferencias,
+            ganancia_general = ganancia_general + excluded.ganancia_general
+    ''', (PORCENTAJE_GANANCIA_GENERAL,))
+    cache.marcar(cursor, 'inventario_mensual')
+
+
+def reconstruir():
+    """Recalcula todo el inventario mensual a partir de las transferencias entregadas"""
+    return db.escribir(_crear_y_reconstruir)
+
+
+def _crear_y_reconstruir(cursor):
+    crear_tabla(cursor)
+    _reconstruir(cursor)
+    cursor.execute('SELECT COUNT(*) FROM inventario_mensual')
+    return cursor.fetchone()[0]
+
+
+@cache.cacheado('inventario_mensual')
+def consultar_mes(mes, anio):
+    """Devuelve (capital_entregado, cantidad_transferencias, ganancia_general) del mes"""
+    with db.lectura() as cursor:
+        cursor.execute('''
+            SELECT capital_entregado, cantidad_transferencias, ganancia_general
+            FROM inventario_mensual
+            WHERE anio = ? AND mes = ?
+        ''', (anio, mes))
+        return cursor.fetchone() or (0.0, 0, 0.0)
+
+
+@cache.cacheado('inventario_mensual')
+def consultar_rango(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """Devuelve las filas (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general) del rango, ambos meses incluidos"""
+    with db.lectura() as cursor:
+        cursor.execute('''
+            SELECT anio, mes, capital_entregado, cantidad_transferencias, ganancia_general
+            FROM inventario_mensual
+            WHERE (anio, mes) BETWEEN (?, ?) AND (?, ?)
+            ORDER BY anio, mes
+        ''', (anio_desde, mes_desde, anio_hasta, mes_hasta))
+        return cursor.fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del inventario mensual.")
+    parser.add_argument('--reconstruir', action='store_true', help="Recalcula el inventario desde las transferencias")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    if not args.reconstruir:
+        parser.print_help()
+        return 1
+    meses = reconstruir()
+    print(f"Inventario mensual reconstruido: {meses} meses.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
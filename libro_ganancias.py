@@ -0,0 +1,363 @@
+"""
+Libro de ganancias: un movimiento por transferencia entregada y beneficiario.
+
+La tabla movimientos_ganancias solo admite inserciones: al confirmar una entrega se
+agrega un movimiento para su registrador, otro para su confirmador y otro para el
+administrador. Las correcciones de la conciliación no reescriben nada, se agregan
+como movimientos de ajuste. ganancias_globales pasa a ser un resumen mensual que se
+actualiza a partir de los movimientos recién agregados.
+
+Cada movimiento lleva el mes al que corresponde la ganancia (el de la confirmación,
+o el corregido en un ajuste) y la fecha en que se asentó, que se toma dentro de la
+transacción de escritura y nunca es anterior a la del último movimiento o corte: si
+el reloj retrocede (fin del horario de verano, una corrección), se repite la última.
+
+El saldo de un empleado a una fecha es la suma de lo asentado hasta esa fecha. Para
+no recorrer toda la historia, cortes_ganancias guarda cada cierto número de
+movimientos el saldo acumulado de todos los empleados (un corte); el saldo sale del
+último corte anterior a la fecha más los movimientos del empleado que siguen al
+corte, que por el orden de las fechas son a lo sumo CORTE_CADA.
+
+    python libro_ganancias.py --saldo 3 --fecha 2025-06-30
+    python libro_ganancias.py --movimientos 1520
+    python libro_ganancias.py --corte
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+import cache
+import db
+import migraciones
+from inventario import PORCENTAJE_GANANCIA_GENERAL
+
+# Movimientos entre un corte y el siguiente; acota lo que se recorre al calcular un saldo
+CORTE_CADA = int(os.environ.get('TRANSFERENCIAS_CORTE_CADA', '10000'))
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+# Agrega los movimientos de las transferencias entregadas que cumplen {filtro}: uno
+# para el registrador, otro para el confirmador y otro para el administrador, que
+# recibe el resto de la ganancia general. Los porcentajes son los del momento. Se
+# asientan en :fecha o, si es NULL, en la fecha de confirmación de cada transferencia.
+SQL_REGISTRAR_MOVIMIENTOS = '''
+    WITH entregadas AS (
+        SELECT id, COALESCE(fecha_confirmacion, fecha_solicitud) AS fecha_confirmacion,
+               capital * :porcentaje_general AS ganancia_general, registrador_id, confirmador_id
+        FROM {filtro}
+    ),
+    administrador AS (
+        SELECT id, porcentaje_ganancia FROM empleados WHERE rol = 'administrador' ORDER BY id LIMIT 1
+    ),
+    beneficiarios AS (
+        SELECT t.id, t.fecha_confirmacion, t.registrador_id AS empleado_id, 'registrador' AS concepto,
+               t.ganancia_general, t.ganancia_general * (COALESCE(e.porcentaje_ganancia, 0) / 100.0) AS ganancia
+        FROM entregadas t LEFT JOIN empleados e ON e.id = t.registrador_id
+        UNION ALL
+        SELECT t.id, t.fecha_confirmacion, t.confirmador_id, 'confirmador', t.ganancia_general,
+               t.ganancia_general * (COALESCE(e.porcentaje_ganancia, 0) / 100.0)
+        FROM entregadas t LEFT JOIN empleados e ON e.id = t.confirmador_id
+        UNION ALL
+        SELECT t.id, t.fecha_confirmacion, a.id, 'administrador', t.ganancia_general,
+               t.ganancia_general * (a.porcentaje_ganancia / 100.0)
+        FROM entregadas t CROSS JOIN administrador a
+    ),
+    movimientos AS (
+        SELECT COALESCE(:fecha, fecha_confirmacion) AS fecha,
+               CAST(strftime('%Y', fecha_confirmacion) AS INTEGER) AS anio,
+               CAST(strftime('%m', fecha_confirmacion) AS INTEGER) AS mes,
+               empleado_id, id AS transferencia_id, concepto, ganancia_general, ganancia
+        FROM beneficiarios
+        WHERE empleado_id IS NOT NULL
+    )
+    INSERT INTO movimientos_ganancias
+    (fecha, anio, mes, empleado_id, transferencia_id, concepto, ganancia_general, ganancia_personalizada)
+    SELECT fecha, anio, mes, empleado_id, transferencia_id, concepto, ganancia_general, ganancia
+    FROM movimientos
+    ORDER BY fecha, transferencia_id
+'''
+
+# NOT INDEXED obliga a buscar por ID: sin él SQLite prefiere el índice de estado y
+# recorre todas las transferencias entregadas
+FILTRO_POR_IDS = """transferencias NOT INDEXED
+        WHERE id IN (SELECT value FROM json_each(:ids)) AND estado = 'entregada'"""
+
+FILTRO_ENTREGADAS = "transferencias WHERE estado = 'entregada'"
+
+# Saldo de cada empleado a :fecha: el del último corte anterior más los movimientos
+# entre ese corte y el último asentado hasta :fecha
+SQL_SALDOS = '''
+    WITH corte AS (
+        SELECT COALESCE((
+            SELECT movimiento_hasta FROM cortes_ganancias
+            WHERE fecha_corte <= :fecha
+            ORDER BY fecha_corte DESC, movimiento_hasta DESC LIMIT 1
+        ), 0) AS desde,
+        COALESCE((
+            SELECT id FROM movimientos_ganancias
+            WHERE fecha <= :fecha
+            ORDER BY fecha DESC, id DESC LIMIT 1
+        ), 0) AS hasta
+    )
+    SELECT empleado_id, SUM(ganancia_general), SUM(ganancia_personalizada)
+    FROM (
+        SELECT c.empleado_id, c.ganancia_general, c.ganancia_personalizada
+        FROM cortes_ganancias c, corte
+        WHERE c.movimiento_hasta = corte.desde {empleado_corte}
+        UNION ALL
+        SELECT m.empleado_id, m.ganancia_general, m.ganancia_personalizada
+        FROM movimientos_ganancias m, corte
+        WHERE m.id > corte.desde AND m.id <= corte.hasta {empleado_movimiento}
+    )
+    GROUP BY empleado_id
+'''
+
+
+def _ultimo_movimiento(cursor):
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM movimientos_ganancias')
+    return cursor.fetchone()[0]
+
+
+def _ultimo_corte(cursor):
+    cursor.execute('SELECT movimiento_hasta FROM cortes_ganancias ORDER BY fecha_corte DESC, movimiento_hasta DESC LIMIT 1')
+    fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def _ahora():
+    return datetime.datetime.now().strftime(FORMATO_FECHA)
+
+
+def _fecha_asiento(cursor):
+    """Fecha para asentar en la transacción del cursor: la actual, pero nunca anterior al último asiento"""
+    cursor.execute('''
+        SELECT MAX(fecha) FROM (
+            SELECT fecha FROM (SELECT fecha FROM movimientos_ganancias ORDER BY id DESC LIMIT 1)
+            UNION ALL
+            SELECT MAX(fecha_corte) FROM cortes_ganancias
+        )
+    ''')
+    return max(_ahora(), cursor.fetchone()[0] or '')
+
+
+def _acumular_resumen(cursor, desde_id):
+    """Suma a ganancias_globales los movimientos posteriores a desde_id, por empleado y mes"""
+    # NOT INDEXED: recorrer solo los movimientos nuevos por ID; para agrupar, SQLite
+    # preferiría el índice por empleado y recorrería todo el libro
+    cursor.execute('''
+        INSERT INTO ganancias_globales
+        (empleado_id, mes, anio, ganancia_general, ganancia_personalizada, total_ganancia)
+        SELECT empleado_id, mes, anio, SUM(ganancia_general), SUM(ganancia_personalizada), SUM(ganancia_personalizada)
+        FROM movimientos_ganancias NOT INDEXED
+        WHERE id > ?
+        GROUP BY empleado_id, mes, anio
+        ON CONFLICT (empleado_id, mes, anio) DO UPDATE SET
+            ganancia_general = ganancia_general + excluded.ganancia_general,
+            ganancia_personalizada = ganancia_personalizada + excluded.ganancia_personalizada,
+            total_ganancia = total_ganancia + excluded.total_ganancia
+    ''', (desde_id,))
+
+
+def registrar_entregas(cursor, transferencia_ids):
+    """Agrega al libro los movimientos de las transferencias recién entregadas (en la transacción del cursor)"""
+    desde = _ultimo_movimiento(cursor)
+    cursor.execute(SQL_REGISTRAR_MOVIMIENTOS.format(filtro=FILTRO_POR_IDS), {
+        'ids': json.dumps(list(transferencia_ids)),
+        'porcentaje_general': PORCENTAJE_GANANCIA_GENERAL,
+        'fecha': _fecha_asiento(cursor),
+    })
+    _acumular_resumen(cursor, desde)
+    cache.marcar(cursor, 'movimientos_ganancias', 'ganancias_globales')
+    _cortar_si_corresponde(cursor)
+
+
+def ajustar(cursor, ajustes):
+    """
+    Agrega movimientos de ajuste (en la transacción del cursor) y los suma al resumen mensual.
+
+    Args:
+        ajustes: Tuplas (empleado_id, anio, mes, ganancia_general, ganancia_personalizada)
+            con la diferencia a sumar a ese empleado en ese mes.
+
+    Returns:
+        La cantidad de movimientos agregados.
+    """
+    desde = _ultimo_movimiento(cursor)
+    fecha = _fecha_asiento(cursor)
+    cursor.executemany('''
+        INSERT INTO movimientos_ganancias
+        (fecha, anio, mes, empleado_id, transferencia_id, concepto, ganancia_general, ganancia_personalizada)
+        VALUES (?, ?, ?, ?, NULL, 'ajuste', ?, ?)
+    ''', ((fecha, anio, mes, empleado_id, general, personalizada)
+          for empleado_id, anio, mes, general, personalizada in ajustes))
+    agregados = _ultimo_movimiento(cursor) - desde
+    if agregados:
+        _acumular_resumen(cursor, desde)
+        cache.marcar(cursor, 'movimientos_ganancias', 'ganancias_globales')
+        _cortar_si_corresponde(cursor)
+    return agregados
+
+
+def _cargar_historia(cursor):
+    """Llena el libro vacío con las transferencias entregadas, en orden de fecha y con cortes intermedios"""
+    cursor.execute(SQL_REGISTRAR_MOVIMIENTOS.format(filtro=FILTRO_ENTREGADAS),
+                   {'porcentaje_general': PORCENTAJE_GANANCIA_GENERAL, 'fecha': None})
+    hasta = _ultimo_movimiento(cursor)
+    # Cada corte intermedio lleva la fecha de su último movimiento
+    for limite in range(CORTE_CADA, hasta, CORTE_CADA):
+        cursor.execute('SELECT fecha FROM movimientos_ganancias WHERE id = ?', (limite,))
+        tomar_corte(cursor, limite, cursor.fetchone()[0])
+    tomar_corte(cursor)
+    cache.marcar(cursor, 'movimientos_ganancias')
+    return hasta
+
+
+def cargar_historia():
+    """
+    Llena un libro de ganancias vacío con las transferencias entregadas y rehace
+    ganancias_globales a partir de él. Sirve para datos cargados sin pasar por la
+    confirmación, como los del benchmark.
+
+    Returns:
+        La cantidad de movimientos agregados, o 0 si el libro ya tenía movimientos.
+    """
+    return db.escribir(_cargar_historia_y_resumir)
+
+
+def _cargar_historia_y_resumir(cursor):
+    if _ultimo_movimiento(cursor):
+        return 0
+    agregados = _cargar_historia(cursor)
+    cursor.execute('DELETE FROM ganancias_globales')
+    _acumular_resumen(cursor, 0)
+    cache.marcar(cursor, 'ganancias_globales')
+    return agregados
+
+
+def tomar_corte(cursor, hasta=None, fecha=None):
+    """
+    Guarda el saldo acumulado de cada empleado hasta el movimiento indicado (en la
+    transacción del cursor), a partir del corte anterior y los movimientos siguientes.
+
+    Args:
+        hasta: Último movimiento incluido; por defecto, el último del libro.
+        fecha: Fecha del corte, no anterior a la del movimiento hasta ni posterior a la
+            del siguiente; por defecto, la actual, o la del último asiento si el reloj retrocedió.
+
+    Returns:
+        La cantidad de saldos guardados, o 0 si no había movimientos nuevos.
+    """
+    if hasta is None:
+        hasta = _ultimo_movimiento(cursor)
+    previo = _ultimo_corte(cursor)
+    if hasta <= previo:
+        return 0
+    cursor.execute('''
+        INSERT INTO cortes_ganancias (empleado_id, movimiento_hasta, fecha_corte, ganancia_general, ganancia_personalizada)
+        SELECT empleado_id, :hasta, :fecha, SUM(ganancia_general), SUM(ganancia_personalizada)
+        FROM (
+            SELECT empleado_id, ganancia_general, ganancia_personalizada
+            FROM cortes_ganancias
+            WHERE movimiento_hasta = :previo
+            UNION ALL
+            SELECT empleado_id, ganancia_general, ganancia_personalizada
+            FROM movimientos_ganancias NOT INDEXED
+            WHERE id > :previo AND id <= :hasta
+        )
+        GROUP BY empleado_id
+    ''', {'hasta': hasta, 'previo': previo, 'fecha': fecha or _fecha_asiento(cursor)})
+    return cursor.rowcount
+
+
+def _cortar_si_corresponde(cursor):
+    if _ultimo_movimiento(cursor) - _ultimo_corte(cursor) >= CORTE_CADA:
+        tomar_corte(cursor)
+
+
+def cortar():
+    """Toma un corte con los movimientos agregados desde el anterior; devuelve los saldos guardados"""
+    return db.escribir(tomar_corte)
+
+
+def _limite(fecha):
+    # Sin fecha, todo lo asentado; una fecha sin hora incluye todo ese día
+    if fecha is None:
+        return '9999-12-31 23:59:59'
+    if isinstance(fecha, datetime.datetime):
+        return fecha.strftime(FORMATO_FECHA)
+    if isinstance(fecha, datetime.date) or len(fecha) == 10:
+        return f'{fecha} 23:59:59'
+    return fecha
+
+
+@cache.cacheado('movimientos_ganancias')
+def saldos(fecha=None):
+    """
+    Devuelve un diccionario {empleado_id: (ganancia_general, ganancia_personalizada)}
+    con lo acumulado por cada empleado hasta la fecha (incluida); por defecto, todo lo asentado.
+    """
+    with db.lectura() as cursor:
+        cursor.execute(SQL_SALDOS.format(empleado_corte='', empleado_movimiento=''), {'fecha': _limite(fecha)})
+        return {empleado_id: (general, personalizada) for empleado_id, general, personalizada in cursor.fetchall()}
+
+
+@cache.cacheado('movimientos_ganancias')
+def saldo(empleado_id, fecha=None):
+    """Devuelve (ganancia_general, ganancia_personalizada) acumuladas por el empleado hasta la fecha (incluida)"""
+    with db.lectura() as cursor:
+        cursor.execute(SQL_SALDOS.format(empleado_corte='AND c.empleado_id = :empleado_id',
+                                         empleado_movimiento='AND m.empleado_id = :empleado_id'),
+                       {'fecha': _limite(fecha), 'empleado_id': empleado_id})
+        fila = cursor.fetchone()
+        return (fila[1], fila[2]) if fila else (0.0, 0.0)
+
+
+def consultar_movimientos(transferencia_id):
+    """Devuelve los movimientos (fecha, empleado, concepto, ganancia_general, ganancia_personalizada) de una transferencia"""
+    with db.lectura() as cursor:
+        cursor.execute('''
+            SELECT m.fecha, COALESCE(e.nombre, 'ID ' || m.empleado_id), m.concepto,
+                   m.ganancia_general, m.ganancia_personalizada
+            FROM movimientos_ganancias m LEFT JOIN empleados e ON e.id = m.empleado_id
+            WHERE m.transferencia_id = ?
+            ORDER BY m.id
+        ''', (transferencia_id,))
+        return cursor.fetchall()
+
+
+def _fecha(texto):
+    try:
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: '{texto}'. Use el formato AAAA-MM-DD.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta y mantenimiento del libro de ganancias.")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--saldo', type=int, metavar='EMPLEADO', help="Muestra el saldo acumulado de un empleado")
+    grupo.add_argument('--movimientos', type=int, metavar='TRANSFERENCIA', help="Muestra los movimientos de una transferencia")
+    grupo.add_argument('--corte', action='store_true', help="Toma un corte de saldos con los movimientos nuevos")
+    parser.add_argument('--fecha', type=_fecha, help="Fecha del saldo (AAAA-MM-DD); por defecto, todo lo asentado")
+    args = parser.parse_args(argv)
+    migraciones.migrar()
+
+    if args.corte:
+        print(f"Corte tomado: {cortar()} saldos guardados.")
+    elif args.saldo is not None:
+        general, personalizada = saldo(args.saldo, args.fecha)
+        print(f"Empleado {args.saldo} al {args.fecha or 'último asiento'}: "
+              f"ganancia general {general:.2f}, ganancia personalizada {personalizada:.2f}.")
+    else:
+        movimientos = consultar_movimientos(args.movimientos)
+        if not movimientos:
+            print(f"La transferencia {args.movimientos} no tiene movimientos de ganancias.")
+        for fecha, empleado, concepto, general, personalizada in movimientos:
+            print(f"{fecha}  {empleado} ({concepto}): general {general:.2f}, personalizada {personalizada:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,69 +1,20 @@
 import streamlit as st
 import datetime
-import sqlite3
+import io
+import tempfile
 from datetime import date
 
-# Conexión a la base de datos (se creará si no existe)
-conn = sqlite3.connect('transferencias.db')
-cursor = conn.cursor()
-
-# Crear tablas si no existen
-def crear_tablas():
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS empleados (
-            id INTEGER PRIMARY KEY,
-            nombre TEXT NOT NULL,
-            rol TEXT NOT NULL CHECK (rol IN ('administrador', 'registrador', 'confirmador')),
-            porcentaje_ganancia REAL NOT NULL DEFAULT 0.0
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transferencias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_solicitud TEXT NOT NULL,
-            remitente_nombre TEXT NOT NULL,
-            destinatario_nombre TEXT NOT NULL,
-            destinatario_telefono TEXT NOT NULL,
-            capital REAL NOT NULL,
-            fecha_confirmacion TEXT,
-            confirmador_id INTEGER,
-            registrador_id INTEGER NOT NULL,
-            estado TEXT NOT NULL CHECK (estado IN ('solicitada', 'confirmada', 'entregada')),
-            FOREIGN KEY (registrador_id) REFERENCES empleados (id),
-            FOREIGN KEY (confirmador_id) REFERENCES empleados (id)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS historial_ediciones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transferencia_id INTEGER NOT NULL,
-            fecha_edicion TEXT NOT NULL,
-            empleado_editor_id INTEGER NOT NULL,
-            campo_editado TEXT NOT NULL,
-            valor_anterior TEXT,
-            valor_nuevo TEXT,
-            FOREIGN KEY (transferencia_id) REFERENCES transferencias (id),
-            FOREIGN KEY (empleado_editor_id) REFERENCES empleados (id)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ganancias_globales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            empleado_id INTEGER NOT NULL,
-            mes INTEGER NOT NULL,
-            anio INTEGER NOT NULL,
-            ganancia_general REAL NOT NULL,
-            ganancia_personalizada REAL NOT NULL,
-            total_ganancia REAL NOT NULL,
-            FOREIGN KEY (empleado_id) REFERENCES empleados (id)
-        )
-    ''')
-    conn.commit()
-
-# Verificar si hay empleados registrados
-def hay_empleados_registrados():
-    cursor.execute('SELECT COUNT(*) FROM empleados')
-    return cursor.fetchone()[0] > 0
+# pandas y los módulos que lo usan (reportes, conciliacion) se importan dentro de las
+# páginas que los necesitan: cargarlos demora unos 0,3 s y la pantalla de inicio no los usa
+import busqueda
+import db
+import exportacion
+import importacion
+import inventario
+import libro_ganancias
+import metricas
+import servicios
+import sucursales
 
 # Registrar primer administrador
 def registrar_primer_administrador():
@@ -83,227 +34,296 @@ def registrar_primer_administrador():
 
 # Funciones para la gestión de datos
 def agregar_empleado(id_empleado, nombre, rol, porcentaje_ganancia=0.0):
-    cursor.execute('INSERT INTO empleados (id, nombre, rol, porcentaje_ganancia) VALUES (?, ?, ?, ?)', 
-                  (id_empleado, nombre, rol, porcentaje_ganancia))
-    conn.commit()
+    servicios.agregar_empleado(id_empleado, nombre, rol, porcentaje_ganancia)
     st.success(f"Empleado {nombre} ({rol}) agregado con ID {id_empleado} y porcentaje de ganancia {porcentaje_ganancia:.2f}%.")
 
-def calcular_ganancia_general(capital):
-    """Calcula el 10% del capital como ganancia general"""
-    return capital * 0.10
-
-def distribuir_ganancias(transferencia_id):
-    """Distribuye las ganancias de una transferencia a los empleados involucrados"""
-    # Obtener datos de la transferencia
-    cursor.execute('''
-        SELECT capital, registrador_id, confirmador_id 
-        FROM transferencias 
-        WHERE id = ? AND estado = 'entregada'
-    ''', (transferencia_id,))
-    transferencia = cursor.fetchone()
-    
-    if not transferencia:
-        return
-    
-    capital, registrador_id, confirmador_id = transferencia
-    ganancia_general = calcular_ganancia_general(capital)
-    fecha_actual = datetime.datetime.now()
-    mes = fecha_actual.month
-    anio = fecha_actual.year
-    
-    # Obtener porcentajes de ganancia para cada rol
-    cursor.execute('SELECT porcentaje_ganancia FROM empleados WHERE id = ?', (registrador_id,))
-    porcentaje_registrador = cursor.fetchone()[0] or 0
-    
-    cursor.execute('SELECT porcentaje_ganancia FROM empleados WHERE id = ?', (confirmador_id,))
-    porcentaje_confirmador = cursor.fetchone()[0] or 0
-    
-    # El administrador recibe el resto de la ganancia general
-    cursor.execute('SELECT id, porcentaje_ganancia FROM empleados WHERE rol = "administrador"')
-    admin_data = cursor.fetchone()
-    if admin_data:
-        admin_id, porcentaje_admin = admin_data
-    else:
-        admin_id, porcentaje_admin = None, 0
-    
-    # Calcular ganancias para cada empleado
-    ganancia_registrador = ganancia_general * (porcentaje_registrador / 100)
-    ganancia_confirmador = ganancia_general * (porcentaje_confirmador / 100)
-    ganancia_admin = ganancia_general * (porcentaje_admin / 100)
-    
-    # Registrar ganancias en la tabla de ganancias globales
-    empleados_ganancias = [
-        (registrador_id, mes, anio, ganancia_general, ganancia_registrador, ganancia_registrador),
-        (confirmador_id, mes, anio, ganancia_general, ganancia_confirmador, ganancia_confirmador)
-    ]
-    
-    if admin_id:
-        empleados_ganancias.append(
-            (admin_id, mes, anio, ganancia_general, ganancia_admin, ganancia_admin)
-        )
-    
-    for empleado_id, mes, anio, gg, gp, total in empleados_ganancias:
-        # Verificar si ya existe un registro para este empleado en el mes/año
-        cursor.execute('''
-            SELECT id FROM ganancias_globales 
-            WHERE empleado_id = ? AND mes = ? AND anio = ?
-        ''', (empleado_id, mes, anio))
-        
-        if cursor.fetchone():
-            # Actualizar registro existente
-            cursor.execute('''
-                UPDATE ganancias_globales
-                SET ganancia_general = ganancia_general + ?,
-                    ganancia_personalizada = ganancia_personalizada + ?,
-                    total_ganancia = total_ganancia + ?
-                WHERE empleado_id = ? AND mes = ? AND anio = ?
-            ''', (gg, gp, total, empleado_id, mes, anio))
-        else:
-            # Insertar nuevo registro
-            cursor.execute('''
-                INSERT INTO ganancias_globales 
-                (empleado_id, mes, anio, ganancia_general, ganancia_personalizada, total_ganancia)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (empleado_id, mes, anio, gg, gp, total))
-    
-    conn.commit()
-
 def registrar_transferencia(registrador_id, remitente_nombre, destinatario_nombre, destinatario_telefono, capital):
-    fecha_solicitud = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    estado = 'solicitada'
-    cursor.execute('''
-        INSERT INTO transferencias 
-        (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, registrador_id, estado)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, registrador_id, estado))
-    conn.commit()
-    transferencia_id = cursor.lastrowid
+    transferencia_id = servicios.registrar_transferencia(registrador_id, remitente_nombre, destinatario_nombre, destinatario_telefono, capital)
     st.info(f"Transferencia registrada (solicitada) con ID: {transferencia_id}. Esperando confirmación del confirmador.")
     return transferencia_id
 
+def importar_transferencias_desde_archivo(registrador_id):
+    """Importa un lote de transferencias desde un archivo CSV o JSONL subido por el registrador"""
+    import pandas as pd
+    st.subheader("Importar Transferencias")
+    st.caption("Columnas: remitente_nombre, destinatario_nombre, destinatario_telefono, capital y, opcionalmente, fecha_solicitud (AAAA-MM-DD HH:MM:SS).")
+    archivo = st.file_uploader("Archivo CSV o JSONL:", type=["csv", "jsonl"])
+    if archivo is None or not st.button("Importar"):
+        return
+
+    formato = 'jsonl' if archivo.name.endswith('.jsonl') else 'csv'
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        insertadas, errores = importacion.importar_transferencias(importacion.leer_filas(texto, formato), registrador_id)
+    except ValueError as error:
+        st.error(str(error))
+        return
+
+    st.success(f"Se importaron {insertadas} transferencias (solicitadas).")
+    if errores:
+        st.warning(f"{len(errores)} filas no se importaron:")
+        st.dataframe(pd.DataFrame(errores, columns=["Línea", "Error"]), hide_index=True, width="stretch")
+
 def confirmar_transferencia_entregada(transferencia_id, confirmador_id):
-    fecha_confirmacion = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute('''
-        UPDATE transferencias
-        SET estado = 'entregada', fecha_confirmacion = ?, confirmador_id = ?
-        WHERE id = ? AND estado = 'solicitada'
-    ''', (fecha_confirmacion, confirmador_id, transferencia_id))
-    
-    if cursor.rowcount > 0:
-        conn.commit()
-        # Distribuir ganancias ahora que la transferencia está entregada
-        distribuir_ganancias(transferencia_id)
+    if servicios.confirmar_transferencias_entregadas([transferencia_id], confirmador_id):
         st.success("Transferencia marcada como entregada y ganancias distribuidas.")
     else:
         st.error("Error: La transferencia no se pudo confirmar.")
 
-def editar_transferencia(transferencia_id, empleado_editor_id, campo, nuevo_valor):
-    campos_editables = {
-        'remitente_nombre': 'TEXT',
-        'destinatario_nombre': 'TEXT',
-        'destinatario_telefono': 'TEXT',
-        'capital': 'REAL'
-    }
-    if campo not in campos_editables:
-        st.error(f"El campo '{campo}' no es editable.")
-        return False
+def confirmar_entregas_en_lote(confirmador_id):
+    """Permite seleccionar varias transferencias pendientes y confirmarlas juntas"""
+    import pandas as pd
+    st.subheader("Confirmar Entregas en Lote")
+    pagina = servicios.consultar_pagina_transferencias('confirmador', confirmador_id, tamano=TAMANO_LOTE_CONFIRMACION)
+    filas = pagina[0] if pagina else []
+    if not filas:
+        st.info("No hay transferencias pendientes.")
+        return
 
-    cursor.execute(f'SELECT {campo} FROM transferencias WHERE id = ?', (transferencia_id,))
-    valor_anterior = cursor.fetchone()[0]
-
-    cursor.execute(f'UPDATE transferencias SET {campo} = ? WHERE id = ?', (nuevo_valor, transferencia_id))
-    conn.commit()
-
-    if cursor.rowcount > 0:
-        fecha_edicion = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute('''
-            INSERT INTO historial_ediciones (transferencia_id, fecha_edicion, empleado_editor_id, campo_editado, valor_anterior, valor_nuevo)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (transferencia_id, fecha_edicion, empleado_editor_id, campo, str(valor_anterior), str(nuevo_valor)))
-        conn.commit()
-        st.info(f"Transferencia ID {transferencia_id}: El campo '{campo}' ha sido editado de '{valor_anterior}' a '{nuevo_valor}'.")
-        return True
-    else:
-        st.error(f"No se pudo editar la transferencia ID {transferencia_id}. Verifique el ID.")
-        return False
+    df = pd.DataFrame.from_records(filas, columns=COLUMNAS_TRANSFERENCIAS)
+    df = df.drop(columns=["Fecha Confirmación", "Confirmador"])
+    df.insert(0, "Confirmar", st.checkbox("Seleccionar todas", key="lote_todas"))
+    editado = st.data_editor(df, hide_index=True, width="stretch", disabled=list(df.columns[1:]), key="lote_editor")
+    ids_texto = st.text_input("O ingrese IDs separados por comas:", key="lote_ids")
+
+    if st.button("Confirmar Entregas"):
+        try:
+            ids_extra = [int(valor) for valor in ids_texto.replace(' ', '').split(',') if valor]
+        except ValueError:
+            st.error("Los IDs deben ser números enteros separados por comas.")
+            return
+        seleccionadas = list(dict.fromkeys(editado.loc[editado["Confirmar"], "ID"].tolist() + ids_extra))
+        if not seleccionadas:
+            st.warning("Seleccione al menos una transferencia.")
+            return
+        confirmadas = servicios.confirmar_transferencias_entregadas(seleccionadas, confirmador_id)
+        st.success(f"{len(confirmadas)} transferencias marcadas como entregadas y ganancias distribuidas.")
+        omitidas = sorted(set(seleccionadas) - set(confirmadas))
+        if omitidas:
+            st.warning(f"No se pudieron confirmar las transferencias: {', '.join(map(str, omitidas))}.")
+
+# Campos editables y su nombre en las tablas
+COLUMNAS_EDITABLES = {
+    'remitente_nombre': "Remitente",
+    'destinatario_nombre': "Destinatario",
+    'destinatario_telefono': "Teléfono",
+    'capital': "Capital",
+}
+
+def editar_transferencias(empleado_editor_id, clave="edicion"):
+    """Permite corregir varios campos de una o muchas transferencias y guardar todo en una sola transacción"""
+    import pandas as pd
+    st.subheader("Editar Transferencias")
+    ids_texto = st.text_input("IDs de las transferencias a editar, separados por comas:", key=f"{clave}_ids")
+    try:
+        ids = list(dict.fromkeys(int(valor) for valor in ids_texto.replace(' ', '').split(',') if valor))
+    except ValueError:
+        st.error("Los IDs deben ser números enteros separados por comas.")
+        return
+    if not ids:
+        return
+
+    filas = servicios.consultar_transferencias_editables(ids)
+    faltantes = sorted(set(ids) - {fila[0] for fila in filas})
+    if faltantes:
+        st.warning(f"No se encontraron las transferencias: {', '.join(map(str, faltantes))}.")
+    if not filas:
+        return
 
-def listar_transferencias(rol, empleado_id=None):
+    original = pd.DataFrame.from_records(filas, columns=["ID", *COLUMNAS_EDITABLES.values()])
+    st.caption("Corrija las celdas necesarias y guarde; solo se registran en el historial los campos que cambian.")
+    # El contador cambia la clave del editor para que, después de guardar, muestre los valores nuevos
+    version = st.session_state.setdefault(f"{clave}_version", 0)
+    editado = st.data_editor(original, hide_index=True, width="stretch", disabled=["ID"], key=f"{clave}_editor_{version}")
+
+    if st.button("Guardar Cambios", key=f"{clave}_guardar"):
+        cambios = {}
+        for (_, antes), (_, despues) in zip(original.iterrows(), editado.iterrows()):
+            campos = {campo: despues[columna] for campo, columna in COLUMNAS_EDITABLES.items() if despues[columna] != antes[columna]}
+            if campos:
+                cambios[int(antes["ID"])] = campos
+        if not cambios:
+            st.info("No hay cambios para guardar.")
+            return
+        try:
+            aplicados = servicios.editar_transferencias(cambios, empleado_editor_id)
+        except ValueError as error:
+            st.error(str(error))
+            return
+        st.session_state[f"{clave}_version"] = version + 1
+        detalle = [(transferencia_id, COLUMNAS_EDITABLES[campo], anterior, nuevo)
+                   for transferencia_id, campos in aplicados.items() for campo, (anterior, nuevo) in campos.items()]
+        st.success(f"{len(detalle)} campos editados en {sum(bool(campos) for campos in aplicados.values())} transferencias.")
+        if detalle:
+            st.dataframe(pd.DataFrame(detalle, columns=["ID", "Campo", "Anterior", "Nuevo"]).astype({"Anterior": str, "Nuevo": str}),
+                         hide_index=True, width="stretch")
+
+# Máximo de transferencias pendientes mostradas para confirmar en lote
+TAMANO_LOTE_CONFIRMACION = 500
+
+COLUMNAS_TRANSFERENCIAS = ["ID", "Fecha Solicitud", "Remitente", "Destinatario", "Teléfono", "Capital",
+                           "Fecha Confirmación", "Registrador", "Confirmador", "Estado"]
+
+def _filtros_listado(rol, clave):
+    """Dibuja los filtros del listado y devuelve el diccionario de filtros elegido"""
+    filtros = {}
+    with st.expander("Filtros"):
+        col1, col2 = st.columns(2)
+        with col1:
+            if rol != 'confirmador':
+                estado = st.selectbox("Estado:", ["Todos", "solicitada", "confirmada", "entregada"], key=f"{clave}_estado")
+                if estado != "Todos":
+                    filtros['estado'] = estado
+            filtros['fecha_desde'] = st.date_input("Desde:", value=None, key=f"{clave}_desde")
+            filtros['capital_min'] = st.number_input("Capital mínimo:", value=None, min_value=0.0, key=f"{clave}_capital_min")
+        with col2:
+            if rol == 'administrador':
+                filtros['registrador_id'] = st.number_input("ID del registrador:", value=None, step=1, format="%d", key=f"{clave}_registrador")
+            filtros['fecha_hasta'] = st.date_input("Hasta:", value=None, key=f"{clave}_hasta")
+            filtros['capital_max'] = st.number_input("Capital máximo:", value=None, min_value=0.0, key=f"{clave}_capital_max")
+        if rol != 'confirmador':
+            filtros['incluir_archivo'] = st.checkbox("Incluir transferencias archivadas", key=f"{clave}_archivo")
+    return filtros
+
+def listar_transferencias(rol, empleado_id=None, clave="listado"):
     """
-    Lista las transferencias según el rol del usuario.
+    Lista las transferencias según el rol del usuario, una página a la vez.
 
     Args:
         rol: El rol del usuario ('administrador', 'registrador', 'confirmador').
         empleado_id: El ID del empleado (opcional, para filtrar por registrador o confirmador).
+        clave: Prefijo para los widgets y el estado de paginación del listado.
     """
-    if rol == 'administrador':
-        cursor.execute('''
-            SELECT t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
-                   t.capital, t.fecha_confirmacion, e_reg.nombre, e_conf.nombre, t.estado
-            FROM transferencias t
-            JOIN empleados e_reg ON t.registrador_id = e_reg.id
-            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
-            ORDER BY t.fecha_solicitud DESC
-        ''')
-        transferencias = cursor.fetchall()
-    elif rol == 'registrador' and empleado_id:
-        cursor.execute('''
-            SELECT t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
-                   t.capital, t.fecha_confirmacion, e_reg.nombre, e_conf.nombre, t.estado
-            FROM transferencias t
-            JOIN empleados e_reg ON t.registrador_id = e_reg.id
-            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
-            WHERE t.registrador_id = ?
-            ORDER BY t.fecha_solicitud DESC
-        ''', (empleado_id,))
-        transferencias = cursor.fetchall()
-    elif rol == 'confirmador' and empleado_id:
-        cursor.execute('''
-            SELECT t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
-                   t.capital, t.fecha_confirmacion, e_reg.nombre, e_conf.nombre, t.estado
-            FROM transferencias t
-            JOIN empleados e_reg ON t.registrador_id = e_reg.id
-            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
-            WHERE t.estado = 'solicitada'
-            ORDER BY t.fecha_solicitud DESC
-        ''')
-        transferencias = cursor.fetchall()
-    else:
+    import pandas as pd
+    if rol not in ('administrador', 'registrador', 'confirmador') or (rol != 'administrador' and not empleado_id):
         st.warning("No se pueden listar las transferencias para este rol.")
         return
 
-    if not transferencias:
+    filtros = _filtros_listado(rol, clave)
+
+    # Las claves de inicio de cada página visitada permiten volver atrás; se reinician al cambiar los filtros
+    estado_paginas = f"{clave}_paginas"
+    firma_filtros = (rol, empleado_id, tuple(sorted(filtros.items())))
+    if st.session_state.get(f"{clave}_filtros") != firma_filtros:
+        st.session_state[f"{clave}_filtros"] = firma_filtros
+        st.session_state[estado_paginas] = [None]
+    paginas = st.session_state[estado_paginas]
+
+    filas, siguiente = servicios.consultar_pagina_transferencias(rol, empleado_id, filtros, paginas[-1])
+
+    if not filas and len(paginas) == 1:
         st.info("No hay transferencias registradas.")
         return
 
     st.subheader("Listado de Transferencias:")
-    for transferencia in transferencias:
-        id_transaccion, fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, fecha_confirmacion, registrador_nombre, confirmador_nombre, estado = transferencia
-        st.write(f"**ID:** {id_transaccion}, **Fecha Solicitud:** {fecha_solicitud}, **Remitente:** {remitente_nombre}, **Destinatario:** {destinatario_nombre} ({destinatario_telefono}), **Capital:** {capital}, **Fecha Confirmación:** {fecha_confirmacion if fecha_confirmacion else 'Pendiente'}, **Registrador:** {registrador_nombre}, **Confirmador:** {confirmador_nombre if confirmador_nombre else 'Pendiente'}, **Estado:** {estado}")
+    df = pd.DataFrame.from_records(filas, columns=COLUMNAS_TRANSFERENCIAS)
+    df[["Fecha Confirmación", "Confirmador"]] = df[["Fecha Confirmación", "Confirmador"]].fillna('Pendiente')
+    st.dataframe(df, hide_index=True, width="stretch")
+
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("Anterior", key=f"{clave}_anterior", disabled=len(paginas) == 1):
+            paginas.pop()
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {len(paginas)}")
+    with col_siguiente:
+        if st.button("Siguiente", key=f"{clave}_siguiente", disabled=siguiente is None):
+            paginas.append(siguiente)
+            st.rerun()
+
+def buscar_transferencias(rol, empleado_id=None, clave="busqueda"):
+    """Busca transferencias por nombre del remitente o del destinatario o por el comienzo del teléfono"""
+    import pandas as pd
+    st.subheader("Buscar Transferencias")
+    texto = st.text_input("Nombre o teléfono:", key=f"{clave}_texto", placeholder="p. ej. maria gonzalez o 5351")
+    if st.session_state.get(f"{clave}_anterior_texto") != texto:
+        st.session_state[f"{clave}_anterior_texto"] = texto
+        st.session_state[f"{clave}_pagina"] = 0
+    if not texto.strip():
+        return
+
+    pagina = st.session_state[f"{clave}_pagina"]
+    resultado = busqueda.buscar(texto, rol, empleado_id, pagina)
+    if resultado is None:
+        st.warning("No se pueden buscar transferencias para este rol.")
+        return
+    filas, hay_mas = resultado
+    if not filas and pagina == 0:
+        st.info("No se encontraron transferencias.")
+        return
+
+    df = pd.DataFrame.from_records(filas, columns=COLUMNAS_TRANSFERENCIAS)
+    df[["Fecha Confirmación", "Confirmador"]] = df[["Fecha Confirmación", "Confirmador"]].fillna('Pendiente')
+    st.dataframe(df, hide_index=True, width="stretch")
+
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("Anterior", key=f"{clave}_anterior", disabled=pagina == 0):
+            st.session_state[f"{clave}_pagina"] -= 1
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {pagina + 1}")
+    with col_siguiente:
+        if st.button("Siguiente", key=f"{clave}_siguiente", disabled=not hay_mas):
+            st.session_state[f"{clave}_pagina"] += 1
+            st.rerun()
+    if not hay_mas and (pagina + 1) * busqueda.TAMANO_PAGINA >= busqueda.MAXIMO_COINCIDENCIAS:
+        st.caption(f"Se muestran las {busqueda.MAXIMO_COINCIDENCIAS} coincidencias más recientes; agregue palabras para acotar la búsqueda.")
+
+# Segundos entre revisiones de la cola de pendientes en vivo
+INTERVALO_COLA_PENDIENTES = 1
+
+@st.fragment(run_every=INTERVALO_COLA_PENDIENTES)
+def cola_pendientes_en_vivo(clave="cola"):
+    """
+    Muestra las transferencias pendientes y las actualiza solas.
+
+    Solo este fragmento se vuelve a ejecutar en cada intervalo. Si ninguna conexión
+    confirmó cambios desde la última revisión no se consulta nada; si los hubo, se
+    piden únicamente las transferencias nuevas y el estado de las mostradas.
+    """
+    import pandas as pd
+    with metricas.medir('pagina', "Cola de Pendientes"):
+        version = db.version_datos()
+        cola = st.session_state.get(clave)
+        if cola is None or (cola['hay_mas'] and len(cola['filas']) < servicios.TAMANO_COLA_PENDIENTES):
+            # Primera carga, o se confirmaron algunas y hay más pendientes fuera de la cola
+            filas, hay_mas, ultimo_id = servicios.consultar_cola_pendientes()
+            cola = st.session_state[clave] = {'filas': filas, 'hay_mas': hay_mas, 'ultimo_id': ultimo_id, 'version': version}
+        elif cola['version'] != version:
+            filas, ultimo_id = servicios.consultar_cambios_pendientes([fila[0] for fila in cola['filas']], cola['ultimo_id'])
+            nuevas = sum(fila[0] > cola['ultimo_id'] for fila in filas)
+            if nuevas:
+                st.toast(f"Nuevas transferencias pendientes: {nuevas}.")
+            if len(filas) > servicios.TAMANO_COLA_PENDIENTES:
+                filas, cola['hay_mas'] = filas[:servicios.TAMANO_COLA_PENDIENTES], True
+            cola.update(filas=filas, ultimo_id=ultimo_id, version=version)
+
+        st.subheader("Transferencias Pendientes")
+        if not cola['filas']:
+            st.info("No hay transferencias pendientes.")
+        else:
+            df = pd.DataFrame.from_records(cola['filas'], columns=COLUMNAS_TRANSFERENCIAS)
+            df = df.drop(columns=["Fecha Confirmación", "Confirmador", "Estado"])
+            st.dataframe(df, hide_index=True, width="stretch")
+        aviso = f" Se muestran las {servicios.TAMANO_COLA_PENDIENTES} más recientes." if cola['hay_mas'] else ""
+        st.caption(f"Actualizado a las {datetime.datetime.now():%H:%M:%S}.{aviso}")
 
 def listar_empleados():
-    cursor.execute('SELECT id, nombre, rol, porcentaje_ganancia FROM empleados')
-    empleados = cursor.fetchall()
+    empleados = servicios.consultar_empleados()
     if not empleados:
         st.info("No hay empleados registrados.")
         return
     st.subheader("Listado de Empleados:")
+    saldos = libro_ganancias.saldos()
     for id_empleado, nombre, rol, porcentaje_ganancia in empleados:
-        st.write(f"**ID:** {id_empleado}, **Nombre:** {nombre}, **Rol:** {rol}, **Ganancia:** {porcentaje_ganancia:.2f}%")
-
-def obtener_empleado_por_id(empleado_id):
-    cursor.execute('SELECT id, nombre, rol, porcentaje_ganancia FROM empleados WHERE id = ?', (empleado_id,))
-    empleado = cursor.fetchone()
-    return empleado
+        _, saldo = saldos.get(id_empleado, (0.0, 0.0))
+        st.write(f"**ID:** {id_empleado}, **Nombre:** {nombre}, **Rol:** {rol}, **Ganancia:** {porcentaje_ganancia:.2f}%, "
+                 f"**Saldo acumulado:** {saldo:.2f}")
 
 def mostrar_historial_ediciones(transferencia_id):
-    cursor.execute('''
-        SELECT he.fecha_edicion, e.nombre, he.campo_editado, he.valor_anterior, he.valor_nuevo
-        FROM historial_ediciones he
-        JOIN empleados e ON he.empleado_editor_id = e.id
-        WHERE he.transferencia_id = ?
-        ORDER BY he.fecha_edicion DESC
-    ''', (transferencia_id,))
-    historial = cursor.fetchall()
+    historial = servicios.consultar_historial_ediciones(transferencia_id, incluir_archivo=True)
     if not historial:
         st.info(f"No hay historial de ediciones para la Transferencia ID {transferencia_id}.")
         return
@@ -311,85 +331,246 @@ def mostrar_historial_ediciones(transferencia_id):
     for fecha_edicion, nombre_editor, campo_editado, valor_anterior, valor_nuevo in historial:
         st.write(f"**Fecha:** {fecha_edicion}, **Editor:** {nombre_editor}, **Campo:** {campo_editado}, **Anterior:** {valor_anterior}, **Nuevo:** {valor_nuevo}")
 
-def mostrar_inventario_mensual(mes, anio):
+# Meses mostrados en la tendencia del inventario mensual
+MESES_TENDENCIA = 12
+
+def elegir_alcance(clave):
+    """Si hay sucursales registradas, permite elegir el alcance del reporte; devuelve True para todas"""
+    if not sucursales.multisucursal():
+        return False
+    alcance = st.radio("Alcance:", ["Esta sucursal", "Todas las sucursales"], horizontal=True, key=clave)
+    return alcance == "Todas las sucursales"
+
+def mostrar_errores_sucursales(errores):
+    for nombre, error in errores.items():
+        st.warning(f"Sin datos de la sucursal {nombre}: {error}")
+
+def mostrar_inventario_mensual(mes, anio, consolidado=False):
     """
     Muestra el inventario mensual de dinero enviado y ganancias de los empleados.
 
     Args:
         mes: El mes para el que se genera el inventario (1-12).
         anio: El año para el que se genera el inventario.
+        consolidado: Si suma el inventario de todas las sucursales registradas.
     """
+    import pandas as pd
     try:
         fecha_inicio = datetime.date(anio, mes, 1)
-        fecha_fin = fecha_inicio + datetime.timedelta(days=32)
-        fecha_fin = fecha_fin.replace(day=1) - datetime.timedelta(days=1)
     except ValueError:
         st.error("Por favor, ingrese un mes y año válidos.")
         return
 
-    cursor.execute('''
-        SELECT SUM(capital)
-        FROM transferencias
-        WHERE estado = 'entregada' AND fecha_solicitud BETWEEN ? AND ?
-    ''', (fecha_inicio, fecha_fin))
-    total_capital = cursor.fetchone()[0] or 0
-
-    ganancia_general_mes = calcular_ganancia_general(total_capital)
+    if consolidado:
+        (total_capital, cantidad, ganancia_general_mes), por_sucursal, filas, errores = (
+            sucursales.inventario_consolidado(mes, anio, MESES_TENDENCIA))
+        mostrar_errores_sucursales(errores)
+    else:
+        total_capital, cantidad, ganancia_general_mes = inventario.consultar_mes(mes, anio)
+        # Tendencia de los últimos meses hasta el mes consultado
+        inicio = anio * 12 + mes - MESES_TENDENCIA
+        filas = inventario.consultar_rango(inicio % 12 + 1, inicio // 12, mes, anio)
 
     st.subheader(f"Inventario Mensual - {fecha_inicio.strftime('%B %Y')}")
     st.write(f"**Total de capital enviado:** {total_capital:.2f}")
+    st.write(f"**Transferencias entregadas:** {cantidad}")
     st.write(f"**Ganancia General del Mes:** {ganancia_general_mes:.2f}")
+    if consolidado:
+        st.write("**Por sucursal:**")
+        st.dataframe(pd.DataFrame.from_dict(por_sucursal, orient="index",
+                                            columns=["Capital", "Transferencias", "Ganancia General"]),
+                     width="stretch")
+
+    if len(filas) > 1:
+        df = pd.DataFrame.from_records(filas, columns=["Año", "Mes", "Capital", "Transferencias", "Ganancia General"])
+        df.index = [f"{a}-{m:02d}" for a, m in zip(df["Año"], df["Mes"])]
+        st.write(f"**Tendencia de los últimos {MESES_TENDENCIA} meses:**")
+        st.bar_chart(df[["Capital", "Ganancia General"]])
+
+def mostrar_reporte_ganancias(mes=None, anio=None, mes_hasta=None, anio_hasta=None, agrupacion="Mes", consolidado=False):
+    """
+    Muestra un reporte de ganancias para un mes o un rango de meses.
 
-def mostrar_reporte_ganancias(mes=None, anio=None):
-    """Muestra un reporte de ganancias para un mes y año específicos"""
+    Args:
+        mes, anio: Primer mes del reporte (por defecto, el mes actual).
+        mes_hasta, anio_hasta: Último mes del reporte (por defecto, el mismo mes).
+        agrupacion: 'Mes', 'Trimestre' o 'Año', para las tablas por período.
+        consolidado: Si el reporte suma todas las sucursales registradas.
+    """
+    import reportes
     if mes is None:
         mes = datetime.datetime.now().month
     if anio is None:
         anio = datetime.datetime.now().year
+    if mes_hasta is None or anio_hasta is None:
+        mes_hasta, anio_hasta = mes, anio
     
-    st.subheader(f"Reporte de Ganancias - {mes}/{anio}")
-    
-    # Total de ganancias generales del mes
-    cursor.execute('''
-        SELECT SUM(ganancia_general) 
-        FROM ganancias_globales 
-        WHERE mes = ? AND anio = ?
-    ''', (mes, anio))
-    total_ganancia_general = cursor.fetchone()[0] or 0
-    st.write(f"**Total ganancia general del mes:** ${total_ganancia_general:,.2f}")
-    
-    # Ganancias por empleado
-    cursor.execute('''
-        SELECT e.id, e.nombre, e.rol, 
-               SUM(g.ganancia_general) as total_gg,
-               SUM(g.ganancia_personalizada) as total_gp,
-               SUM(g.total_ganancia) as total
-        FROM empleados e
-        JOIN ganancias_globales g ON e.id = g.empleado_id
-        WHERE g.mes = ? AND g.anio = ?
-        GROUP BY e.id, e.nombre, e.rol
-        ORDER BY total DESC
-    ''', (mes, anio))
+    if (anio, mes) == (anio_hasta, mes_hasta):
+        st.subheader(f"Reporte de Ganancias - {mes}/{anio}")
+    else:
+        st.subheader(f"Reporte de Ganancias - {mes}/{anio} a {mes_hasta}/{anio_hasta}")
     
-    resultados = cursor.fetchall()
+    if consolidado:
+        try:
+            reporte, errores = sucursales.reporte_consolidado(mes, anio, mes_hasta, anio_hasta, agrupacion)
+        except RuntimeError as error:
+            st.error(str(error))
+            return
+        mostrar_errores_sucursales(errores)
+    else:
+        reporte = reportes.generar_reporte(mes, anio, mes_hasta, anio_hasta, agrupacion, incluir_archivo=True)
+    st.write(f"**Total ganancia general del período:** ${reporte['total_ganancia_general']:,.2f}")
     
-    if not resultados:
+    por_empleado = reporte["por_empleado"]
+    if por_empleado.empty:
         st.info("No hay registros de ganancias para este período.")
         return
     
+    formato_moneda = {columna: "${:,.2f}" for columna in reportes.COLUMNAS_GANANCIAS}
+    
+    if "por_sucursal" in reporte:
+        st.write("**Desglose por sucursal:**")
+        st.dataframe(reporte["por_sucursal"].style.format(formato_moneda), width="stretch")
+    
     st.write("**Desglose por empleado:**")
-    for emp_id, nombre, rol, gg, gp, total in resultados:
-        st.write(f"- **{nombre}** ({rol}):")
-        st.write(f"  - Ganancia general: ${gg:,.2f}")
-        st.write(f"  - Ganancia personalizada: ${gp:,.2f}")
-        st.write(f"  - **Total:** ${total:,.2f}")
-        st.write("")
+    st.dataframe(
+        por_empleado.drop(columns="empleado_id").style.format({**formato_moneda, "participacion": "{:.1%}"}),
+        hide_index=True, width="stretch",
+    )
+    
+    st.write("**Desglose por rol:**")
+    st.dataframe(reporte["por_rol"].style.format(formato_moneda), width="stretch")
+    
+    por_periodo = reporte["por_periodo"]
+    st.write(f"**Ganancia total por {agrupacion.lower()}:**")
+    st.dataframe(por_periodo.style.format("${:,.2f}"), width="stretch")
+    if len(por_periodo) > 1:
+        st.bar_chart(por_periodo)
+    
+    if not reporte["transferencias"].empty:
+        st.write(f"**Transferencias por {agrupacion.lower()}:**")
+        st.dataframe(reporte["transferencias"], width="stretch")
+
+def mostrar_conciliacion_ganancias():
+    """Compara las ganancias guardadas con las recalculadas desde las transferencias y permite corregirlas"""
+    import conciliacion
+    st.subheader("Conciliar Ganancias")
+    st.caption("Recalcula las ganancias de cada empleado por mes de confirmación con los porcentajes actuales.")
+    hoy = datetime.datetime.now()
+    col1, col2 = st.columns(2)
+    with col1:
+        mes_desde = st.number_input("Desde el mes:", min_value=1, max_value=12, value=1, key="conciliacion_mes_desde")
+        anio_desde = st.number_input("Desde el año:", min_value=2020, max_value=2100, value=hoy.year, key="conciliacion_anio_desde")
+    with col2:
+        mes_hasta = st.number_input("Hasta el mes:", min_value=1, max_value=12, value=hoy.month, key="conciliacion_mes_hasta")
+        anio_hasta = st.number_input("Hasta el año:", min_value=2020, max_value=2100, value=hoy.year, key="conciliacion_anio_hasta")
+    if (anio_hasta, mes_hasta) < (anio_desde, mes_desde):
+        st.error("El final del rango debe ser posterior a su inicio.")
+        return
+
+    diferencias = conciliacion.comparar(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    if diferencias.empty:
+        st.success("Las ganancias guardadas coinciden con las transferencias entregadas.")
+        return
+
+    st.warning(f"Se encontraron {len(diferencias)} registros de ganancias con diferencias.")
+    st.dataframe(diferencias, hide_index=True, width="stretch")
+    if st.button("Aplicar Corrección"):
+        registros = conciliacion.aplicar_correccion(mes_desde, anio_desde, mes_hasta, anio_hasta)
+        st.success(f"Corrección aplicada: {registros} ajustes agregados al libro de ganancias.")
+
+def _generar_exportacion(conjunto, formato, filtros):
+    # Se escribe por bloques en un archivo temporal, que se borra al cerrarse
+    destino = tempfile.TemporaryFile()
+    if formato == "csv":
+        texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+        exportacion.exportar(conjunto, formato, texto, **filtros)
+        texto.detach()
+    else:
+        exportacion.exportar(conjunto, formato, destino, **filtros)
+    destino.seek(0)
+    return destino
+
+def mostrar_exportacion():
+    """Permite descargar transferencias, historial de ediciones o ganancias filtrados en CSV o Parquet"""
+    st.subheader("Exportar Datos")
+    conjunto = st.selectbox("Datos:", exportacion.CONJUNTOS, format_func={
+        "transferencias": "Transferencias", "historial": "Historial de ediciones", "ganancias": "Ganancias por empleado"}.get)
+    formato = st.radio("Formato:", exportacion.FORMATOS, format_func=str.upper, horizontal=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        desde = st.date_input("Desde:", value=None, key="exportar_desde")
+        empleado_id = st.number_input("ID del empleado:", value=None, step=1, format="%d", key="exportar_empleado")
+    with col2:
+        hasta = st.date_input("Hasta:", value=None, key="exportar_hasta")
+        estado = None
+        if conjunto == "transferencias":
+            estado = st.selectbox("Estado:", ["Todos", "solicitada", "confirmada", "entregada"], key="exportar_estado")
+            estado = None if estado == "Todos" else estado
+    incluir_archivo = conjunto != "ganancias" and st.checkbox("Incluir datos archivados", key="exportar_archivo")
+    if desde and hasta and hasta < desde:
+        st.error("La fecha final debe ser posterior a la inicial.")
+        return
+
+    filtros = dict(desde=desde, hasta=hasta, estado=estado, empleado_id=empleado_id, incluir_archivo=incluir_archivo)
+    nombre = "_".join([conjunto] + [fecha.isoformat() for fecha in (desde, hasta) if fecha])
+    # El archivo se genera recién al pulsar el botón, sin detener la página
+    st.download_button(
+        "Descargar", lambda: _generar_exportacion(conjunto, formato, filtros),
+        file_name=f"{nombre}.{formato}",
+        mime="text/csv" if formato == "csv" else "application/vnd.apache.parquet",
+    )
+
+COLUMNAS_RENDIMIENTO = {
+    "categoria": "Categoría", "nombre": "Operación", "cantidad": "Ejecuciones", "filas": "Filas",
+    "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "p99_ms": "p99 (ms)", "max_ms": "Máx. (ms)", "total_ms": "Total (ms)",
+}
+
+def mostrar_rendimiento():
+    """Muestra los percentiles de latencia de consultas, escrituras y páginas, y las consultas lentas"""
+    import pandas as pd
+    st.subheader("Rendimiento")
+    st.caption(f"Mediciones del proceso desde su inicio; se registran como lentas las consultas de más de {metricas.UMBRAL_CONSULTA_LENTA_MS:g} ms.")
+    operaciones = metricas.resumen()
+    if not operaciones:
+        st.info("Todavía no hay mediciones.")
+        return
+
+    df = pd.DataFrame(operaciones, columns=list(COLUMNAS_RENDIMIENTO)).rename(columns=COLUMNAS_RENDIMIENTO)
+    categorias = st.multiselect("Categorías:", sorted(df["Categoría"].unique()), default=sorted(df["Categoría"].unique()))
+    df = df[df["Categoría"].isin(categorias)].sort_values("p95 (ms)", ascending=False)
+    st.dataframe(df, hide_index=True, width="stretch", column_config={
+        columna: st.column_config.NumberColumn(format="%.2f") for columna in ["p50 (ms)", "p95 (ms)", "p99 (ms)", "Máx. (ms)", "Total (ms)"]
+    })
+
+    lentas = metricas.consultas_lentas()
+    if lentas:
+        st.write(f"**Consultas lentas recientes ({len(lentas)})**")
+        for consulta in lentas:
+            with st.expander(f"{consulta['fecha']} · {consulta['ms']:.1f} ms · {consulta['filas']} filas"):
+                st.code(consulta["sql"], language="sql")
+                st.code(consulta["plan"], language="text")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Exportar JSON", metricas.a_json(), file_name="metricas.json", mime="application/json")
+    with col2:
+        st.download_button("Exportar Prometheus", metricas.a_prometheus(), file_name="metricas.prom", mime="text/plain")
+    with col3:
+        if st.button("Reiniciar Mediciones"):
+            metricas.reiniciar()
+            st.rerun()
+
+# Servir las métricas por HTTP si se configuró TRANSFERENCIAS_METRICAS_PUERTO, y
+# escribirlas en un archivo si se configuró TRANSFERENCIAS_METRICAS_ARCHIVO
+metricas.iniciar_servidor()
+metricas.iniciar_exportacion()
 
 # Crear las tablas al iniciar el programa
-crear_tablas()
+servicios.crear_tablas()
 
 # Verificar si hay empleados registrados
-if not hay_empleados_registrados():
+if not servicios.hay_empleados_registrados():
     registrar_primer_administrador()
     st.stop()  # Detener la ejecución hasta que se registre un admin
 
@@ -409,7 +590,7 @@ with st.sidebar:
         st.subheader("Iniciar Sesión")
         empleado_id_login = st.number_input("Ingrese su ID de empleado:", step=1, format="%d")
         if st.button("Iniciar Sesión"):
-            empleado = obtener_empleado_por_id(empleado_id_login)
+            empleado = servicios.obtener_empleado_por_id(empleado_id_login)
             if empleado:
                 st.session_state['empleado_id'] = empleado[0]
                 st.session_state['rol'] = empleado[2]
@@ -433,96 +614,124 @@ elif st.session_state['rol'] == 'administrador':
     st.subheader("Menú Administrador")
     opcion_admin = st.radio(
         "Seleccione una opción:",
-        ["Agregar Empleado", "Listar Empleados", "Listar Transferencias",
+        ["Agregar Empleado", "Listar Empleados", "Listar Transferencias", "Buscar Transferencias",
          "Mostrar Reporte de Ganancias", "Ver Historial de Ediciones",
-         "Mostrar Inventario Mensual"]
+         "Mostrar Inventario Mensual", "Conciliar Ganancias", "Exportar Datos", "Rendimiento"]
     )
-    if opcion_admin == "Agregar Empleado":
-        st.subheader("Agregar Nuevo Empleado")
-        id_empleado_nuevo = st.number_input("ID del empleado:", step=1, format="%d")
-        nombre_nuevo = st.text_input("Nombre del empleado:")
-        rol_nuevo = st.selectbox("Rol del empleado:", ["administrador", "registrador", "confirmador"])
-        porcentaje_nuevo = st.number_input("Porcentaje de ganancia (%):", min_value=0.0, max_value=100.0, step=0.01)
-        if st.button("Agregar"):
-            cursor.execute('SELECT id FROM empleados WHERE id = ?', (id_empleado_nuevo,))
-            existing_id = cursor.fetchone()
-            if existing_id:
-                st.error("Error: El ID ya existe. Por favor, elija un ID diferente.")
-            else:
-                agregar_empleado(id_empleado_nuevo, nombre_nuevo, rol_nuevo, porcentaje_nuevo)
-    elif opcion_admin == "Listar Empleados":
-        listar_empleados()
-    elif opcion_admin == "Listar Transferencias":
-        listar_transferencias(st.session_state['rol'])
-    elif opcion_admin == "Mostrar Reporte de Ganancias":
-        st.subheader("Reporte de Ganancias")
-        col1, col2 = st.columns(2)
-        with col1:
-            mes_reporte = st.number_input("Mes:", min_value=1, max_value=12, value=datetime.datetime.now().month)
-        with col2:
-            anio_reporte = st.number_input("Año:", min_value=2020, max_value=2100, value=datetime.datetime.now().year)
+    with metricas.medir('pagina', opcion_admin):
+        if opcion_admin == "Agregar Empleado":
+            st.subheader("Agregar Nuevo Empleado")
+            id_empleado_nuevo = st.number_input("ID del empleado:", step=1, format="%d")
+            nombre_nuevo = st.text_input("Nombre del empleado:")
+            rol_nuevo = st.selectbox("Rol del empleado:", ["administrador", "registrador", "confirmador"])
+            porcentaje_nuevo = st.number_input("Porcentaje de ganancia (%):", min_value=0.0, max_value=100.0, step=0.01)
+            if st.button("Agregar"):
+                existing_id = servicios.obtener_empleado_por_id(id_empleado_nuevo)
+                if existing_id:
+                    st.error("Error: El ID ya existe. Por favor, elija un ID diferente.")
+                else:
+                    agregar_empleado(id_empleado_nuevo, nombre_nuevo, rol_nuevo, porcentaje_nuevo)
+        elif opcion_admin == "Listar Empleados":
+            listar_empleados()
+        elif opcion_admin == "Listar Transferencias":
+            listar_transferencias(st.session_state['rol'])
+        elif opcion_admin == "Buscar Transferencias":
+            buscar_transferencias(st.session_state['rol'])
+        elif opcion_admin == "Mostrar Reporte de Ganancias":
+            st.subheader("Reporte de Ganancias")
+            periodo_reporte = st.radio("Período:", ["Mes", "Trimestre", "Año", "Rango de meses"], horizontal=True)
+            hoy = datetime.datetime.now()
+            col1, col2 = st.columns(2)
+            with col1:
+                if periodo_reporte == "Mes":
+                    mes_reporte = st.number_input("Mes:", min_value=1, max_value=12, value=hoy.month)
+                elif periodo_reporte == "Trimestre":
+                    trimestre_reporte = st.number_input("Trimestre:", min_value=1, max_value=4, value=(hoy.month - 1) // 3 + 1)
+                elif periodo_reporte == "Rango de meses":
+                    mes_reporte = st.number_input("Desde el mes:", min_value=1, max_value=12, value=1)
+                    mes_hasta_reporte = st.number_input("Hasta el mes:", min_value=1, max_value=12, value=hoy.month)
+            with col2:
+                anio_reporte = st.number_input("Año:", min_value=2020, max_value=2100, value=hoy.year)
+                if periodo_reporte == "Rango de meses":
+                    anio_hasta_reporte = st.number_input("Hasta el año:", min_value=2020, max_value=2100, value=hoy.year)
         
-        if st.button("Generar Reporte"):
-            mostrar_reporte_ganancias(mes_reporte, anio_reporte)
-    elif opcion_admin == "Ver Historial de Ediciones":
-        transferencia_id_historial = st.number_input("Ingrese el ID de la transferencia para ver su historial de ediciones:", step=1, format="%d")
-        mostrar_historial_ediciones(transferencia_id_historial)
-    elif opcion_admin == "Mostrar Inventario Mensual":
-        mes = st.number_input("Ingrese el mes para el inventario (1-12):", min_value=1, max_value=12, step=1)
-        anio = st.number_input("Ingrese el año para el inventario:", step=1, format="%d")
-        mostrar_inventario_mensual(mes, anio)
+            consolidado = elegir_alcance("alcance_reporte")
+        
+            if st.button("Generar Reporte"):
+                if periodo_reporte == "Mes":
+                    mostrar_reporte_ganancias(mes_reporte, anio_reporte, consolidado=consolidado)
+                elif periodo_reporte == "Trimestre":
+                    mes_inicio = (trimestre_reporte - 1) * 3 + 1
+                    mostrar_reporte_ganancias(mes_inicio, anio_reporte, mes_inicio + 2, anio_reporte, consolidado=consolidado)
+                elif periodo_reporte == "Año":
+                    mostrar_reporte_ganancias(1, anio_reporte, 12, anio_reporte, "Trimestre", consolidado=consolidado)
+                elif (anio_hasta_reporte, mes_hasta_reporte) < (anio_reporte, mes_reporte):
+                    st.error("El final del rango debe ser posterior a su inicio.")
+                else:
+                    mostrar_reporte_ganancias(mes_reporte, anio_reporte, mes_hasta_reporte, anio_hasta_reporte,
+                                              consolidado=consolidado)
+        elif opcion_admin == "Ver Historial de Ediciones":
+            transferencia_id_historial = st.number_input("Ingrese el ID de la transferencia para ver su historial de ediciones:", step=1, format="%d")
+            mostrar_historial_ediciones(transferencia_id_historial)
+        elif opcion_admin == "Mostrar Inventario Mensual":
+            mes = st.number_input("Ingrese el mes para el inventario (1-12):", min_value=1, max_value=12, step=1)
+            anio = st.number_input("Ingrese el año para el inventario:", step=1, format="%d")
+            mostrar_inventario_mensual(mes, anio, elegir_alcance("alcance_inventario"))
+        elif opcion_admin == "Conciliar Ganancias":
+            mostrar_conciliacion_ganancias()
+        elif opcion_admin == "Exportar Datos":
+            mostrar_exportacion()
+        elif opcion_admin == "Rendimiento":
+            mostrar_rendimiento()
 
 elif st.session_state['rol'] == 'registrador':
     st.subheader("Menú Registrador")
     opcion_registrador = st.radio(
         "Seleccione una opción:",
-        ["Registrar Transferencia", "Editar Transferencia", "Listar Mis Transferencias", "Ver Historial de Ediciones"]
+        ["Registrar Transferencia", "Importar Transferencias", "Editar Transferencia", "Listar Mis Transferencias", "Buscar Transferencias", "Ver Historial de Ediciones"]
     )
-    if opcion_registrador == "Registrar Transferencia":
-        st.subheader("Registrar Nueva Transferencia")
-        remitente_nombre = st.text_input("Nombre del remitente:")
-        destinatario_nombre = st.text_input("Nombre del destinatario:")
-        destinatario_telefono = st.text_input("Teléfono del destinatario:")
-        capital = st.number_input("Capital enviado:", min_value=0.01)
-        if st.button("Registrar"):
-            # Validar que los campos requeridos no estén vacíos
-            if not remitente_nombre:
-                st.error("Por favor, ingrese el nombre del remitente.")
-            elif not destinatario_nombre:
-                st.error("Por favor, ingrese el nombre del destinatario.")
-            elif not destinatario_telefono:
-                st.error("Por favor, ingrese el teléfono del destinatario.")
-            elif capital <= 0:
-                st.error("Por favor, ingrese un monto válido mayor que cero.")
-            else:
-                registrar_transferencia(st.session_state['empleado_id'], remitente_nombre, destinatario_nombre, destinatario_telefono, capital)
-    elif opcion_registrador == "Editar Transferencia":
-        st.subheader("Editar Transferencia")
-        transferencia_id_editar = st.number_input("Ingrese el ID de la transferencia a editar:", step=1, format="%d")
-        campo_editar = st.selectbox("Campo a editar:", ['remitente_nombre', 'destinatario_nombre', 'destinatario_telefono', 'capital'])
-        nuevo_valor = st.text_input(f"Ingrese el nuevo valor para {campo_editar}:")
-        if st.button("Editar"):
-            editar_transferencia(transferencia_id_editar, st.session_state['empleado_id'], campo_editar, nuevo_valor)
-    elif opcion_registrador == "Listar Mis Transferencias":
-        listar_transferencias(st.session_state['rol'], st.session_state['empleado_id'])
-    elif opcion_registrador == "Ver Historial de Ediciones":
-        transferencia_id_historial = st.number_input("Ingrese el ID de la transferencia para ver su historial de ediciones:", step=1, format="%d")
-        mostrar_historial_ediciones(transferencia_id_historial)
+    with metricas.medir('pagina', opcion_registrador):
+        if opcion_registrador == "Registrar Transferencia":
+            st.subheader("Registrar Nueva Transferencia")
+            remitente_nombre = st.text_input("Nombre del remitente:")
+            destinatario_nombre = st.text_input("Nombre del destinatario:")
+            destinatario_telefono = st.text_input("Teléfono del destinatario:")
+            capital = st.number_input("Capital enviado:", min_value=0.01)
+            if st.button("Registrar"):
+                # Validar que los campos requeridos no estén vacíos
+                error = importacion.validar_transferencia(remitente_nombre, destinatario_nombre, destinatario_telefono, capital)
+                if error:
+                    st.error(error)
+                else:
+                    registrar_transferencia(st.session_state['empleado_id'], remitente_nombre, destinatario_nombre, destinatario_telefono, capital)
+        elif opcion_registrador == "Importar Transferencias":
+            importar_transferencias_desde_archivo(st.session_state['empleado_id'])
+        elif opcion_registrador == "Editar Transferencia":
+            editar_transferencias(st.session_state['empleado_id'])
+        elif opcion_registrador == "Listar Mis Transferencias":
+            listar_transferencias(st.session_state['rol'], st.session_state['empleado_id'])
+        elif opcion_registrador == "Buscar Transferencias":
+            buscar_transferencias(st.session_state['rol'], st.session_state['empleado_id'])
+        elif opcion_registrador == "Ver Historial de Ediciones":
+            transferencia_id_historial = st.number_input("Ingrese el ID de la transferencia para ver su historial de ediciones:", step=1, format="%d")
+            mostrar_historial_ediciones(transferencia_id_historial)
 
 elif st.session_state['rol'] == 'confirmador':
     st.subheader("Menú Confirmador")
     opcion_confirmador = st.radio(
         "Seleccione una opción:",
-        ["Listar Transferencias Pendientes", "Confirmar Transferencia Entregada"]
+        ["Listar Transferencias Pendientes", "Buscar Transferencias", "Confirmar Transferencia Entregada", "Confirmar Entregas en Lote"]
     )
-    if opcion_confirmador == "Listar Transferencias Pendientes":
-        listar_transferencias(st.session_state['rol'], st.session_state['empleado_id'])
-    elif opcion_confirmador == "Confirmar Transferencia Entregada":
-        st.subheader("Confirmar Entrega de Transferencia")
-        listar_transferencias(st.session_state['rol'], st.session_state['empleado_id']) # Mostrar las transferencias pendientes
-        transferencia_id_confirmar = st.number_input("ID de la transferencia a confirmar como entregada:", step=1, format="%d")
-        if st.button("Confirmar Entrega"):
-            confirmar_transferencia_entregada(transferencia_id_confirmar, st.session_state['empleado_id'])
-
-# Cerrar la conexión a la base de datos al finalizar (Streamlit maneja el ciclo de vida de la app, pero es buena práctica)
-conn.close()
+    with metricas.medir('pagina', opcion_confirmador):
+        if opcion_confirmador == "Listar Transferencias Pendientes":
+            cola_pendientes_en_vivo()
+        elif opcion_confirmador == "Buscar Transferencias":
+            buscar_transferencias(st.session_state['rol'], st.session_state['empleado_id'])
+        elif opcion_confirmador == "Confirmar Transferencia Entregada":
+            st.subheader("Confirmar Entrega de Transferencia")
+            listar_transferencias(st.session_state['rol'], st.session_state['empleado_id']) # Mostrar las transferencias pendientes
+            transferencia_id_confirmar = st.number_input("ID de la transferencia a confirmar como entregada:", step=1, format="%d")
+            if st.button("Confirmar Entrega"):
+                confirmar_transferencia_entregada(transferencia_id_confirmar, st.session_state['empleado_id'])
+        elif opcion_confirmador == "Confirmar Entregas en Lote":
+            confirmar_entregas_en_lote(st.session_state['empleado_id'])
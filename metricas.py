@@ -0,0 +1,266 @@
+"""
+Métricas de rendimiento del proceso.
+
+Guarda las duraciones recientes de cada operación medida (consultas SQL, escrituras
+y páginas de la interfaz) y calcula sus percentiles. Las consultas que superan el
+umbral se registran en el log 'transferencias.lentas' junto con su plan de ejecución.
+
+Las métricas se pueden exportar en formato de texto de Prometheus o como JSON, y
+servir por HTTP en un puerto local si se define TRANSFERENCIAS_METRICAS_PUERTO:
+
+    curl http://127.0.0.1:9464/metrics
+    curl http://127.0.0.1:9464/metrics.json
+
+Si se define TRANSFERENCIAS_METRICAS_ARCHIVO, el JSON se escribe además en ese
+archivo cada TRANSFERENCIAS_METRICAS_INTERVALO segundos y al terminar el proceso.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Milisegundos a partir de los cuales una consulta se registra como lenta
+UMBRAL_CONSULTA_LENTA_MS = float(os.environ.get('TRANSFERENCIAS_CONSULTA_LENTA_MS', '200'))
+
+# Archivo donde se escribe el log de consultas lentas (además del logging configurado)
+ARCHIVO_CONSULTAS_LENTAS = os.environ.get('TRANSFERENCIAS_LOG_LENTAS')
+
+# Puerto local del endpoint de métricas (sin definir, no se sirve)
+PUERTO_METRICAS = os.environ.get('TRANSFERENCIAS_METRICAS_PUERTO')
+
+# Archivo donde se vuelcan las métricas en JSON (sin definir, no se escribe)
+ARCHIVO_METRICAS = os.environ.get('TRANSFERENCIAS_METRICAS_ARCHIVO')
+
+# Segundos entre dos escrituras del archivo de métricas
+INTERVALO_EXPORTACION = float(os.environ.get('TRANSFERENCIAS_METRICAS_INTERVALO', '60'))
+
+# Duraciones recientes que se conservan por operación para calcular percentiles
+MUESTRAS_POR_OPERACION = 2048
+
+# Consultas lentas recientes que se conservan para el panel de rendimiento
+MAXIMO_CONSULTAS_LENTAS = 100
+
+PERCENTILES = (50, 95, 99)
+
+log_lentas = logging.getLogger('transferencias.lentas')
+if ARCHIVO_CONSULTAS_LENTAS:
+    _manejador = logging.FileHandler(ARCHIVO_CONSULTAS_LENTAS, encoding='utf-8')
+    _manejador.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    log_lentas.addHandler(_manejador)
+    log_lentas.setLevel(logging.WARNING)
+
+
+class _Serie:
+    __slots__ = ('cantidad', 'total', 'maximo', 'filas', 'muestras')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.filas = 0
+        self.muestras = deque(maxlen=MUESTRAS_POR_OPERACION)
+
+
+_series = {}
+_lentas = deque(maxlen=MAXIMO_CONSULTAS_LENTAS)
+_lock = threading.Lock()
+_servidor = None
+_exportador = None
+
+
+def registrar(categoria, nombre, segundos, filas=0):
+    """Suma una medición de la operación (categoria, nombre)"""
+    with _lock:
+        serie = _series.get((categoria, nombre))
+        if serie is None:
+            serie = _series[(categoria, nombre)] = _Serie()
+        serie.cantidad += 1
+        serie.total += segundos
+        serie.filas += filas
+        if segundos > serie.maximo:
+            serie.maximo = segundos
+        serie.muestras.append(segundos)
+
+
+def registrar_consulta_lenta(sql, segundos, filas, plan):
+    """Guarda y envía al log una consulta que superó el umbral"""
+    with _lock:
+        _lentas.append({
+            "fecha": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "sql": sql,
+            "ms": segundos * 1000,
+            "filas": filas,
+            "plan": plan,
+        })
+    log_lentas.warning("Consulta lenta (%.1f ms, %d filas): %s\n%s", segundos * 1000, filas, sql, plan)
+
+
+@contextmanager
+def medir(categoria, nombre):
+    """Mide la duración del bloque como una ejecución de la operación (categoria, nombre)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(categoria, nombre, time.perf_counter() - inicio)
+
+
+def _percentil(ordenadas, percentil):
+    # Método del rango más cercano
+    indice = max(0, -(-len(ordenadas) * percentil // 100) - 1)
+    return ordenadas[int(indice)]
+
+
+def resumen():
+    """
+    Devuelve una lista de diccionarios, uno por operación, con 'categoria', 'nombre',
+    'cantidad', 'filas', 'total_ms', 'max_ms' y los percentiles 'p50_ms', 'p95_ms' y
+    'p99_ms' de las duraciones recientes.
+    """
+    with _lock:
+        copia = [(clave, serie.cantidad, serie.total, serie.maximo, serie.filas, sorted(serie.muestras))
+                 for clave, serie in _series.items()]
+    operaciones = []
+    for (categoria, nombre), cantidad, total, maximo, filas, ordenadas in sorted(copia):
+        operacion = {
+            "categoria": categoria,
+            "nombre": nombre,
+            "cantidad": cantidad,
+            "filas": filas,
+            "total_ms": total * 1000,
+            "max_ms": maximo * 1000,
+        }
+        for percentil in PERCENTILES:
+            operacion[f"p{percentil}_ms"] = _percentil(ordenadas, percentil) * 1000
+        operaciones.append(operacion)
+    return operaciones
+
+
+def consultas_lentas():
+    """Devuelve las consultas lentas recientes, de la más nueva a la más vieja"""
+    with _lock:
+        return list(reversed(_lentas))
+
+
+def reiniciar():
+    """Descarta todas las mediciones"""
+    with _lock:
+        _series.clear()
+        _lentas.clear()
+
+
+def _etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def a_prometheus():
+    """Devuelve las métricas en el formato de texto de Prometheus"""
+    lineas = [
+        "# HELP transferencias_duracion_segundos Duración de las operaciones medidas.",
+        "# TYPE transferencias_duracion_segundos summary",
+    ]
+    filas = [
+        "# HELP transferencias_filas_total Filas leídas o escritas por las consultas.",
+        "# TYPE transferencias_filas_total counter",
+    ]
+    for operacion in resumen():
+        etiquetas = f'categoria="{_etiqueta(operacion["categoria"])}",nombre="{_etiqueta(operacion["nombre"])}"'
+        for percentil in PERCENTILES:
+            lineas.append(f'transferencias_duracion_segundos{{{etiquetas},quantile="{percentil / 100}"}} '
+                          f'{operacion[f"p{percentil}_ms"] / 1000:.6f}')
+        lineas.append(f'transferencias_duracion_segundos_sum{{{etiquetas}}} {operacion["total_ms"] / 1000:.6f}')
+        lineas.append(f'transferencias_duracion_segundos_count{{{etiquetas}}} {operacion["cantidad"]}')
+        if operacion["categoria"] == "consulta":
+            filas.append(f'transferencias_filas_total{{{etiquetas}}} {operacion["filas"]}')
+    return "\n".join(lineas + filas) + "\n"
+
+
+def a_json():
+    """Devuelve las operaciones y las consultas lentas recientes como texto JSON"""
+    return json.dumps({"operaciones": resumen(), "consultas_lentas": consultas_lentas()}, ensure_ascii=False, indent=2)
+
+
+def exportar_json(ruta):
+    """Escribe a_json() en el archivo indicado; quien lo lee nunca ve un archivo a medio escribir"""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix='.metricas-', suffix='.json')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+            archivo.write(a_json())
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def _exportar_periodicamente(ruta, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            exportar_json(ruta)
+        except OSError as error:
+            logging.getLogger('transferencias.metricas').warning("No se pudo escribir %s: %s", ruta, error)
+
+
+def iniciar_exportacion(ruta=ARCHIVO_METRICAS, intervalo=INTERVALO_EXPORTACION):
+    """
+    Escribe las métricas en JSON en el archivo indicado cada intervalo segundos, en un
+    hilo de fondo, y una última vez al terminar el proceso.
+
+    Igual que iniciar_servidor, no hace nada si no hay archivo configurado o si la
+    exportación ya está corriendo.
+    """
+    global _exportador
+    if not ruta:
+        return None
+    with _lock:
+        if _exportador is None:
+            _exportador = threading.Thread(target=_exportar_periodicamente, args=(ruta, intervalo),
+                                           name='metricas-archivo', daemon=True)
+            _exportador.start()
+            atexit.register(exportar_json, ruta)
+        return _exportador
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            cuerpo, tipo = a_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            cuerpo, tipo = a_json(), 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        datos = cuerpo.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_servidor(puerto=PUERTO_METRICAS, host='127.0.0.1'):
+    """
+    Sirve /metrics (Prometheus) y /metrics.json en un hilo de fondo.
+
+    No hace nada si no hay puerto configurado o si el servidor ya está corriendo, por
+    lo que puede llamarse en cada rerun de Streamlit.
+    """
+    global _servidor
+    if not puerto:
+        return None
+    with _lock:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer((host, int(puerto)), _Manejador)
+            _servidor.daemon_threads = True
+            threading.Thread(target=_servidor.serve_forever, name='metricas-http', daemon=True).start()
+        return _servidor
@@ -0,0 +1,436 @@
+"""
+Migraciones del esquema de la base de datos.
+
+La versión del esquema se guarda en PRAGMA user_version. Cada migración es una
+función que recibe un cursor y lleva el esquema de una versión a la siguiente;
+migrar() aplica las pendientes en orden, en una sola transacción, y lo hace una
+vez por proceso y base de datos: los reruns de Streamlit no vuelven a tocar el
+esquema ni a tomar el bloqueo de escritura.
+
+Para cambiar el esquema se agrega una función al final de MIGRACIONES; las que
+ya se aplicaron en alguna base no se modifican. Por eso cada migración lleva su
+propio SQL, tal como era en su versión, y no llama a las funciones de los módulos,
+que pueden cambiar después.
+
+    python migraciones.py            # aplica las migraciones pendientes
+    python migraciones.py --estado   # muestra la versión del esquema
+"""
+import argparse
+import sys
+import threading
+
+import db
+
+# Valores de los módulos tal como eran en la versión de cada migración
+PORCENTAJE_GANANCIA_GENERAL_V1 = 0.10
+SEPARADORES_TELEFONO_V1 = (' ', '-', '(', ')', '+', '.', '/')
+CORTE_CADA_V3 = 10000
+
+
+def _esquema_inicial(cursor):
+    """Tablas, índices y tablas auxiliares de los módulos; no falla si ya existen"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS empleados (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            rol TEXT NOT NULL CHECK (rol IN ('administrador', 'registrador', 'confirmador')),
+            porcentaje_ganancia REAL NOT NULL DEFAULT 0.0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transferencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_solicitud TEXT NOT NULL,
+            remitente_nombre TEXT NOT NULL,
+            destinatario_nombre TEXT NOT NULL,
+            destinatario_telefono TEXT NOT NULL,
+            capital REAL NOT NULL,
+            fecha_confirmacion TEXT,
+            confirmador_id INTEGER,
+            registrador_id INTEGER NOT NULL,
+            estado TEXT NOT NULL CHECK (estado IN ('solicitada', 'confirmada', 'entregada')),
+            FOREIGN KEY (registrador_id) REFERENCES empleados (id),
+            FOREIGN KEY (confirmador_id) REFERENCES empleados (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historial_ediciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transferencia_id INTEGER NOT NULL,
+            fecha_edicion TEXT NOT NULL,
+            empleado_editor_id INTEGER NOT NULL,
+            campo_editado TEXT NOT NULL,
+            valor_anterior TEXT,
+            valor_nuevo TEXT,
+            FOREIGN KEY (transferencia_id) REFERENCES transferencias (id),
+            FOREIGN KEY (empleado_editor_id) REFERENCES empleados (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ganancias_globales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            empleado_id INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            anio INTEGER NOT NULL,
+            ganancia_general REAL NOT NULL,
+            ganancia_personalizada REAL NOT NULL,
+            total_ganancia REAL NOT NULL,
+            FOREIGN KEY (empleado_id) REFERENCES empleados (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versiones_datos (
+            tabla TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+    _crear_indices(cursor)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archivo_meses (
+            anio INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            archivo TEXT NOT NULL,
+            cantidad_transferencias INTEGER NOT NULL DEFAULT 0,
+            capital_entregado REAL NOT NULL DEFAULT 0.0,
+            id_desde INTEGER,
+            id_hasta INTEGER,
+            confirmacion_desde TEXT,
+            confirmacion_hasta TEXT,
+            fecha_archivo TEXT NOT NULL,
+            PRIMARY KEY (anio, mes)
+        )
+    ''')
+    _inventario_mensual(cursor)
+    _indice_busqueda(cursor)
+
+
+def _marcar(cursor, tabla):
+    cursor.execute('''
+        INSERT INTO versiones_datos (tabla, version) VALUES (?, 1)
+        ON CONFLICT (tabla) DO UPDATE SET version = version + 1
+    ''', (tabla,))
+
+
+def _existe(cursor, tipo, nombre):
+    cursor.execute('SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?', (tipo, nombre))
+    return cursor.fetchone() is not None
+
+
+def _inventario_mensual(cursor):
+    # Si la tabla es nueva se llena con las entregadas, incluidas las ya archivadas
+    existia = _existe(cursor, 'table', 'inventario_mensual')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventario_mensual (
+            anio INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            capital_entregado REAL NOT NULL DEFAULT 0.0,
+            cantidad_transferencias INTEGER NOT NULL DEFAULT 0,
+            ganancia_general REAL NOT NULL DEFAULT 0.0,
+            PRIMARY KEY (anio, mes)
+        )
+    ''')
+    if existia:
+        return
+    cursor.execute('''
+        INSERT INTO inventario_mensual (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER), CAST(strftime('%m', fecha_solicitud) AS INTEGER),
+               SUM(capital), COUNT(*), SUM(capital) * ?
+        FROM transferencias
+        WHERE estado = 'entregada'
+        GROUP BY 1, 2
+    ''', (PORCENTAJE_GANANCIA_GENERAL_V1,))
+    cursor.execute('''
+        INSERT INTO inventario_mensual (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        SELECT anio, mes, capital_entregado, cantidad_transferencias, capital_entregado * ?
+        FROM archivo_meses
+        WHERE cantidad_transferencias > 0
+        ON CONFLICT (anio, mes) DO UPDATE SET
+            capital_entregado = capital_entregado + excluded.capital_entregado,
+            cantidad_transferencias = cantidad_transferencias + excluded.cantidad_transferencias,
+            ganancia_general = ganancia_general + excluded.ganancia_general
+    ''', (PORCENTAJE_GANANCIA_GENERAL_V1,))
+    _marcar(cursor, 'inventario_mensual')
+
+
+def _digitos_v1(columna):
+    expresion = columna
+    for separador in SEPARADORES_TELEFONO_V1:
+        expresion = f"replace({expresion}, '{separador}', '')"
+    return expresion
+
+
+def _indice_busqueda(cursor):
+    # Si el índice es nuevo se llena con las transferencias existentes
+    existia = _existe(cursor, 'table', 'transferencias_fts')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transferencias_fts USING fts5 (
+            remitente_nombre, destinatario_nombre, telefono,
+            content = '', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_alta AFTER INSERT ON transferencias BEGIN
+            INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES (new.id, new.remitente_nombre, new.destinatario_nombre, {_digitos_v1('new.destinatario_telefono')});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_baja AFTER DELETE ON transferencias BEGIN
+            INSERT INTO transferencias_fts (transferencias_fts, rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES ('delete', old.id, old.remitente_nombre, old.destinatario_nombre, {_digitos_v1('old.destinatario_telefono')});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS transferencias_fts_edicion
+        AFTER UPDATE OF remitente_nombre, destinatario_nombre, destinatario_telefono ON transferencias BEGIN
+            INSERT INTO transferencias_fts (transferencias_fts, rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES ('delete', old.id, old.remitente_nombre, old.destinatario_nombre, {_digitos_v1('old.destinatario_telefono')});
+            INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+            VALUES (new.id, new.remitente_nombre, new.destinatario_nombre, {_digitos_v1('new.destinatario_telefono')});
+        END
+    ''')
+    if not existia:
+        cursor.execute(f'''
+            INSERT INTO transferencias_fts (rowid, remitente_nombre, destinatario_nombre, telefono)
+            SELECT id, remitente_nombre, destinatario_nombre, {_digitos_v1('destinatario_telefono')}
+            FROM transferencias
+        ''')
+
+
+def _crear_indices(cursor):
+    # Índices para los filtros y ordenamientos habituales sobre transferencias
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transferencias_estado ON transferencias (estado, fecha_solicitud)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transferencias_fecha ON transferencias (fecha_solicitud)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transferencias_registrador ON transferencias (registrador_id, fecha_solicitud)')
+
+    # Un único registro de ganancias por empleado y mes; se consolidan los duplicados
+    # que pudieran existir antes de crear la restricción
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_ganancias_empleado_periodo'")
+    if cursor.fetchone():
+        return
+    cursor.execute('''
+        UPDATE ganancias_globales
+        SET ganancia_general = d.ganancia_general,
+            ganancia_personalizada = d.ganancia_personalizada,
+            total_ganancia = d.total_ganancia
+        FROM (
+            SELECT MIN(id) AS id, SUM(ganancia_general) AS ganancia_general,
+                   SUM(ganancia_personalizada) AS ganancia_personalizada,
+                   SUM(total_ganancia) AS total_ganancia
+            FROM ganancias_globales
+            GROUP BY empleado_id, mes, anio
+            HAVING COUNT(*) > 1
+        ) AS d
+        WHERE ganancias_globales.id = d.id
+    ''')
+    cursor.execute('''
+        DELETE FROM ganancias_globales
+        WHERE id NOT IN (SELECT MIN(id) FROM ganancias_globales GROUP BY empleado_id, mes, anio)
+    ''')
+    _marcar(cursor, 'ganancias_globales')
+    cursor.execute('CREATE UNIQUE INDEX ux_ganancias_empleado_periodo ON ganancias_globales (empleado_id, mes, anio)')
+
+
+def _indice_historial(cursor):
+    """Índice para leer el historial de una transferencia sin recorrer toda la tabla"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_historial_transferencia
+        ON historial_ediciones (transferencia_id, fecha_edicion)
+    ''')
+
+
+# Movimientos de la historia al crear el libro: uno para el registrador, otro para el
+# confirmador y otro para el administrador de cada transferencia entregada, con los
+# porcentajes del momento y asentados en su fecha de confirmación. Lo que
+# ganancias_globales tiene de más o de menos respecto de ellos (archivadas, porcentajes
+# que cambiaron) entra como un ajuste por empleado y mes, asentado al comienzo del mes
+SQL_HISTORIA_LIBRO_V3 = '''
+    WITH entregadas AS (
+        SELECT id, COALESCE(fecha_confirmacion, fecha_solicitud) AS fecha_confirmacion,
+               capital * :porcentaje_general AS ganancia_general, registrador_id, confirmador_id
+        FROM transferencias WHERE estado = 'entregada'
+    ),
+    administrador AS (
+        SELECT id, porcentaje_ganancia FROM empleados WHERE rol = 'administrador' ORDER BY id LIMIT 1
+    ),
+    beneficiarios AS (
+        SELECT t.id, t.fecha_confirmacion, t.registrador_id AS empleado_id, 'registrador' AS concepto,
+               t.ganancia_general, t.ganancia_general * (COALESCE(e.porcentaje_ganancia, 0) / 100.0) AS ganancia
+        FROM entregadas t LEFT JOIN empleados e ON e.id = t.registrador_id
+        UNION ALL
+        SELECT t.id, t.fecha_confirmacion, t.confirmador_id, 'confirmador', t.ganancia_general,
+               t.ganancia_general * (COALESCE(e.porcentaje_ganancia, 0) / 100.0)
+        FROM entregadas t LEFT JOIN empleados e ON e.id = t.confirmador_id
+        UNION ALL
+        SELECT t.id, t.fecha_confirmacion, a.id, 'administrador', t.ganancia_general,
+               t.ganancia_general * (a.porcentaje_ganancia / 100.0)
+        FROM entregadas t CROSS JOIN administrador a
+    ),
+    movimientos AS (
+        SELECT fecha_confirmacion AS fecha,
+               CAST(strftime('%Y', fecha_confirmacion) AS INTEGER) AS anio,
+               CAST(strftime('%m', fecha_confirmacion) AS INTEGER) AS mes,
+               empleado_id, id AS transferencia_id, concepto, ganancia_general, ganancia
+        FROM beneficiarios
+        WHERE empleado_id IS NOT NULL
+        UNION ALL
+        SELECT printf('%04d-%02d-01 00:00:00', anio, mes), anio, mes, empleado_id, NULL, 'ajuste',
+               SUM(ganancia_general), SUM(ganancia)
+        FROM (
+            SELECT empleado_id, anio, mes, ganancia_general, ganancia_personalizada AS ganancia
+            FROM ganancias_globales
+            UNION ALL
+            SELECT empleado_id, CAST(strftime('%Y', fecha_confirmacion) AS INTEGER),
+                   CAST(strftime('%m', fecha_confirmacion) AS INTEGER), -ganancia_general, -ganancia
+            FROM beneficiarios
+            WHERE empleado_id IS NOT NULL
+        )
+        GROUP BY empleado_id, anio, mes
+        HAVING ABS(SUM(ganancia_general)) > :tolerancia OR ABS(SUM(ganancia)) > :tolerancia
+    )
+    INSERT INTO movimientos_ganancias
+    (fecha, anio, mes, empleado_id, transferencia_id, concepto, ganancia_general, ganancia_personalizada)
+    SELECT fecha, anio, mes, empleado_id, transferencia_id, concepto, ganancia_general, ganancia
+    FROM movimientos
+    ORDER BY fecha, transferencia_id
+'''
+
+
+def _libro_ganancias(cursor):
+    """Libro de movimientos de ganancias y sus cortes, cargados con la historia existente"""
+    existia = _existe(cursor, 'table', 'movimientos_ganancias')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movimientos_ganancias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT NOT NULL,
+            anio INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            empleado_id INTEGER NOT NULL,
+            transferencia_id INTEGER,
+            concepto TEXT NOT NULL CHECK (concepto IN ('registrador', 'confirmador', 'administrador', 'ajuste')),
+            ganancia_general REAL NOT NULL,
+            ganancia_personalizada REAL NOT NULL,
+            FOREIGN KEY (empleado_id) REFERENCES empleados (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_empleado ON movimientos_ganancias (empleado_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos_ganancias (fecha)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_transferencia ON movimientos_ganancias (transferencia_id)')
+    for operacion in ('UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS movimientos_ganancias_sin_{operacion.lower()}
+            BEFORE {operacion} ON movimientos_ganancias
+            BEGIN
+                SELECT RAISE(ABORT, 'El libro de ganancias solo admite movimientos nuevos');
+            END
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cortes_ganancias (
+            empleado_id INTEGER NOT NULL,
+            movimiento_hasta INTEGER NOT NULL,
+            fecha_corte TEXT NOT NULL,
+            ganancia_general REAL NOT NULL,
+            ganancia_personalizada REAL NOT NULL,
+            PRIMARY KEY (empleado_id, movimiento_hasta)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cortes_fecha ON cortes_ganancias (fecha_corte, movimiento_hasta)')
+    if existia:
+        return
+
+    cursor.execute(SQL_HISTORIA_LIBRO_V3, {'porcentaje_general': PORCENTAJE_GANANCIA_GENERAL_V1, 'tolerancia': 0.005})
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM movimientos_ganancias')
+    hasta = cursor.fetchone()[0]
+    # Un corte cada CORTE_CADA_V3 movimientos con la fecha de su último movimiento, y
+    # uno final con la fecha actual
+    limites = list(range(CORTE_CADA_V3, hasta, CORTE_CADA_V3))
+    previo = 0
+    for limite in [*limites, hasta] if hasta else []:
+        cursor.execute('''
+            INSERT INTO cortes_ganancias (empleado_id, movimiento_hasta, fecha_corte, ganancia_general, ganancia_personalizada)
+            SELECT empleado_id, :hasta,
+                   CASE WHEN :hasta = :ultimo THEN datetime('now', 'localtime')
+                        ELSE (SELECT fecha FROM movimientos_ganancias WHERE id = :hasta) END,
+                   SUM(ganancia_general), SUM(ganancia_personalizada)
+            FROM (
+                SELECT empleado_id, ganancia_general, ganancia_personalizada
+                FROM cortes_ganancias
+                WHERE movimiento_hasta = :previo
+                UNION ALL
+                SELECT empleado_id, ganancia_general, ganancia_personalizada
+                FROM movimientos_ganancias NOT INDEXED
+                WHERE id > :previo AND id <= :hasta
+            )
+            GROUP BY empleado_id
+        ''', {'hasta': limite, 'previo': previo, 'ultimo': hasta})
+        previo = limite
+    _marcar(cursor, 'movimientos_ganancias')
+
+
+# Migraciones en orden: la de la posición i lleva el esquema a la versión i + 1
+MIGRACIONES = [
+    _esquema_inicial,
+    _indice_historial,
+    _libro_ganancias,
+]
+
+_migradas = set()
+_lock = threading.Lock()
+
+
+def version_esquema(cursor):
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+
+def migrar():
+    """
+    Aplica las migraciones pendientes de la base configurada en db.
+
+    Returns:
+        La cantidad de migraciones aplicadas (0 si el esquema ya estaba al día).
+
+    Raises:
+        RuntimeError: Si la base tiene un esquema más nuevo que esta versión del programa.
+    """
+    ruta = db.pool.ruta
+    if ruta in _migradas:
+        return 0
+    with _lock:
+        if ruta in _migradas:
+            return 0
+        with db.lectura() as cursor:
+            actual = version_esquema(cursor)
+        aplicadas = 0
+        if actual < len(MIGRACIONES):
+            with db.transaccion() as cursor:
+                # Otro proceso pudo haber migrado mientras se esperaba el bloqueo
+                actual = version_esquema(cursor)
+                for migracion in MIGRACIONES[actual:]:
+                    migracion(cursor)
+                    aplicadas += 1
+                cursor.execute(f'PRAGMA user_version = {len(MIGRACIONES)}')
+        elif actual > len(MIGRACIONES):
+            raise RuntimeError(f"La base de datos tiene el esquema {actual}, más nuevo que el "
+                               f"{len(MIGRACIONES)} que conoce esta versión del programa.")
+        _migradas.add(ruta)
+        return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la base de datos.")
+    parser.add_argument('--estado', action='store_true', help="Muestra la versión del esquema sin migrar")
+    args = parser.parse_args(argv)
+
+    if args.estado:
+        with db.lectura() as cursor:
+            actual = version_esquema(cursor)
+        print(f"Esquema en la versión {actual} de {len(MIGRACIONES)}.")
+        return 0
+    aplicadas = migrar()
+    print(f"Migraciones aplicadas: {aplicadas}. Esquema en la versión {len(MIGRACIONES)}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Motor de reportes de ganancias para períodos de varios meses.
+
+Carga ganancias_globales y el resumen de transferencias del rango pedido con una
+consulta por tabla y calcula los totales por empleado, por rol y por período con
+operaciones vectorizadas de pandas. calcular_reporte también combina los registros
+cargados en varias bases (ver sucursales.py).
+"""
+import datetime
+
+import pandas as pd
+
+import cache
+import db
+
+AGRUPACIONES = ("Mes", "Trimestre", "Año")
+
+COLUMNAS_GANANCIAS = ["ganancia_general", "ganancia_personalizada", "total_ganancia"]
+
+
+def limites_rango(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """Devuelve las fechas (inicio, fin) del rango como texto, con el fin excluido"""
+    inicio = datetime.date(anio_desde, mes_desde, 1)
+    fin = datetime.date(anio_hasta + mes_hasta // 12, mes_hasta % 12 + 1, 1)
+    return inicio.isoformat(), fin.isoformat()
+
+
+@cache.cacheado('ganancias_globales', 'empleados')
+def cargar_ganancias(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    """
+    Carga los registros de ganancias del rango (ambos meses incluidos) junto con los
+    datos del empleado. El resultado se comparte, por lo que no debe modificarse.
+    """
+    with db.lectura() as cursor:
+        return pd.read_sql_query('''
+            SELECT g.empleado_id, e.nombre, e.rol, g.anio, g.mes,
+                   g.ganancia_general, g.ganancia_personalizada, g.total_ganancia
+            FROM ganancias_globales g
+            JOIN empleados e ON e.id = g.empleado_id
+            WHERE g.anio * 100 + g.mes BETWEEN ? AND ?
+        ''', cursor.connection, params=(anio_desde * 100 + mes_desde, anio_hasta * 100 + mes_hasta))
+
+
+@cache.cacheado('transferencias', 'archivo_meses')
+def cargar_transferencias(mes_desde, anio_desde, mes_hasta, anio_hasta, incluir_archivo=False):
+    """
+    Carga la cantidad y el capital de las transferencias del rango agrupados por mes de
+    solicitud y estado; con incluir_archivo suma las entregadas archivadas desde el catálogo.
+    El resultado se comparte, por lo que no debe modificarse.
+    """
+    inicio, fin = limites_rango(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    with db.lectura() as cursor:
+        transferencias = pd.read_sql_query('''
+            SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER) AS anio,
+                   CAST(strftime('%m', fecha_solicitud) AS INTEGER) AS mes,
+                   estado, COUNT(*) AS cantidad, SUM(capital) AS capital
+            FROM transferencias
+            WHERE fecha_solicitud >= ? AND fecha_solicitud < ?
+            GROUP BY 1, 2, 3
+        ''', cursor.connection, params=(inicio, fin))
+        if not incluir_archivo:
+            return transferencias
+        archivadas = pd.read_sql_query('''
+            SELECT anio, mes, 'entregada' AS estado, cantidad_transferencias AS cantidad, capital_entregado AS capital
+            FROM archivo_meses
+            WHERE anio * 100 + mes BETWEEN ? AND ? AND cantidad_transferencias > 0
+        ''', cursor.connection, params=(anio_desde * 100 + mes_desde, anio_hasta * 100 + mes_hasta))
+    return pd.concat([transferencias, archivadas], ignore_index=True).groupby(["anio", "mes", "estado"], as_index=False).sum()
+
+
+def agregar_periodo(df, agrupacion):
+    """Agrega la columna 'periodo' (p. ej. '2025-03', '2025-T1' o '2025') a partir de anio y mes"""
+    anio = df["anio"].astype(str)
+    if agrupacion == "Mes":
+        periodo = anio + "-" + df["mes"].astype(str).str.zfill(2)
+    elif agrupacion == "Trimestre":
+        periodo = anio + "-T" + ((df["mes"] - 1) // 3 + 1).astype(str)
+    elif agrupacion == "Año":
+        periodo = anio
+    else:
+        raise ValueError(f"Agrupación no soportada: {agrupacion}")
+    return df.assign(periodo=periodo)
+
+
+@cache.cacheado('ganancias_globales', 'empleados', 'transferencias', 'archivo_meses')
+def generar_reporte(mes_desde, anio_desde, mes_hasta, anio_hasta, agrupacion="Mes", incluir_archivo=False):
+    """
+    Calcula el reporte de ganancias de un rango de meses.
+
+    Args:
+        mes_desde, anio_desde: Primer mes del rango.
+        mes_hasta, anio_hasta: Último mes del rango (incluido).
+        agrupacion: 'Mes', 'Trimestre' o 'Año', para las tablas por período.
+        incluir_archivo: Si el resumen de transferencias suma las archivadas.
+
+    Returns:
+        Un diccionario con 'total_ganancia_general' y los DataFrames 'por_empleado',
+        'por_rol', 'por_periodo' (períodos por empleado) y 'transferencias'
+        (cantidad y capital por período y estado). El resultado se guarda en caché y
+        se comparte entre sesiones, por lo que no debe modificarse.
+    """
+    ganancias = cargar_ganancias(mes_desde, anio_desde, mes_hasta, anio_hasta)
+    transferencias = cargar_transferencias(mes_desde, anio_desde, mes_hasta, anio_hasta, incluir_archivo)
+    return calcular_reporte(ganancias, transferencias, agrupacion)
+
+
+def calcular_reporte(ganancias, transferencias, agrupacion="Mes"):
+    """
+    Calcula el reporte a partir de los registros de cargar_ganancias y cargar_transferencias.
+
+    Si los registros de ganancias traen una columna 'sucursal' (reporte consolidado de
+    varias bases), los empleados se distinguen por sucursal y se agrega 'por_sucursal'.
+    """
+    ganancias = agregar_periodo(ganancias, agrupacion)
+    transferencias = agregar_periodo(transferencias, agrupacion)
+    consolidado = "sucursal" in ganancias.columns
+    claves_empleado = ["sucursal", "empleado_id", "nombre", "rol"] if consolidado else ["empleado_id", "nombre", "rol"]
+
+    por_empleado = (
+        ganancias.groupby(claves_empleado, as_index=False)[COLUMNAS_GANANCIAS].sum()
+        .sort_values("total_ganancia", ascending=False, ignore_index=True)
+    )
+    total = por_empleado["total_ganancia"].sum()
+    por_empleado["participacion"] = por_empleado["total_ganancia"] / total if total else 0.0
+
+    por_rol = ganancias.groupby("rol")[COLUMNAS_GANANCIAS].sum()
+    por_rol["empleados"] = ganancias.drop_duplicates(claves_empleado[:-2]).groupby("rol").size()
+
+    if consolidado:
+        # Los nombres de empleado pueden repetirse entre sucursales
+        ganancias = ganancias.assign(nombre=ganancias["nombre"] + " (" + ganancias["sucursal"] + ")")
+    por_periodo = ganancias.pivot_table(
+        index="periodo", columns="nombre", values="total_ganancia", aggfunc="sum", fill_value=0.0
+    )
+
+    resumen_transferencias = transferencias.pivot_table(
+        index="periodo", columns="estado", values=["cantidad", "capital"], aggfunc="sum", fill_value=0
+    )
+
+    reporte = {
+        "total_ganancia_general": float(ganancias["ganancia_general"].sum()),
+        "por_empleado": por_empleado,
+        "por_rol": por_rol,
+        "por_periodo": por_periodo,
+        "transferencias": resumen_transferencias,
+    }
+    if consolidado:
+        reporte["por_sucursal"] = ganancias.groupby("sucursal")[COLUMNAS_GANANCIAS].sum()
+    return reporte
@@ -0,0 +1,453 @@
+"""
+Operaciones de negocio sobre empleados, transferencias y ganancias.
+
+Este módulo no depende de Streamlit: main.py se encarga de dibujar la interfaz y los
+scripts de línea de comandos (importación, conciliación, benchmark) llaman a estas
+funciones directamente.
+"""
+import datetime
+import json
+import math
+
+import archivo
+import cache
+import db
+import importacion
+import inventario
+import libro_ganancias
+import migraciones
+from inventario import PORCENTAJE_GANANCIA_GENERAL
+
+# Campos de una transferencia que se pueden editar y su tipo en la base de datos
+CAMPOS_EDITABLES = {
+    'remitente_nombre': 'TEXT',
+    'destinatario_nombre': 'TEXT',
+    'destinatario_telefono': 'TEXT',
+    'capital': 'REAL'
+}
+
+# Número de transferencias por página en los listados
+TAMANO_PAGINA = 50
+
+# Máximo de transferencias que muestra la cola de pendientes en vivo
+TAMANO_COLA_PENDIENTES = 200
+
+# Columnas de una transferencia en los listados, con los nombres del registrador y del confirmador
+SQL_COLUMNAS_LISTADO = '''
+    t.id, t.fecha_solicitud, t.remitente_nombre, t.destinatario_nombre, t.destinatario_telefono,
+    t.capital, t.fecha_confirmacion, e_reg.nombre, e_conf.nombre, t.estado
+'''
+
+# Crear las tablas o actualizar el esquema; solo trabaja la primera vez en cada proceso
+def crear_tablas():
+    migraciones.migrar()
+
+# Verificar si hay empleados registrados
+@cache.cacheado('empleados')
+def hay_empleados_registrados():
+    with db.lectura() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM empleados')
+        return cursor.fetchone()[0] > 0
+
+def agregar_empleado(id_empleado, nombre, rol, porcentaje_ganancia=0.0):
+    db.escribir(_agregar_empleado, id_empleado, nombre, rol, porcentaje_ganancia)
+
+def _agregar_empleado(cursor, id_empleado, nombre, rol, porcentaje_ganancia):
+    cursor.execute('INSERT INTO empleados (id, nombre, rol, porcentaje_ganancia) VALUES (?, ?, ?, ?)', 
+                  (id_empleado, nombre, rol, porcentaje_ganancia))
+    cache.marcar(cursor, 'empleados')
+
+@cache.cacheado('empleados')
+def obtener_empleado_por_id(empleado_id):
+    with db.lectura() as cursor:
+        cursor.execute('SELECT id, nombre, rol, porcentaje_ganancia FROM empleados WHERE id = ?', (empleado_id,))
+        empleado = cursor.fetchone()
+    return empleado
+
+@cache.cacheado('empleados')
+def consultar_empleados():
+    """Devuelve las filas (id, nombre, rol, porcentaje_ganancia) de todos los empleados"""
+    with db.lectura() as cursor:
+        cursor.execute('SELECT id, nombre, rol, porcentaje_ganancia FROM empleados')
+        return cursor.fetchall()
+
+def calcular_ganancia_general(capital):
+    """Calcula el 10% del capital como ganancia general"""
+    return capital * PORCENTAJE_GANANCIA_GENERAL
+
+def distribuir_ganancias(transferencia_id):
+    """Distribuye las ganancias de una transferencia a los empleados involucrados"""
+    db.escribir(_distribuir_ganancias, [transferencia_id])
+
+def _distribuir_ganancias(cursor, transferencia_ids):
+    """Registra en el libro de ganancias las transferencias entregadas indicadas"""
+    libro_ganancias.registrar_entregas(cursor, transferencia_ids)
+
+def registrar_transferencia(registrador_id, remitente_nombre, destinatario_nombre, destinatario_telefono, capital):
+    """Registra una transferencia en estado solicitada y devuelve su ID"""
+    fecha_solicitud = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return db.escribir(_registrar_transferencia, (fecha_solicitud, remitente_nombre, destinatario_nombre,
+                                                  destinatario_telefono, capital, registrador_id, 'solicitada'))
+
+def _registrar_transferencia(cursor, valores):
+    cursor.execute('''
+        INSERT INTO transferencias 
+        (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, registrador_id, estado)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', valores)
+    cache.marcar(cursor, 'transferencias')
+    return cursor.lastrowid
+
+def registrar_transferencias(registrador_id, transferencias):
+    """
+    Registra varias transferencias solicitadas en una sola transacción.
+
+    Cada transferencia se valida como una fila importada (ver importacion.preparar_fila);
+    las inválidas no impiden registrar las demás.
+
+    Args:
+        registrador_id: El ID del registrador.
+        transferencias: Lista de diccionarios con remitente_nombre, destinatario_nombre,
+            destinatario_telefono, capital y, opcionalmente, fecha_solicitud.
+
+    Returns:
+        Una lista, en el mismo orden, de tuplas (id, None) para las registradas y
+        (None, mensaje) para las rechazadas.
+    """
+    fecha_por_defecto = datetime.datetime.now().strftime(importacion.FORMATO_FECHA)
+    preparadas = [importacion.preparar_fila(fila if isinstance(fila, dict) else None, registrador_id, fecha_por_defecto)
+                  for fila in transferencias]
+    validas = [valores for valores, error in preparadas if error is None]
+    ids = iter(db.escribir(_registrar_transferencias, validas) if validas else ())
+    return [(next(ids), None) if error is None else (None, error) for _, error in preparadas]
+
+def _registrar_transferencias(cursor, lista_valores):
+    ids = []
+    for valores in lista_valores:
+        cursor.execute('''
+            INSERT INTO transferencias
+            (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital, registrador_id, estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', valores)
+        ids.append(cursor.lastrowid)
+    cache.marcar(cursor, 'transferencias')
+    return ids
+
+def confirmar_transferencias_entregadas(transferencia_ids, confirmador_id):
+    """
+    Marca como entregadas varias transferencias solicitadas y distribuye sus ganancias.
+
+    El cambio de estado y la acumulación de ganancias de todo el lote ocurren en una
+    única transacción, de modo que nunca queda una transferencia entregada sin sus
+    ganancias registradas.
+
+    Args:
+        transferencia_ids: Los IDs de las transferencias a confirmar.
+        confirmador_id: El ID del confirmador que realiza la entrega.
+
+    Returns:
+        La lista de IDs que se confirmaron; los que no estaban solicitados se omiten.
+    """
+    ids = json.dumps([int(transferencia_id) for transferencia_id in transferencia_ids])
+    fecha_confirmacion = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return db.escribir(_confirmar_transferencias_entregadas, ids, confirmador_id, fecha_confirmacion)
+
+def _confirmar_transferencias_entregadas(cursor, ids, confirmador_id, fecha_confirmacion):
+    # NOT INDEXED: buscar por ID en lugar de recorrer el índice de estado
+    cursor.execute('''
+        UPDATE transferencias NOT INDEXED
+        SET estado = 'entregada', fecha_confirmacion = ?, confirmador_id = ?
+        WHERE id IN (SELECT value FROM json_each(?)) AND estado = 'solicitada'
+        RETURNING id
+    ''', (fecha_confirmacion, confirmador_id, ids))
+    confirmadas = [fila[0] for fila in cursor.fetchall()]
+    if confirmadas:
+        cache.marcar(cursor, 'transferencias')
+        # Distribuir ganancias ahora que las transferencias están entregadas
+        _distribuir_ganancias(cursor, confirmadas)
+        inventario.acumular_entregas(cursor, confirmadas)
+    return confirmadas
+
+def confirmar_transferencia_entregada(transferencia_id, confirmador_id):
+    """Confirma la entrega de una transferencia; devuelve True si estaba solicitada"""
+    return bool(confirmar_transferencias_entregadas([transferencia_id], confirmador_id))
+
+def editar_transferencia(transferencia_id, empleado_editor_id, campo, nuevo_valor):
+    """
+    Cambia un campo de una transferencia y registra el cambio en el historial de ediciones.
+
+    Returns:
+        El valor anterior del campo, o None si la transferencia no existe.
+
+    Raises:
+        ValueError: Si el campo no es editable o el valor no es válido.
+    """
+    cambios = editar_transferencias({transferencia_id: {campo: nuevo_valor}}, empleado_editor_id)
+    if transferencia_id not in cambios:
+        return None
+    # Si el valor no cambió, el anterior es el mismo que se pidió
+    modificados = cambios[transferencia_id]
+    return modificados[campo][0] if campo in modificados else nuevo_valor
+
+def normalizar_valor(campo, valor):
+    """Convierte el valor ingresado al tipo del campo; lanza ValueError si no es válido"""
+    if campo not in CAMPOS_EDITABLES:
+        raise ValueError(f"El campo '{campo}' no es editable.")
+    if CAMPOS_EDITABLES[campo] == 'REAL':
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"El valor de '{campo}' debe ser un número: '{valor}'.")
+        if not math.isfinite(numero) or numero <= 0:
+            raise ValueError(f"El valor de '{campo}' debe ser mayor que cero.")
+        return numero
+    texto = str(valor if valor is not None else '').strip()
+    if not texto:
+        raise ValueError(f"El valor de '{campo}' no puede quedar vacío.")
+    return texto
+
+def editar_transferencias(cambios, empleado_editor_id):
+    """
+    Cambia varios campos de una o muchas transferencias en una sola transacción.
+
+    Los campos cuyo valor no cambia se ignoran; por cada uno que sí cambia se
+    escribe una fila en el historial de ediciones, todas con un único executemany.
+    Si algún valor no es válido no se aplica ningún cambio.
+
+    Args:
+        cambios: Diccionario {transferencia_id: {campo: nuevo_valor}}.
+        empleado_editor_id: El ID del empleado que edita.
+
+    Returns:
+        Un diccionario {transferencia_id: {campo: (valor_anterior, valor_nuevo)}} con
+        los campos modificados de cada transferencia encontrada; las que no existen
+        no aparecen.
+
+    Raises:
+        ValueError: Si algún campo no es editable o algún valor no es válido.
+    """
+    normalizados = {
+        int(transferencia_id): {campo: normalizar_valor(campo, valor) for campo, valor in campos.items()}
+        for transferencia_id, campos in cambios.items()
+    }
+    fecha_edicion = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return db.escribir(_editar_transferencias, normalizados, empleado_editor_id, fecha_edicion)
+
+def _editar_transferencias(cursor, cambios, empleado_editor_id, fecha_edicion):
+    columnas = list(CAMPOS_EDITABLES)
+    cursor.execute(f'''
+        SELECT id, {', '.join(columnas)} FROM transferencias
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(list(cambios)),))
+    actuales = {fila[0]: dict(zip(columnas, fila[1:])) for fila in cursor.fetchall()}
+
+    aplicados = {}
+    actualizaciones = {}
+    historial = []
+    for transferencia_id, valores in actuales.items():
+        modificados = {campo: (valores[campo], nuevo) for campo, nuevo in cambios[transferencia_id].items()
+                       if valores[campo] != nuevo}
+        aplicados[transferencia_id] = modificados
+        if not modificados:
+            continue
+        # Las transferencias que cambian los mismos campos se actualizan con una sola sentencia
+        actualizaciones.setdefault(tuple(sorted(modificados)), []).append(transferencia_id)
+        historial.extend((transferencia_id, fecha_edicion, empleado_editor_id, campo, str(anterior), str(nuevo))
+                         for campo, (anterior, nuevo) in modificados.items())
+
+    for campos, ids in actualizaciones.items():
+        asignaciones = ', '.join(f'{campo} = ?' for campo in campos)
+        cursor.executemany(f'UPDATE transferencias SET {asignaciones} WHERE id = ?',
+                           [(*(aplicados[i][campo][1] for campo in campos), i) for i in ids])
+    for transferencia_id, modificados in aplicados.items():
+        if 'capital' in modificados:
+            inventario.ajustar_capital(cursor, transferencia_id, modificados['capital'][0])
+    if historial:
+        cursor.executemany('''
+            INSERT INTO historial_ediciones (transferencia_id, fecha_edicion, empleado_editor_id, campo_editado, valor_anterior, valor_nuevo)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', historial)
+        cache.marcar(cursor, 'transferencias', 'historial_ediciones')
+    return aplicados
+
+def consultar_transferencias_editables(transferencia_ids):
+    """Devuelve las filas (id, remitente_nombre, destinatario_nombre, destinatario_telefono, capital) de los IDs indicados, ordenadas por ID"""
+    with db.lectura() as cursor:
+        cursor.execute(f'''
+            SELECT id, {', '.join(CAMPOS_EDITABLES)} FROM transferencias
+            WHERE id IN (SELECT value FROM json_each(?))
+            ORDER BY id
+        ''', (json.dumps([int(transferencia_id) for transferencia_id in transferencia_ids]),))
+        return cursor.fetchall()
+
+def consultar_pagina_transferencias(rol, empleado_id=None, filtros=None, despues_de=None, tamano=TAMANO_PAGINA):
+    """
+    Obtiene una página de transferencias, de la más reciente a la más antigua, usando
+    paginación por clave sobre (fecha_solicitud, id).
+
+    Args:
+        rol: El rol del usuario ('administrador', 'registrador', 'confirmador').
+        empleado_id: El ID del empleado (obligatorio para registrador y confirmador).
+        filtros: Diccionario opcional con 'estado', 'fecha_desde', 'fecha_hasta',
+            'registrador_id', 'capital_min', 'capital_max' e 'incluir_archivo' (para
+            sumar las transferencias entregadas que ya se archivaron).
+        despues_de: Clave (fecha_solicitud, id) de la última fila de la página anterior.
+        tamano: Número máximo de filas de la página.
+
+    Returns:
+        Una tupla (filas, siguiente) donde siguiente es la clave para pedir la próxima
+        página o None si no hay más, o None si el rol no puede listar transferencias.
+
+    Raises:
+        ValueError: Si tamano es menor que 1.
+    """
+    if tamano < 1:
+        raise ValueError(f"El tamaño de página debe ser al menos 1: {tamano}.")
+    filtros = filtros or {}
+    condiciones = []
+    parametros = []
+
+    if rol == 'administrador':
+        pass
+    elif rol == 'registrador' and empleado_id:
+        condiciones.append('t.registrador_id = ?')
+        parametros.append(empleado_id)
+    elif rol == 'confirmador' and empleado_id:
+        condiciones.append("t.estado = 'solicitada'")
+    else:
+        return None
+
+    desde = hasta = None
+    if filtros.get('estado'):
+        condiciones.append('t.estado = ?')
+        parametros.append(filtros['estado'])
+    if filtros.get('fecha_desde'):
+        desde = filtros['fecha_desde'].isoformat()
+        condiciones.append('t.fecha_solicitud >= ?')
+        parametros.append(desde)
+    if filtros.get('fecha_hasta'):
+        # Se incluye el día completo comparando contra el inicio del día siguiente
+        hasta = (filtros['fecha_hasta'] + datetime.timedelta(days=1)).isoformat()
+        condiciones.append('t.fecha_solicitud < ?')
+        parametros.append(hasta)
+    if filtros.get('registrador_id'):
+        condiciones.append('t.registrador_id = ?')
+        parametros.append(filtros['registrador_id'])
+    if filtros.get('capital_min') is not None:
+        condiciones.append('t.capital >= ?')
+        parametros.append(filtros['capital_min'])
+    if filtros.get('capital_max') is not None:
+        condiciones.append('t.capital <= ?')
+        parametros.append(filtros['capital_max'])
+    if despues_de:
+        condiciones.append('(t.fecha_solicitud, t.id) < (?, ?)')
+        parametros.extend(despues_de)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    consulta = f'''
+        SELECT {SQL_COLUMNAS_LISTADO}
+        FROM {{esquema}}.transferencias t
+        JOIN empleados e_reg ON t.registrador_id = e_reg.id
+        LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
+        {where}
+        ORDER BY t.fecha_solicitud DESC, t.id DESC
+        LIMIT ?
+    '''
+    # El archivo solo tiene entregadas; sus meses se recorren del más reciente al más
+    # antiguo hasta que ninguno pueda aportar filas a la página
+    meses_archivo = []
+    if filtros.get('incluir_archivo') and rol != 'confirmador' and filtros.get('estado') in (None, 'entregada'):
+        if despues_de and (hasta is None or despues_de[0] < hasta):
+            hasta = despues_de[0]
+        meses_archivo = archivo.meses_archivados(desde, hasta)
+
+    with db.lectura() as cursor:
+        cursor.execute(consulta.format(esquema='main'), (*parametros, tamano + 1))
+        filas = cursor.fetchall()
+        for anio, mes in meses_archivo:
+            if len(filas) > tamano and filas[tamano][1] >= f'{anio + mes // 12:04d}-{mes % 12 + 1:02d}':
+                break
+            with archivo.adjuntar(cursor, anio, mes) as esquema:
+                cursor.execute(consulta.format(esquema=esquema), (*parametros, tamano + 1))
+                archivadas = cursor.fetchall()
+            vistas = {fila[0] for fila in filas}
+            filas = sorted(filas + [fila for fila in archivadas if fila[0] not in vistas],
+                           key=lambda fila: (fila[1], fila[0]), reverse=True)[:tamano + 1]
+
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        siguiente = (filas[-1][1], filas[-1][0])
+    return filas, siguiente
+
+def consultar_cola_pendientes(tamano=TAMANO_COLA_PENDIENTES):
+    """
+    Carga la cola de transferencias solicitadas, de la más reciente a la más antigua.
+
+    El máximo se lee antes que las filas por la misma razón que en
+    consultar_cambios_pendientes.
+
+    Returns:
+        Una tupla (filas, hay_mas, ultimo_id) con a lo sumo tamano filas en el formato
+        del listado y el mayor ID existente antes de leerlas, para pedir los cambios.
+    """
+    with db.lectura() as cursor:
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transferencias')
+        ultimo_id = cursor.fetchone()[0]
+        cursor.execute(f'''
+            SELECT {SQL_COLUMNAS_LISTADO}
+            FROM transferencias t
+            JOIN empleados e_reg ON t.registrador_id = e_reg.id
+            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
+            WHERE t.estado = 'solicitada'
+            ORDER BY t.fecha_solicitud DESC, t.id DESC
+            LIMIT ?
+        ''', (tamano + 1,))
+        filas = cursor.fetchall()
+    return filas[:tamano], len(filas) > tamano, ultimo_id
+
+def consultar_cambios_pendientes(ids_visibles, ultimo_id):
+    """
+    Actualiza una cola de pendientes sin volver a recorrer la tabla.
+
+    Lee por clave primaria solo las transferencias ya mostradas y las registradas
+    después de ultimo_id (los IDs son crecientes), y devuelve las que siguen
+    solicitadas; las mostradas que no aparecen ya fueron confirmadas.
+
+    Returns:
+        Una tupla (filas, ultimo_id) con las filas en el formato del listado, de la más
+        reciente a la más antigua, y el ID a usar en el próximo pedido.
+    """
+    with db.lectura() as cursor:
+        # El máximo se lee antes que las filas: lo que se registre entre ambas lecturas
+        # se vuelve a pedir la próxima vez en lugar de perderse
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transferencias')
+        nuevo_ultimo_id = cursor.fetchone()[0]
+        # NOT INDEXED: buscar por ID en lugar de recorrer el índice de estado
+        cursor.execute(f'''
+            SELECT {SQL_COLUMNAS_LISTADO}
+            FROM transferencias t NOT INDEXED
+            JOIN empleados e_reg ON t.registrador_id = e_reg.id
+            LEFT JOIN empleados e_conf ON t.confirmador_id = e_conf.id
+            WHERE (t.id IN (SELECT value FROM json_each(?)) OR t.id > ?) AND t.estado = 'solicitada'
+            ORDER BY t.fecha_solicitud DESC, t.id DESC
+        ''', (json.dumps(list(ids_visibles)), ultimo_id))
+        return cursor.fetchall(), max(ultimo_id, nuevo_ultimo_id)
+
+def consultar_historial_ediciones(transferencia_id, incluir_archivo=False):
+    """
+    Devuelve las filas (fecha_edicion, nombre_editor, campo, valor_anterior, valor_nuevo)
+    de una transferencia; con incluir_archivo, también la busca entre las archivadas.
+    """
+    with db.lectura() as cursor:
+        cursor.execute('''
+            SELECT he.fecha_edicion, e.nombre, he.campo_editado, he.valor_anterior, he.valor_nuevo
+            FROM historial_ediciones he
+            JOIN empleados e ON he.empleado_editor_id = e.id
+            WHERE he.transferencia_id = ?
+            ORDER BY he.fecha_edicion DESC
+        ''', (transferencia_id,))
+        historial = cursor.fetchall()
+    if not historial and incluir_archivo:
+        historial = archivo.consultar_historial_ediciones(transferencia_id)
+    return historial
@@ -0,0 +1,298 @@
+"""
+Modo multisucursal: cada agencia trabaja sobre su propia base de datos y un registro
+en JSON guarda el nombre y la ruta de cada una.
+
+Los reportes consolidados se reparten entre las sucursales en un pool de procesos:
+cada proceso abre la base de una sucursal, carga sus agregados parciales (ganancias
+por empleado y mes, transferencias por mes y estado, inventario por mes) y los
+devuelve; el proceso principal solo los suma. El tiempo de un reporte se acerca así
+al de la sucursal más lenta y no a la suma de todas. El pool se crea con el primer
+reporte y se reutiliza, de modo que solo el primero paga el arranque de los procesos.
+
+Las bases de las sucursales se abren en modo de solo lectura: un reporte consolidado
+no toma el bloqueo de escritura ni migra el esquema de una sucursal que otro proceso
+está atendiendo. Cada sucursal debe migrarse con su propia aplicación (o con
+migraciones.py) antes de entrar en los reportes.
+
+Si una sucursal falla (la base no existe, está bloqueada, tiene otro esquema), el
+reporte se arma con las demás e indica cuáles faltan.
+
+    python sucursales.py --agregar Centro /datos/centro/transferencias.db
+    python sucursales.py --listar
+    python sucursales.py --inventario 2025-06
+    python sucursales.py --reporte 2025-01 2025-12
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import db
+import inventario
+import metricas
+import migraciones
+
+# Archivo JSON con el registro {nombre: ruta de la base de datos}
+RUTA_REGISTRO = os.environ.get('TRANSFERENCIAS_SUCURSALES', 'sucursales.json')
+
+# Procesos del pool; por defecto, uno por CPU (nunca más que sucursales registradas)
+PROCESOS = int(os.environ.get('TRANSFERENCIAS_PROCESOS', '0')) or os.cpu_count() or 1
+
+_pool = None
+_procesos_pool = 0
+_lock = threading.Lock()
+
+
+def cargar_registro():
+    """Devuelve el registro de sucursales {nombre: ruta}, vacío si no existe el archivo"""
+    try:
+        with open(RUTA_REGISTRO, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {}
+
+
+def _guardar_registro(registro):
+    # Se escribe en un temporal y se reemplaza, para no dejar un registro a medias
+    directorio = os.path.dirname(os.path.abspath(RUTA_REGISTRO))
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directorio, suffix='.tmp', delete=False) as archivo:
+        json.dump(registro, archivo, ensure_ascii=False, indent=2)
+    os.replace(archivo.name, RUTA_REGISTRO)
+
+
+def agregar_sucursal(nombre, ruta):
+    """
+    Registra una sucursal o cambia la ruta de una existente.
+
+    Raises:
+        ValueError: Si el nombre está vacío o la base de datos no existe.
+    """
+    nombre = nombre.strip()
+    if not nombre:
+        raise ValueError("El nombre de la sucursal no puede quedar vacío.")
+    if not os.path.isfile(ruta):
+        raise ValueError(f"No existe la base de datos '{ruta}'.")
+    registro = cargar_registro()
+    registro[nombre] = os.path.abspath(ruta)
+    _guardar_registro(registro)
+
+
+def quitar_sucursal(nombre):
+    """Quita una sucursal del registro; devuelve False si no estaba registrada"""
+    registro = cargar_registro()
+    if registro.pop(nombre, None) is None:
+        return False
+    _guardar_registro(registro)
+    return True
+
+
+def multisucursal():
+    """Indica si hay sucursales registradas para los reportes consolidados"""
+    return bool(cargar_registro())
+
+
+def _ejecutor(cantidad):
+    global _pool, _procesos_pool
+    procesos = max(1, min(PROCESOS, cantidad))
+    with _lock:
+        if _pool is None or _procesos_pool < procesos:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn y no fork: el proceso principal tiene hilos (escritor, Streamlit)
+            # cuyo estado no debe copiarse a los procesos hijos
+            _pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn'))
+            _procesos_pool = procesos
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _abrir(ruta):
+    """Apunta db a la base de la sucursal, en solo lectura, y verifica que su esquema esté al día"""
+    if db.pool.ruta != ruta:
+        if not os.path.isfile(ruta):
+            raise FileNotFoundError(f"No existe la base de datos '{ruta}'.")
+        db.configurar(ruta, solo_lectura=True)
+    with db.lectura() as cursor:
+        actual = migraciones.version_esquema(cursor)
+    if actual != len(migraciones.MIGRACIONES):
+        raise RuntimeError(f"La base '{ruta}' tiene el esquema {actual} y esta versión del programa usa el "
+                           f"{len(migraciones.MIGRACIONES)}; migrela con TRANSFERENCIAS_DB='{ruta}' python migraciones.py.")
+
+
+def _en_sucursal(funcion, ruta, *args):
+    # Corre en el proceso del pool; devuelve también la duración para las métricas
+    inicio = time.perf_counter()
+    _abrir(ruta)
+    return funcion(*args), time.perf_counter() - inicio
+
+
+def repartir(operacion, funcion, *args):
+    """
+    Ejecuta funcion(*args) sobre la base de cada sucursal registrada, en paralelo.
+
+    La función debe poder importarse desde los procesos del pool (definida a nivel de
+    módulo) y devolver un resultado que pueda enviarse entre procesos.
+
+    Returns:
+        Una tupla (resultados, errores): diccionarios por nombre de sucursal con el
+        resultado de las que respondieron y el mensaje de error de las que fallaron.
+
+    Raises:
+        ValueError: Si no hay sucursales registradas.
+    """
+    registro = cargar_registro()
+    if not registro:
+        raise ValueError("No hay sucursales registradas.")
+    resultados, errores = {}, {}
+    with metricas.medir('sucursales', f'{operacion} (todas)'):
+        pool = _ejecutor(len(registro))
+        futuros = {nombre: pool.submit(_en_sucursal, funcion, ruta, *args) for nombre, ruta in registro.items()}
+        for nombre, futuro in futuros.items():
+            try:
+                resultados[nombre], segundos = futuro.result()
+            except BrokenProcessPool:
+                # Un proceso murió: el pool ya no sirve y se crea otro en el próximo reporte
+                _descartar_pool(pool)
+                errores[nombre] = "El proceso que la atendía terminó de forma inesperada."
+            except Exception as error:
+                errores[nombre] = str(error) or type(error).__name__
+            else:
+                metricas.registrar('sucursales', f'{operacion} ({nombre})', segundos)
+    return resultados, errores
+
+
+def _inventario_parcial(mes, anio, mes_desde, anio_desde):
+    return inventario.consultar_mes(mes, anio), inventario.consultar_rango(mes_desde, anio_desde, mes, anio)
+
+
+def inventario_consolidado(mes, anio, meses_tendencia=12):
+    """
+    Suma el inventario del mes y la tendencia de los meses anteriores de todas las sucursales.
+
+    Returns:
+        Una tupla (total, por_sucursal, tendencia, errores): total es
+        (capital_entregado, cantidad_transferencias, ganancia_general) del mes;
+        por_sucursal, un diccionario con esa misma tupla por sucursal; tendencia, las
+        filas (anio, mes, capital_entregado, cantidad_transferencias, ganancia_general)
+        sumadas por mes; errores, el mensaje por sucursal que no respondió.
+    """
+    inicio = anio * 12 + mes - meses_tendencia
+    resultados, errores = repartir('inventario', _inventario_parcial, mes, anio, inicio % 12 + 1, inicio // 12)
+
+    por_sucursal = {nombre: mes_sucursal for nombre, (mes_sucursal, _) in resultados.items()}
+    total = tuple(sum(valores) for valores in zip((0.0, 0, 0.0), *por_sucursal.values()))
+    meses = {}
+    for _, filas in resultados.values():
+        for anio_fila, mes_fila, *valores in filas:
+            acumulado = meses.get((anio_fila, mes_fila), (0.0, 0, 0.0))
+            meses[(anio_fila, mes_fila)] = tuple(a + b for a, b in zip(acumulado, valores))
+    tendencia = [(anio_fila, mes_fila, *valores) for (anio_fila, mes_fila), valores in sorted(meses.items())]
+    return total, por_sucursal, tendencia, errores
+
+
+def _reporte_parcial(mes_desde, anio_desde, mes_hasta, anio_hasta):
+    import reportes
+    return (reportes.cargar_ganancias(mes_desde, anio_desde, mes_hasta, anio_hasta),
+            reportes.cargar_transferencias(mes_desde, anio_desde, mes_hasta, anio_hasta, incluir_archivo=True))
+
+
+def reporte_consolidado(mes_desde, anio_desde, mes_hasta, anio_hasta, agrupacion="Mes"):
+    """
+    Calcula el reporte de ganancias del rango sobre todas las sucursales.
+
+    Returns:
+        Una tupla (reporte, errores): el reporte tiene la forma de
+        reportes.generar_reporte, con la columna 'sucursal' en el desglose por empleado
+        y la tabla 'por_sucursal'; errores tiene el mensaje por sucursal que no respondió.
+
+    Raises:
+        RuntimeError: Si ninguna sucursal respondió.
+    """
+    import pandas as pd
+    import reportes
+    resultados, errores = repartir('reporte', _reporte_parcial, mes_desde, anio_desde, mes_hasta, anio_hasta)
+    if not resultados:
+        raise RuntimeError("Ninguna sucursal respondió: " + "; ".join(f"{n}: {e}" for n, e in errores.items()))
+
+    ganancias = pd.concat([g.assign(sucursal=nombre) for nombre, (g, _) in resultados.items()], ignore_index=True)
+    transferencias = (
+        pd.concat([t for _, t in resultados.values()], ignore_index=True)
+        .groupby(["anio", "mes", "estado"], as_index=False).sum()
+    )
+    return reportes.calcular_reporte(ganancias, transferencias, agrupacion), errores
+
+
+def _mes(texto):
+    try:
+        anio, mes = (int(parte) for parte in texto.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Mes inválido: '{texto}'. Use el formato AAAA-MM.")
+    if not 1 <= mes <= 12:
+        raise argparse.ArgumentTypeError(f"Mes inválido: '{texto}'. Use el formato AAAA-MM.")
+    return mes, anio
+
+
+def _mostrar_errores(errores):
+    for nombre, error in errores.items():
+        print(f"Sin datos de la sucursal {nombre}: {error}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registro de sucursales y reportes consolidados.")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--listar', action='store_true', help="Muestra las sucursales registradas")
+    grupo.add_argument('--agregar', nargs=2, metavar=('NOMBRE', 'RUTA'), help="Registra una sucursal")
+    grupo.add_argument('--quitar', metavar='NOMBRE', help="Quita una sucursal del registro")
+    grupo.add_argument('--inventario', type=_mes, metavar='AAAA-MM', help="Inventario consolidado del mes")
+    grupo.add_argument('--reporte', type=_mes, nargs=2, metavar=('DESDE', 'HASTA'),
+                       help="Reporte de ganancias consolidado entre dos meses (AAAA-MM)")
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        registro = cargar_registro()
+        if not registro:
+            print("No hay sucursales registradas.")
+        for nombre, ruta in registro.items():
+            print(f"{nombre}: {ruta}")
+    elif args.agregar:
+        try:
+            agregar_sucursal(*args.agregar)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        print(f"Sucursal '{args.agregar[0].strip()}' registrada.")
+    elif args.quitar:
+        if not quitar_sucursal(args.quitar):
+            print(f"La sucursal '{args.quitar}' no está registrada.", file=sys.stderr)
+            return 1
+        print(f"Sucursal '{args.quitar}' quitada del registro.")
+    elif args.inventario:
+        (capital, cantidad, ganancia), por_sucursal, _, errores = inventario_consolidado(*args.inventario, meses_tendencia=0)
+        for nombre, (capital_sucursal, cantidad_sucursal, ganancia_sucursal) in sorted(por_sucursal.items()):
+            print(f"{nombre}: capital {capital_sucursal:.2f}, {cantidad_sucursal} transferencias, ganancia {ganancia_sucursal:.2f}")
+        print(f"Total: capital {capital:.2f}, {cantidad} transferencias, ganancia {ganancia:.2f}")
+        _mostrar_errores(errores)
+    else:
+        (mes_desde, anio_desde), (mes_hasta, anio_hasta) = args.reporte
+        reporte, errores = reporte_consolidado(mes_desde, anio_desde, mes_hasta, anio_hasta)
+        print(reporte["por_sucursal"].to_string())
+        print(f"Total ganancia general: {reporte['total_ganancia_general']:.2f}")
+        _mostrar_errores(errores)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archivo
+import cache
+import db
+import migraciones
+import servicios
+
+ADMINISTRADOR, REGISTRADOR, CONFIRMADOR = 1, 2, 3
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """Base de datos nueva en tmp_path, migrada y con un empleado de cada rol"""
+    ruta = str(tmp_path / 'transferencias.db')
+    monkeypatch.setattr(archivo, 'DIRECTORIO_ARCHIVO', str(tmp_path / 'archivo'))
+    db.configurar(ruta)
+    cache.limpiar()
+    migraciones._migradas.discard(ruta)
+    migraciones.migrar()
+    servicios.agregar_empleado(ADMINISTRADOR, 'Ana', 'administrador', 50.0)
+    servicios.agregar_empleado(REGISTRADOR, 'Raúl', 'registrador', 20.0)
+    servicios.agregar_empleado(CONFIRMADOR, 'Carla', 'confirmador', 10.0)
+    yield ruta
+    db.configurar(db.RUTA_BD)
+    cache.limpiar()
+
+
+def registrar(cantidad, capital=100.0):
+    """Registra transferencias solicitadas y devuelve sus IDs"""
+    resultados = servicios.registrar_transferencias(REGISTRADOR, [
+        {'remitente_nombre': f'Remitente {i}', 'destinatario_nombre': f'Destinatario {i}',
+         'destinatario_telefono': f'555-{i:04d}', 'capital': capital + i}
+        for i in range(cantidad)
+    ])
+    return [transferencia_id for transferencia_id, _ in resultados]
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+import api
+import servicios
+from conftest import ADMINISTRADOR, CONFIRMADOR, REGISTRADOR, registrar
+
+
+@pytest.fixture(autouse=True)
+def sin_token(monkeypatch):
+    monkeypatch.setattr(api, 'TOKEN_API', None)
+
+
+def pedir(metodo, ruta, empleado_id=None, cuerpo=None, consulta=None, cabeceras=None):
+    cabeceras = dict(cabeceras or {})
+    if empleado_id is not None:
+        cabeceras['x-empleado-id'] = str(empleado_id)
+    return api.atender(api.Pedido(metodo, ruta, {nombre: [valor] for nombre, valor in (consulta or {}).items()},
+                                  cabeceras, json.dumps(cuerpo).encode() if cuerpo is not None else b''))
+
+
+def transferencia(i, capital=100.0):
+    return {'remitente_nombre': f'Remitente {i}', 'destinatario_nombre': f'Destinatario {i}',
+            'destinatario_telefono': f'555-{i:04d}', 'capital': capital}
+
+
+def test_registrar_lote_completo(base):
+    estado, cuerpo = pedir('POST', '/transferencias', REGISTRADOR, {'transferencias': [transferencia(1), transferencia(2)]})
+
+    assert estado == 201
+    assert all('id' in resultado for resultado in cuerpo['resultados'])
+
+
+def test_registrar_lote_parcial(base):
+    estado, cuerpo = pedir('POST', '/transferencias', REGISTRADOR,
+                           {'transferencias': [transferencia(1), transferencia(2, capital='mucho'), 'no es un objeto']})
+
+    assert estado == 207
+    assert 'id' in cuerpo['resultados'][0]
+    assert ['error' in resultado for resultado in cuerpo['resultados']] == [False, True, True]
+
+
+def test_registrar_lote_sin_validas(base):
+    estado, cuerpo = pedir('POST', '/transferencias', REGISTRADOR, {'transferencias': [transferencia(1, capital=-5)]})
+
+    assert estado == 400
+    assert 'error' in cuerpo['resultados'][0]
+    assert servicios.consultar_pagina_transferencias('administrador')[0] == []
+
+
+@pytest.mark.parametrize('cuerpo', [{'transferencias': []}, {'transferencias': 'x'}, []])
+def test_registrar_lote_mal_formado(base, cuerpo):
+    assert pedir('POST', '/transferencias', REGISTRADOR, cuerpo)[0] == 400
+
+
+def test_lotes_demasiado_grandes(base):
+    lote = [transferencia(1)] * (api.MAXIMO_LOTE + 1)
+    assert pedir('POST', '/transferencias', REGISTRADOR, {'transferencias': lote})[0] == 413
+    ids = list(range(1, api.MAXIMO_LOTE + 2))
+    assert pedir('POST', '/confirmaciones', CONFIRMADOR, {'ids': ids})[0] == 413
+    assert servicios.consultar_pagina_transferencias('administrador')[0] == []
+
+
+def test_empleado_repetido(base):
+    estado, _ = pedir('POST', '/empleados', ADMINISTRADOR, {'id': REGISTRADOR, 'nombre': 'Otro', 'rol': 'registrador'})
+
+    assert estado == 409
+
+
+def test_empleado_agregado_por_otro_pedido_al_mismo_tiempo(base, monkeypatch):
+    # La verificación previa no lo ve, pero la inserción choca con la clave primaria
+    obtener = servicios.obtener_empleado_por_id
+    monkeypatch.setattr(servicios, 'obtener_empleado_por_id',
+                        lambda empleado_id: None if empleado_id == REGISTRADOR else obtener(empleado_id))
+    estado, _ = pedir('POST', '/empleados', ADMINISTRADOR, {'id': REGISTRADOR, 'nombre': 'Otro', 'rol': 'registrador'})
+
+    assert estado == 409
+
+
+@pytest.mark.parametrize('porcentaje', [-1, 100.5, 'NaN', 'inf', '-inf'])
+def test_empleado_con_porcentaje_invalido(base, porcentaje):
+    estado, _ = pedir('POST', '/empleados', ADMINISTRADOR,
+                      {'id': 10, 'nombre': 'Nuevo', 'rol': 'registrador', 'porcentaje_ganancia': porcentaje})
+
+    assert estado == 400
+    assert servicios.obtener_empleado_por_id(10) is None
+
+
+@pytest.mark.parametrize('porcentaje', [0, 12.5, 100])
+def test_empleado_con_porcentaje_valido(base, porcentaje):
+    estado, cuerpo = pedir('POST', '/empleados', ADMINISTRADOR,
+                           {'id': 10, 'nombre': 'Nuevo', 'rol': 'registrador', 'porcentaje_ganancia': porcentaje})
+
+    assert (estado, cuerpo) == (201, {'id': 10})
+
+
+@pytest.mark.parametrize('cabeceras', [{}, {'x-empleado-id': 'uno'}, {'x-empleado-id': '99'}])
+def test_empleado_no_identificado(base, cabeceras):
+    assert pedir('GET', '/transferencias', cabeceras=cabeceras)[0] == 401
+
+
+def test_token(base, monkeypatch):
+    monkeypatch.setattr(api, 'TOKEN_API', 'secreto')
+
+    assert pedir('GET', '/transferencias', ADMINISTRADOR)[0] == 401
+    assert pedir('GET', '/transferencias', ADMINISTRADOR, cabeceras={'authorization': 'Bearer otro'})[0] == 401
+    assert pedir('GET', '/transferencias', ADMINISTRADOR, cabeceras={'authorization': 'Bearer secreto'})[0] == 200
+
+
+@pytest.mark.parametrize('metodo, ruta, empleado_id', [('POST', '/empleados', REGISTRADOR),
+                                                       ('POST', '/transferencias', CONFIRMADOR),
+                                                       ('POST', '/confirmaciones', ADMINISTRADOR)])
+def test_rol_sin_permiso(base, metodo, ruta, empleado_id):
+    assert pedir(metodo, ruta, empleado_id, {})[0] == 403
+
+
+@pytest.mark.parametrize('tamano', ['0', '-1', str(api.MAXIMO_PAGINA + 1), 'x'])
+def test_tamano_de_pagina_invalido(base, tamano):
+    assert pedir('GET', '/transferencias', ADMINISTRADOR, consulta={'tamano': tamano})[0] == 400
+
+
+def test_tamano_de_pagina_valido(base):
+    registrar(3)
+    estado, cuerpo = pedir('GET', '/transferencias', ADMINISTRADOR, consulta={'tamano': '2'})
+
+    assert estado == 200
+    assert len(cuerpo['transferencias']) == 2 and cuerpo['siguiente']
+    assert pedir('GET', '/transferencias', ADMINISTRADOR, consulta={'tamano': str(api.MAXIMO_PAGINA)})[0] == 200
+
+
+@pytest.mark.parametrize('cuerpo', [{'ids': '12'}, {'ids': {'1': 1}}, {'ids': [True]}, {'ids': [1.0]}, {'ids': ['1']},
+                                    {'ids': None}, [1, 2]])
+def test_ids_invalidos(base, cuerpo):
+    ids = registrar(2)
+    assert pedir('POST', '/confirmaciones', CONFIRMADOR, cuerpo)[0] == 400
+    assert len(servicios.consultar_pagina_transferencias('administrador', filtros={'estado': 'solicitada'})[0]) == len(ids)
+
+
+def test_confirmar_entregas(base):
+    ids = registrar(2)
+    estado, cuerpo = pedir('POST', '/confirmaciones', CONFIRMADOR, {'ids': [ids[0], 999]})
+
+    assert (estado, cuerpo) == (200, {'confirmadas': [ids[0]], 'omitidas': [999]})
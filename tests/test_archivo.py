@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+import archivo
+import db
+import servicios
+from conftest import CONFIRMADOR, REGISTRADOR, registrar
+
+
+@pytest.fixture
+def entregadas(base):
+    """Doce transferencias entregadas en marzo y abril de 2024, y dos solicitadas recientes"""
+    ids = registrar(12)
+    servicios.confirmar_transferencias_entregadas(ids, CONFIRMADOR)
+
+    def envejecer(cursor):
+        for indice, transferencia_id in enumerate(ids):
+            mes = 3 + indice % 2
+            cursor.execute('UPDATE transferencias SET fecha_solicitud = ?, fecha_confirmacion = ? WHERE id = ?',
+                           (f'2024-{mes:02d}-{indice + 1:02d} 10:00:00', f'2024-{mes:02d}-{indice + 2:02d} 10:00:00',
+                            transferencia_id))
+
+    db.escribir(envejecer)
+    registrar(2)
+    return ids
+
+
+def _en_principal(transferencia_id):
+    with db.lectura() as cursor:
+        cursor.execute('SELECT destinatario_nombre FROM transferencias WHERE id = ?', (transferencia_id,))
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def _en_archivo(anio, mes, transferencia_id):
+    with db.lectura() as cursor:
+        with archivo.adjuntar(cursor, anio, mes) as esquema:
+            cursor.execute(f'SELECT destinatario_nombre FROM {esquema}.transferencias WHERE id = ?', (transferencia_id,))
+            fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def _cantidad_catalogada(anio, mes):
+    with db.lectura() as cursor:
+        cursor.execute('SELECT cantidad_transferencias FROM archivo_meses WHERE anio = ? AND mes = ?', (anio, mes))
+        return cursor.fetchone()[0]
+
+
+def _todas_las_paginas(tamano):
+    filas, siguiente = servicios.consultar_pagina_transferencias('administrador', filtros={'incluir_archivo': True},
+                                                                 tamano=tamano)
+    paginas = [filas]
+    while siguiente:
+        filas, siguiente = servicios.consultar_pagina_transferencias('administrador', filtros={'incluir_archivo': True},
+                                                                     despues_de=siguiente, tamano=tamano)
+        paginas.append(filas)
+    return paginas
+
+
+@pytest.mark.parametrize('tamano', [1, 3, 5, 50])
+def test_paginas_con_archivo_iguales_antes_y_despues_de_archivar(entregadas, tamano):
+    antes = _todas_las_paginas(tamano)
+
+    assert archivo.archivar(dias=30) == {(2024, 3): 6, (2024, 4): 6}
+    assert all(_en_principal(transferencia_id) is None for transferencia_id in entregadas)
+
+    assert _todas_las_paginas(tamano) == antes
+    assert sum(len(filas) for filas in antes) == 14
+
+
+def test_transferencia_editada_entre_copia_y_borrado_queda_en_principal(entregadas):
+    editada = entregadas[0]
+    ids_marzo = entregadas[0::2]
+    os.makedirs(archivo.directorio(), exist_ok=True)
+    conexion = db.abrir_conexion(db.pool.ruta)
+    commit = conexion.commit
+
+    def commit_y_editar():
+        # Se edita desde otra conexión justo después de confirmar la copia al archivo
+        commit()
+        del conexion.commit
+        servicios.editar_transferencia(editada, REGISTRADOR, 'destinatario_nombre', 'Editado')
+
+    conexion.commit = commit_y_editar
+    cursor = conexion.cursor()
+    try:
+        with archivo.adjuntar(cursor, 2024, 3, crear=True):
+            archivo._crear_esquema(cursor)
+            movidas = archivo._mover(cursor, ids_marzo, 2024, 3)
+    finally:
+        cursor.close()
+        conexion.close()
+
+    assert sorted(movidas) == sorted(ids_marzo[1:])
+    assert _en_principal(editada) == 'Editado'
+    assert _en_archivo(2024, 3, editada) is None
+    assert _cantidad_catalogada(2024, 3) == 5
+
+    # La próxima pasada la archiva con el valor editado
+    assert archivo.archivar(dias=30)[(2024, 3)] == 1
+    assert _en_principal(editada) is None
+    assert _en_archivo(2024, 3, editada) == 'Editado'
+    assert _cantidad_catalogada(2024, 3) == 6
+
+
+def test_adjuntar_falla_si_falta_el_archivo_de_un_mes_catalogado(entregadas):
+    archivo.archivar(dias=30)
+    ruta = os.path.join(archivo.directorio(), archivo.nombre_archivo(2024, 3))
+    os.remove(ruta)
+
+    with db.lectura() as cursor:
+        with pytest.raises(FileNotFoundError):
+            with archivo.adjuntar(cursor, 2024, 3):
+                pass
+    assert not os.path.exists(ruta)
+    with pytest.raises(FileNotFoundError):
+        servicios.consultar_pagina_transferencias('administrador', filtros={'incluir_archivo': True}, tamano=50)
@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+import servicios
+
+
+def _agregar(cursor, empleado_id, error=None):
+    cursor.execute("INSERT INTO empleados (id, nombre, rol) VALUES (?, ?, 'registrador')",
+                   (empleado_id, f'Empleado {empleado_id}'))
+    if error is not None:
+        raise error
+    return empleado_id
+
+
+def _escribir_en_un_lote(pedidos):
+    """
+    Ejecuta las escrituras desde hilos distintos de modo que el escritor las tome en
+    un solo lote, y devuelve el resultado o la excepción de cada una, en el orden de pedidos.
+    """
+    ocupado, liberar = threading.Event(), threading.Event()
+
+    def bloquear(cursor):
+        ocupado.set()
+        liberar.wait(10)
+
+    bloqueo = threading.Thread(target=db.escribir, args=(bloquear,))
+    bloqueo.start()
+    assert ocupado.wait(10)
+    resultados = {}
+
+    def ejecutar(indice, funcion, args):
+        try:
+            resultados[indice] = db.escribir(funcion, *args)
+        except Exception as error:
+            resultados[indice] = error
+
+    hilos = [threading.Thread(target=ejecutar, args=(indice, funcion, args))
+             for indice, (funcion, args) in enumerate(pedidos)]
+    for hilo in hilos:
+        hilo.start()
+    # Mientras el escritor está ocupado con el bloqueo, los pedidos se acumulan en la cola
+    limite = time.monotonic() + 10
+    while db.escritor._cola.qsize() < len(pedidos) and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert db.escritor._cola.qsize() == len(pedidos)
+    liberar.set()
+    for hilo in [bloqueo, *hilos]:
+        hilo.join(10)
+    return [resultados[indice] for indice in range(len(pedidos))]
+
+
+def test_error_de_una_escritura_solo_deshace_sus_cambios(base):
+    fallo = ValueError('falla la tercera')
+    resultados = _escribir_en_un_lote([(_agregar, (10,)), (_agregar, (11,)), (_agregar, (12, fallo)),
+                                       (_agregar, (13,)), (_agregar, (14,))])
+
+    assert resultados == [10, 11, fallo, 13, 14]
+    with db.lectura() as cursor:
+        cursor.execute('SELECT id FROM empleados WHERE id >= 10 ORDER BY id')
+        assert [fila[0] for fila in cursor.fetchall()] == [10, 11, 13, 14]
+
+
+def test_error_de_sqlite_llega_solo_a_quien_lo_provoco(base):
+    resultados = _escribir_en_un_lote([(_agregar, (20,)), (_agregar, (20,)), (_agregar, (21,))])
+
+    assert resultados[0] == 20
+    assert isinstance(resultados[1], sqlite3.IntegrityError)
+    assert resultados[2] == 21
+    assert servicios.obtener_empleado_por_id(20) == (20, 'Empleado 20', 'registrador', 0.0)
+    assert servicios.obtener_empleado_por_id(21) is not None
+
+
+def test_escrituras_secuenciales_tras_un_error(base):
+    with pytest.raises(ValueError):
+        db.escribir(_agregar, 30, ValueError('falla'))
+    assert db.escribir(_agregar, 31) == 31
+    assert servicios.obtener_empleado_por_id(30) is None
@@ -0,0 +1,94 @@
+import datetime
+import itertools
+
+import pytest
+
+import conciliacion
+import db
+import libro_ganancias
+import servicios
+from conftest import ADMINISTRADOR, CONFIRMADOR, REGISTRADOR, registrar
+
+EMPLEADOS = (ADMINISTRADOR, REGISTRADOR, CONFIRMADOR)
+
+
+@pytest.fixture
+def libro(base, monkeypatch):
+    """Libro con cortes cada 4 movimientos y un reloj que avanza un minuto en cada asiento"""
+    monkeypatch.setattr(libro_ganancias, 'CORTE_CADA', 4)
+    reloj = (datetime.datetime(2030, 1, 1) + datetime.timedelta(minutes=minuto) for minuto in itertools.count())
+    monkeypatch.setattr(libro_ganancias, '_ahora', lambda: next(reloj).strftime(libro_ganancias.FORMATO_FECHA))
+    for transferencia_id in registrar(6):
+        servicios.confirmar_transferencias_entregadas([transferencia_id], CONFIRMADOR)
+    return base
+
+
+def _consultar(sql, parametros=()):
+    with db.lectura() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
+
+
+def _suma_libro(empleado_id, fecha):
+    return _consultar('''
+        SELECT COALESCE(SUM(ganancia_general), 0), COALESCE(SUM(ganancia_personalizada), 0)
+        FROM movimientos_ganancias WHERE empleado_id = ? AND fecha <= ?
+    ''', (empleado_id, fecha))[0]
+
+
+def _fechas_a_revisar():
+    """Cada fecha de movimiento y de corte, y el segundo anterior a cada una"""
+    fechas = {fila[0] for fila in _consultar('SELECT fecha FROM movimientos_ganancias UNION SELECT fecha_corte FROM cortes_ganancias')}
+    anteriores = {(datetime.datetime.strptime(fecha, libro_ganancias.FORMATO_FECHA) - datetime.timedelta(seconds=1))
+                  .strftime(libro_ganancias.FORMATO_FECHA) for fecha in fechas}
+    return sorted(fechas | anteriores)
+
+
+def _verificar_saldos():
+    fechas = _fechas_a_revisar()
+    for fecha in fechas:
+        for empleado_id in EMPLEADOS:
+            assert libro_ganancias.saldo(empleado_id, fecha) == pytest.approx(_suma_libro(empleado_id, fecha)), fecha
+    for empleado_id in EMPLEADOS:
+        assert libro_ganancias.saldo(empleado_id) == pytest.approx(_suma_libro(empleado_id, fechas[-1]))
+
+
+def test_saldo_antes_en_y_despues_de_cada_corte(libro):
+    cortes = _consultar('SELECT DISTINCT movimiento_hasta, fecha_corte FROM cortes_ganancias ORDER BY movimiento_hasta')
+    assert len(cortes) >= 3
+
+    _verificar_saldos()
+
+
+def test_saldo_despues_de_un_corte_manual(libro):
+    servicios.confirmar_transferencias_entregadas(registrar(1), CONFIRMADOR)
+    assert libro_ganancias.cortar() > 0
+
+    _verificar_saldos()
+
+
+def test_saldo_despues_de_una_correccion(libro):
+    def cambiar_porcentaje(cursor):
+        cursor.execute('UPDATE empleados SET porcentaje_ganancia = 35.0 WHERE id = ?', (REGISTRADOR,))
+
+    db.escribir(cambiar_porcentaje)
+    hoy = datetime.date.today()
+    assert conciliacion.aplicar_correccion(hoy.month, hoy.year, hoy.month, hoy.year) > 0
+    assert conciliacion.comparar(hoy.month, hoy.year, hoy.month, hoy.year).empty
+
+    _verificar_saldos()
+    ganancias = dict(_consultar('SELECT empleado_id, SUM(ganancia_personalizada) FROM ganancias_globales GROUP BY empleado_id'))
+    for empleado_id in EMPLEADOS:
+        assert libro_ganancias.saldo(empleado_id)[1] == pytest.approx(ganancias[empleado_id])
+
+
+def test_la_fecha_del_libro_no_retrocede_con_el_reloj(base, monkeypatch):
+    horas = iter(['2030-11-03 01:30:00'] * 2 + ['2030-11-03 01:10:00'] * 20)
+    monkeypatch.setattr(libro_ganancias, '_ahora', lambda: next(horas))
+    for transferencia_id in registrar(3):
+        servicios.confirmar_transferencias_entregadas([transferencia_id], CONFIRMADOR)
+
+    fechas = [fila[0] for fila in _consultar('SELECT fecha FROM movimientos_ganancias ORDER BY id')]
+    assert fechas == sorted(fechas)
+    assert fechas[-1] == '2030-11-03 01:30:00'
+    _verificar_saldos()
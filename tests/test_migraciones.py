@@ -0,0 +1,206 @@
+import sqlite3
+
+import pytest
+
+import busqueda
+import cache
+import db
+import inventario
+import libro_ganancias
+import migraciones
+
+# Esquema que creaba crear_tablas() antes de las migraciones
+ESQUEMA_ORIGINAL = '''
+    CREATE TABLE empleados (
+        id INTEGER PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        rol TEXT NOT NULL CHECK (rol IN ('administrador', 'registrador', 'confirmador')),
+        porcentaje_ganancia REAL NOT NULL DEFAULT 0.0
+    );
+    CREATE TABLE transferencias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_solicitud TEXT NOT NULL,
+        remitente_nombre TEXT NOT NULL,
+        destinatario_nombre TEXT NOT NULL,
+        destinatario_telefono TEXT NOT NULL,
+        capital REAL NOT NULL,
+        fecha_confirmacion TEXT,
+        confirmador_id INTEGER,
+        registrador_id INTEGER NOT NULL,
+        estado TEXT NOT NULL CHECK (estado IN ('solicitada', 'confirmada', 'entregada')),
+        FOREIGN KEY (registrador_id) REFERENCES empleados (id),
+        FOREIGN KEY (confirmador_id) REFERENCES empleados (id)
+    );
+    CREATE TABLE historial_ediciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transferencia_id INTEGER NOT NULL,
+        fecha_edicion TEXT NOT NULL,
+        empleado_editor_id INTEGER NOT NULL,
+        campo_editado TEXT NOT NULL,
+        valor_anterior TEXT,
+        valor_nuevo TEXT,
+        FOREIGN KEY (transferencia_id) REFERENCES transferencias (id),
+        FOREIGN KEY (empleado_editor_id) REFERENCES empleados (id)
+    );
+    CREATE TABLE ganancias_globales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        empleado_id INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        anio INTEGER NOT NULL,
+        ganancia_general REAL NOT NULL,
+        ganancia_personalizada REAL NOT NULL,
+        total_ganancia REAL NOT NULL,
+        FOREIGN KEY (empleado_id) REFERENCES empleados (id)
+    );
+'''
+
+EMPLEADOS = [(1, 'Ana', 'administrador', 50.0), (2, 'Raúl', 'registrador', 20.0),
+             (3, 'Carla', 'confirmador', 10.0), (4, 'Rita', 'registrador', 15.0)]
+TRANSFERENCIAS = 30
+
+
+@pytest.fixture
+def base_original(tmp_path):
+    """Base con el esquema original y los datos que dejaba la versión sin migraciones"""
+    ruta = str(tmp_path / 'transferencias.db')
+    conexion = sqlite3.connect(ruta)
+    conexion.executescript(ESQUEMA_ORIGINAL)
+    conexion.executemany('INSERT INTO empleados VALUES (?, ?, ?, ?)', EMPLEADOS)
+    porcentajes = {empleado_id: porcentaje for empleado_id, _, _, porcentaje in EMPLEADOS}
+    for i in range(1, TRANSFERENCIAS + 1):
+        mes = 1 + i % 3
+        registrador_id = 2 + 2 * (i % 2)
+        capital = 100.0 * i
+        entregada = i % 4 != 0
+        conexion.execute('''
+            INSERT INTO transferencias
+            (fecha_solicitud, remitente_nombre, destinatario_nombre, destinatario_telefono, capital,
+             fecha_confirmacion, confirmador_id, registrador_id, estado)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (f'2024-{mes:02d}-{i % 27 + 1:02d} 09:00:00', f'José Pérez {i}', f'María Gómez {i}',
+              f'(0991) 123-{i:03d}', capital, f'2024-{mes:02d}-{i % 27 + 2:02d} 18:00:00' if entregada else None,
+              3 if entregada else None, registrador_id, 'entregada' if entregada else 'solicitada'))
+        if entregada:
+            # Como distribuir_ganancias original: una fila por entrega y beneficiario
+            general = capital * 0.10
+            conexion.executemany('''
+                INSERT INTO ganancias_globales (empleado_id, mes, anio, ganancia_general, ganancia_personalizada, total_ganancia)
+                VALUES (?, ?, 2024, ?, ?, ?)
+            ''', [(empleado_id, mes, general, general * porcentajes[empleado_id] / 100,
+                   general * porcentajes[empleado_id] / 100) for empleado_id in (registrador_id, 3, 1)])
+    # Ganancias de una transferencia que ya no está en la base
+    conexion.execute('''
+        INSERT INTO ganancias_globales (empleado_id, mes, anio, ganancia_general, ganancia_personalizada, total_ganancia)
+        VALUES (1, 2, 2024, 5.0, 2.5, 2.5)
+    ''')
+    conexion.commit()
+    conexion.close()
+
+    db.configurar(ruta)
+    cache.limpiar()
+    migraciones._migradas.discard(ruta)
+    yield ruta
+    db.configurar(db.RUTA_BD)
+    cache.limpiar()
+
+
+def _consultar(sql, parametros=()):
+    with db.lectura() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
+
+
+def _ganancias_por_mes(tabla):
+    return {(empleado_id, anio, mes): (general, personalizada) for empleado_id, anio, mes, general, personalizada in _consultar(f'''
+        SELECT empleado_id, anio, mes, SUM(ganancia_general), SUM(ganancia_personalizada)
+        FROM {tabla} GROUP BY empleado_id, anio, mes
+    ''')}
+
+
+def _contenido(ruta):
+    """Esquema y filas de todas las tablas, para comparar la base antes y después"""
+    conexion = sqlite3.connect(ruta)
+    try:
+        esquema = conexion.execute('SELECT type, name, sql FROM sqlite_master ORDER BY type, name').fetchall()
+        filas = {nombre: conexion.execute(f'SELECT * FROM "{nombre}" ORDER BY 1').fetchall()
+                 for tipo, nombre, sql in esquema if tipo == 'table' and not sql.startswith('CREATE VIRTUAL')}
+        return esquema, filas, conexion.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conexion.close()
+
+
+def test_migrar_esquema_original(base_original):
+    originales = _ganancias_por_mes('ganancias_globales')
+
+    assert migraciones.migrar() == len(migraciones.MIGRACIONES)
+
+    with db.lectura() as cursor:
+        assert migraciones.version_esquema(cursor) == len(migraciones.MIGRACIONES)
+    # Las filas repetidas por empleado y mes se consolidan sin cambiar los totales
+    assert _consultar('SELECT COUNT(*) FROM ganancias_globales')[0][0] == len(originales)
+    ganancias = _ganancias_por_mes('ganancias_globales')
+    assert ganancias.keys() == originales.keys()
+    for clave, valores in originales.items():
+        assert ganancias[clave] == pytest.approx(valores)
+
+    # El libro coincide con ganancias_globales por empleado y mes, y en los saldos
+    libro = _ganancias_por_mes('movimientos_ganancias')
+    assert libro.keys() == ganancias.keys()
+    for clave, valores in ganancias.items():
+        assert libro[clave] == pytest.approx(valores)
+    entregadas = _consultar("SELECT COUNT(*) FROM transferencias WHERE estado = 'entregada'")[0][0]
+    assert _consultar('SELECT COUNT(*) FROM movimientos_ganancias WHERE transferencia_id IS NOT NULL')[0][0] == 3 * entregadas
+    assert _consultar("SELECT COUNT(*) FROM movimientos_ganancias WHERE concepto = 'ajuste'")[0][0] == 1
+    for empleado_id, *_ in EMPLEADOS:
+        esperado = [sum(valores[i] for (empleado, _, _), valores in ganancias.items() if empleado == empleado_id)
+                    for i in (0, 1)]
+        assert libro_ganancias.saldo(empleado_id) == pytest.approx(esperado)
+
+    # El índice de búsqueda tiene todas las transferencias, sin acentos y por dígitos del teléfono
+    filas, _ = busqueda.buscar('jose perez', 'administrador', tamano=100)
+    assert len(filas) == TRANSFERENCIAS
+    filas, _ = busqueda.buscar('maria 0991123007', 'administrador', tamano=100)
+    assert [fila[0] for fila in filas] == [7]
+
+    # El inventario es el agregado de las entregadas por mes de solicitud
+    assert inventario.consultar_rango(1, 2024, 12, 2024) == [
+        (anio, mes, pytest.approx(capital), cantidad, pytest.approx(capital * 0.10))
+        for anio, mes, capital, cantidad in _consultar('''
+            SELECT CAST(strftime('%Y', fecha_solicitud) AS INTEGER), CAST(strftime('%m', fecha_solicitud) AS INTEGER),
+                   SUM(capital), COUNT(*)
+            FROM transferencias WHERE estado = 'entregada' GROUP BY 1, 2 ORDER BY 1, 2
+        ''')
+    ]
+
+
+def test_migrar_es_idempotente(base_original):
+    assert migraciones.migrar() == len(migraciones.MIGRACIONES)
+    migrada = _contenido(base_original)
+
+    assert migraciones.migrar() == 0
+    migraciones._migradas.discard(base_original)
+    assert migraciones.migrar() == 0
+    assert _contenido(base_original) == migrada
+
+
+def test_volver_a_aplicar_las_migraciones_no_cambia_los_datos(base_original):
+    migraciones.migrar()
+    migrada = _contenido(base_original)
+
+    # Como en una base restaurada que perdió su user_version
+    conexion = sqlite3.connect(base_original)
+    conexion.execute('PRAGMA user_version = 0')
+    conexion.close()
+    migraciones._migradas.discard(base_original)
+
+    assert migraciones.migrar() == len(migraciones.MIGRACIONES)
+    assert _contenido(base_original) == migrada
+
+
+def test_no_migra_un_esquema_mas_nuevo(base_original):
+    conexion = sqlite3.connect(base_original)
+    conexion.execute(f'PRAGMA user_version = {len(migraciones.MIGRACIONES) + 1}')
+    conexion.close()
+
+    with pytest.raises(RuntimeError):
+        migraciones.migrar()